@@ -1,7 +1,25 @@
-"""Generate synthetic telecoms complaints using OpenAI (async, parallel)."""
+"""Generate synthetic telecoms complaints using OpenAI (async, parallel).
+
+Every completed batch is appended to a JSONL journal next to the output CSV
+as soon as it returns, keyed by (cell, batch index, hash of the batch's
+assignments). After a crash or Ctrl-C, re-run with ``--resume``: journaled
+batches are reused and only missing or failed ones are sent to the API.
+
+Requests go through ``rate_control.AdaptiveLimiter``: concurrency starts
+low and grows while responses are fast and clean, halves on 429/5xx, and
+throttled calls are retried with jittered backoff. ``--tpm`` additionally
+caps estimated tokens per minute.
+
+``--cache`` stores each response in the shared LLM cache (llm_tools/cache.py)
+and answers identical requests from it. Generation samples at temperature
+1.0, so this is opt-in: a cached run reproduces the earlier samples exactly
+instead of drawing new ones, which is what you want when iterating on
+prompts for some cells or on downstream steps, but not for fresh data.
+"""
 
 import argparse
 import asyncio
+import hashlib
 import json
 import os
 import sys
@@ -9,15 +27,19 @@ import time
 
 import pandas as pd
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from openai import APIError, AsyncOpenAI
 
 from prompts import (
     EMOTION_DEFINITIONS,
     SYSTEM_PROMPTS,
     URGENCY_DEFINITIONS,
 )
+from rate_control import AdaptiveLimiter, estimate_tokens, is_retryable
 from taxonomy import _build_grid, build_assignments
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from llm_tools.cache import LLMCache
+
 load_dotenv()
 
 # ---------------------------------------------------------------------------
@@ -124,62 +146,220 @@ def _build_user_prompt(cell_assignments: list[dict]) -> str:
 
 BATCH_SIZE = 5
 MAX_RETRIES = 2
-MAX_CONCURRENT = 10
+MAX_CONCURRENT = 64       # ceiling for the adaptive concurrency window
+INITIAL_CONCURRENT = 4
+COMPLETION_TOKENS_PER_COMPLAINT = 600  # reasoning + text, for the TPM estimate
+
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "telecoms_complaints.csv")
+MOCK_URL = os.getenv("LLM_MOCK_URL", "http://127.0.0.1:8400")  # llm_tools/mock_server.py
+FAILED_TEXT = "[GENERATION FAILED — re-run needed]"
 
 # MODEL = "gpt-4o-mini"
 MODEL = "gpt-5-mini"
+GEN_PARAMS = {"temperature": 1.0, "response_format": {"type": "json_object"}}
 
 
 async def _generate_batch(
     client: AsyncOpenAI,
-    semaphore: asyncio.Semaphore,
+    limiter: AdaptiveLimiter,
     system_prompt: str,
     batch_assignments: list[dict],
     batch_label: str,
+    cache: LLMCache | None = None,
+    cache_provider: str = "openai",
 ) -> list[str]:
-    """Call the API for a batch of assignments, with retry on count mismatch."""
+    """Call the API for a batch of assignments, with retry on count mismatch.
+
+    Rate-limit and server errors are retried inside ``limiter.call``; if
+    they persist, the batch is returned as failed so ``--resume`` retries it.
+    Other API errors (bad request, auth, content policy) and unparseable
+    completions also fail only this batch, so one bad request never aborts
+    the run and cancels the others in flight.
+    With a ``cache``, a stored response for the same prompt is used instead;
+    one with the wrong count is dropped so the retry asks the API again.
+    """
     expected = len(batch_assignments)
-
-    async with semaphore:
-        for attempt in range(1, MAX_RETRIES + 2):
-            user_prompt = _build_user_prompt(batch_assignments)
-            response = await client.chat.completions.create(
-                model=MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=1.0,
-                response_format={"type": "json_object"},
-            )
-
+    complaints = []
+
+    for attempt in range(1, MAX_RETRIES + 2):
+        user_prompt = _build_user_prompt(batch_assignments)
+        cache_key = LLMCache.key(cache_provider, MODEL, system_prompt, user_prompt, GEN_PARAMS)
+        # SQLite work runs in a thread so it never stalls the other in-flight requests
+        raw = await asyncio.to_thread(cache.get, cache_key) if cache else None
+        if raw is None:
+            tokens = estimate_tokens(system_prompt, user_prompt,
+                                     completion=expected * COMPLETION_TOKENS_PER_COMPLAINT)
+            try:
+                response = await limiter.call(
+                    lambda: client.chat.completions.create(
+                        model=MODEL,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_prompt},
+                        ],
+                        **GEN_PARAMS,
+                    ),
+                    tokens,
+                )
+            except Exception as e:
+                if not (isinstance(e, APIError) or is_retryable(e)):
+                    raise   # a bug in this script, not a problem with the request
+                if is_retryable(e):
+                    print(f"  {batch_label}: giving up after repeated errors ({type(e).__name__})")
+                else:
+                    print(f"  {batch_label}: request rejected, batch marked failed ({type(e).__name__}: {e})")
+                break
             raw = response.choices[0].message.content
-            data = json.loads(raw)
-            complaints = data.get("complaints", [])
-
-            if len(complaints) >= expected:
-                print(f"  {batch_label}: {expected} complaints OK")
-                return complaints[:expected]
+            if cache:
+                await asyncio.to_thread(cache.put, cache_key, raw, cache_provider, MODEL)
 
-            print(f"  {batch_label}: attempt {attempt}, expected {expected}, "
-                  f"got {len(complaints)}."
-                  f"{' Retrying...' if attempt <= MAX_RETRIES else ''}")
+        try:
+            data = json.loads(raw)
+            if not isinstance(data, dict):
+                raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+        except ValueError as e:   # json.JSONDecodeError is a ValueError
+            if cache:
+                await asyncio.to_thread(cache.delete, cache_key)
+            print(f"  {batch_label}: unparseable completion, batch marked failed ({e})")
+            complaints = []
+            break
+        complaints = data.get("complaints", [])
+
+        if len(complaints) >= expected:
+            print(f"  {batch_label}: {expected} complaints OK")
+            return complaints[:expected]
+
+        if cache:
+            await asyncio.to_thread(cache.delete, cache_key)
+
+        print(f"  {batch_label}: attempt {attempt}, expected {expected}, "
+              f"got {len(complaints)}."
+              f"{' Retrying...' if attempt <= MAX_RETRIES else ''}")
 
     # All retries exhausted — pad with placeholders
     while len(complaints) < expected:
-        complaints.append("[GENERATION FAILED — re-run needed]")
+        complaints.append(FAILED_TEXT)
     return complaints[:expected]
 
 
-async def generate_all(total: int = 5000, seed: int = 42) -> pd.DataFrame:
-    """Generate `total` complaints and return a DataFrame."""
+# ---------------------------------------------------------------------------
+# Batch journal
+# ---------------------------------------------------------------------------
+def _batch_key(cell_idx: int, batch_idx: int, batch_assignments: list[dict]) -> str:
+    """Journal key; the hash changes if --total/--seed give this batch other assignments."""
+    digest = hashlib.sha256(
+        json.dumps(batch_assignments, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+    return f"{cell_idx}:{batch_idx}:{digest}"
+
+
+def _is_failed(complaints: list[str]) -> bool:
+    return any(text.startswith("[GENERATION FAILED") for text in complaints)
+
+
+def _load_journal(path: str) -> dict[str, list[str]]:
+    """Return ``{batch key: complaints}`` for every successful batch in the journal."""
+    done: dict[str, list[str]] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # last line cut short by a kill
+            if _is_failed(record["complaints"]):
+                done.pop(record["key"], None)
+            else:
+                done[record["key"]] = record["complaints"]
+    return done
+
+
+def _trim_journal(path: str) -> None:
+    """Truncate a final line cut short by a kill, so the next append starts on a fresh line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            nl = block.rfind(b"\n")
+            if nl != -1:
+                f.truncate(pos - step + nl + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+def _append_journal(path: str, key: str, complaints: list[str]) -> None:
+    """Append one batch and fsync, so a completed API call is never lost."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"key": key, "complaints": complaints}, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def _generate_and_journal(
+    client: AsyncOpenAI,
+    limiter: AdaptiveLimiter,
+    system_prompt: str,
+    batch_assignments: list[dict],
+    batch_label: str,
+    journal_path: str,
+    key: str,
+    cache: LLMCache | None = None,
+    cache_provider: str = "openai",
+) -> list[str]:
+    complaints = await _generate_batch(client, limiter, system_prompt, batch_assignments, batch_label,
+                                       cache, cache_provider)
+    _append_journal(journal_path, key, complaints)
+    return complaints
+
+
+async def generate_all(
+    total: int = 5000,
+    seed: int = 42,
+    journal_path: str | None = None,
+    resume: bool = False,
+    base_url: str | None = None,
+    max_concurrent: int = MAX_CONCURRENT,
+    tpm: int | None = None,
+    output_path: str = OUTPUT_PATH,
+    cache: LLMCache | None = None,
+) -> pd.DataFrame:
+    """Generate `total` complaints and return a DataFrame.
+
+    Each finished batch is appended to ``journal_path``. With ``resume``,
+    batches already in the journal are reused instead of regenerated.
+    With a ``cache``, identical requests are answered from it.
+    """
+    journal_path = journal_path or os.path.splitext(output_path)[0] + ".journal.jsonl"
+    if resume:
+        _trim_journal(journal_path)
+        done = _load_journal(journal_path)
+        print(f"Resuming: {len(done)} batch(es) already in '{journal_path}'")
+    else:
+        if os.path.exists(journal_path):
+            print(f"Error: journal '{journal_path}' already exists. Pass --resume to "
+                  f"continue it, or delete it to start over.")
+            sys.exit(1)
+        done = {}
+
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         print("Error: OPENAI_API_KEY not set. Add it to .env or environment.")
         sys.exit(1)
 
-    client = AsyncOpenAI(api_key=api_key)
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+    # The limiter owns retries, so the client must surface 429s instead of
+    # retrying them itself
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    # Responses from another endpoint (e.g. the mock) are cached under their own label
+    cache_provider = f"openai@{base_url}" if base_url else "openai"
+    limiter = AdaptiveLimiter(initial=min(INITIAL_CONCURRENT, max_concurrent),
+                              max_limit=max_concurrent, tpm=tpm)
     assignments = build_assignments(total=total, seed=seed)
     grid = _build_grid(total)
 
@@ -189,8 +369,8 @@ async def generate_all(total: int = 5000, seed: int = 42) -> pd.DataFrame:
         key = (a["urgency"], a["emotion"])
         cells.setdefault(key, []).append(a)
 
-    # Build all tasks upfront
-    tasks: list[tuple[list[dict], asyncio.Task]] = []
+    # Build all tasks upfront; journaled batches are kept as plain results
+    tasks: list[tuple[list[dict], asyncio.Task | list[str]]] = []
 
     for cell_idx, (urgency, emotion, _count) in enumerate(grid):
         cell_assignments = cells[(urgency, emotion)]
@@ -208,21 +388,33 @@ async def generate_all(total: int = 5000, seed: int = 42) -> pd.DataFrame:
               f"({len(cell_assignments)} complaints, {len(batches)} batch(es))")
 
         for batch_idx, batch in enumerate(batches):
+            key = _batch_key(cell_idx, batch_idx, batch)
+            if key in done:
+                tasks.append((batch, done[key]))
+                continue
             label = f"{cell_label}, batch {batch_idx + 1}/{len(batches)}"
             task = asyncio.create_task(
-                _generate_batch(client, semaphore, system_prompt, batch, label)
+                _generate_and_journal(client, limiter, system_prompt, batch, label, journal_path, key,
+                                      cache, cache_provider)
             )
             tasks.append((batch, task))
 
-    print(f"\nLaunching {len(tasks)} batches with up to "
-          f"{MAX_CONCURRENT} concurrent requests...\n")
+    pending = [t for _, t in tasks if isinstance(t, asyncio.Task)]
+    print(f"\nLaunching {len(pending)} batches ({len(tasks) - len(pending)} from journal) "
+          f"with an adaptive window of {int(limiter.limit)}-{max_concurrent} concurrent requests"
+          f"{f' and a {tpm} TPM budget' if tpm else ''}...\n")
     start = time.time()
 
     # Await all tasks
-    results = await asyncio.gather(*(t for _, t in tasks))
+    await asyncio.gather(*pending)
+    results = [t.result() if isinstance(t, asyncio.Task) else t for _, t in tasks]
 
     elapsed = time.time() - start
-    print(f"\nAll batches complete in {elapsed:.1f}s")
+    print(f"\nAll batches complete in {elapsed:.1f}s "
+          f"({len(pending) / max(elapsed, 1e-9):.2f} batches/s)")
+    print(f"Rate control: {limiter.summary()}")
+    if cache:
+        print(f"Cache: {cache.summary()}")
 
     # Assemble rows
     all_rows: list[dict] = []
@@ -251,13 +443,44 @@ def main() -> None:
                         help="Total number of complaints to generate (default: 5000)")
     parser.add_argument("--seed", type=int, default=42,
                         help="Random seed for reproducibility (default: 42)")
+    parser.add_argument("--output", default=None,
+                        help="Output CSV (default: data/telecoms_complaints.csv, "
+                             "or data/telecoms_complaints_mock.csv with --mock)")
+    parser.add_argument("--journal", default=None,
+                        help="JSONL file each finished batch is appended to "
+                             "(default: the output path with .journal.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reuse batches already in the journal; only missing or failed ones are regenerated")
+    parser.add_argument("--base-url", default=None,
+                        help="OpenAI-compatible endpoint (default: api.openai.com)")
+    parser.add_argument("--mock", nargs="?", const=MOCK_URL, default=None, metavar="URL",
+                        help=f"Use the local mock API (llm_tools/mock_server.py) at URL (default: {MOCK_URL})")
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT,
+                        help=f"Upper bound for the adaptive concurrency window (default: {MAX_CONCURRENT})")
+    parser.add_argument("--tpm", type=int, default=None,
+                        help="Tokens-per-minute budget of the account tier (default: no client-side cap)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse cached responses for identical requests (llm_tools/cache.py); "
+                             "off by default because generation samples at temperature 1.0")
     args = parser.parse_args()
 
-    df = asyncio.run(generate_all(total=args.total, seed=args.seed))
-
-    output_path = os.path.join(os.path.dirname(__file__), "..", "data", "telecoms_complaints.csv")
-    df.to_csv(output_path, index=False, encoding="utf-8-sig")
-    print(f"\nSaved {len(df)} complaints to {output_path}")
+    if args.mock:
+        args.base_url = args.mock.rstrip("/") + "/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "mock")
+    if args.output is None:
+        args.output = OUTPUT_PATH.replace(".csv", "_mock.csv") if args.mock else OUTPUT_PATH
+
+    df = asyncio.run(generate_all(total=args.total, seed=args.seed,
+                                  journal_path=args.journal, resume=args.resume,
+                                  base_url=args.base_url, max_concurrent=args.max_concurrent,
+                                  tpm=args.tpm, output_path=args.output,
+                                  cache=LLMCache() if args.cache else None))
+
+    df.to_csv(args.output, index=False, encoding="utf-8-sig")
+    print(f"\nSaved {len(df)} complaints to {args.output}")
+    failed = int(df["complaint_text"].str.startswith("[GENERATION FAILED").sum())
+    if failed:
+        print(f"{failed} complaint(s) failed to generate — re-run with --resume to retry them.")
 
     # Summary
     print("\n--- Distribution Summary ---")
@@ -0,0 +1,171 @@
+"""Adaptive concurrency control for rate-limited LLM APIs.
+
+``AdaptiveLimiter`` replaces a fixed ``asyncio.Semaphore`` with an AIMD
+window, the same scheme TCP uses for congestion control:
+
+  - additive increase — every healthy response grows the window by
+    1/window, i.e. by about one slot per window's worth of successes, as
+    long as latency stays within ``latency_factor`` x the best seen so far
+  - multiplicative decrease — a 429, 5xx or timeout halves the window. A
+    burst of concurrent 429s from one overload only counts once per round
+    trip (the best latency seen).
+
+Throttled calls are retried after a jittered exponential delay (full
+jitter: uniform(0, base * 2**attempt), capped). A Retry-After from the
+server pauses the whole limiter rather than just the throttled call,
+because every other request would be refused too; each waiter adds its own
+jitter so they do not return in lockstep.
+
+An optional tokens-per-minute budget is enforced client-side with a token
+bucket. Each request reserves an estimate from its prompt size plus its
+expected completion, so bursts stay under the account's TPM limit instead
+of being rejected by the server.
+
+Usage:
+    limiter = AdaptiveLimiter(max_limit=64, tpm=200_000)
+    tokens  = estimate_tokens(system_prompt, user_prompt, completion=2000)
+    response = await limiter.call(lambda: client.chat.completions.create(...), tokens)
+"""
+
+import asyncio
+import math
+import random
+import time
+
+# ── Config ───────────────────────────────────────────────────────────────────
+CHARS_PER_TOKEN = 4                              # rough English average for BPE tokenizers
+RETRY_STATUSES  = {429, 500, 502, 503, 504, 529}
+BACKOFF_BASE    = 1.0                            # seconds
+BACKOFF_CAP     = 60.0
+MAX_ATTEMPTS    = 6
+
+
+def estimate_tokens(*texts: str, completion: int = 0) -> int:
+    """Prompt tokens estimated from character count, plus the expected completion."""
+    return sum(len(t) for t in texts) // CHARS_PER_TOKEN + completion
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, server errors and transport timeouts; client errors are not retried."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return type(exc).__name__ in {"APITimeoutError", "APIConnectionError", "TimeoutError"}
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """Seconds from the response's Retry-After header, if the server sent one."""
+    response = getattr(exc, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """Full-jitter exponential backoff for 0-based ``attempt``."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Tokens-per-minute budget refilled continuously."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.tokens   = float(per_minute)
+        self.rate     = per_minute / 60.0
+        self.updated  = time.monotonic()
+
+    async def take(self, n: int) -> None:
+        n = min(n, self.capacity)   # an oversized request would otherwise wait forever
+        while True:
+            now = time.monotonic()
+            self.tokens  = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return
+            await asyncio.sleep((n - self.tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency window with jittered retry and an optional TPM budget."""
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64, tpm: int | None = None,
+                 latency_factor: float = 2.0, max_attempts: int = MAX_ATTEMPTS):
+        self.limit          = float(initial)
+        self.min_limit      = min_limit
+        self.max_limit      = max_limit
+        self.latency_factor = latency_factor
+        self.max_attempts   = max_attempts
+        self.bucket         = TokenBucket(tpm) if tpm else None
+        self.in_flight      = 0
+        self.best_latency   = math.inf
+        self.last_decrease  = -math.inf
+        self.paused_until   = 0.0   # monotonic time before which no request is sent
+        self.cond           = asyncio.Condition()
+        self.stats          = {"ok": 0, "throttled": 0, "retries": 0, "peak_limit": initial}
+
+    # ── Window ───────────────────────────────────────────────────────────────
+    async def acquire(self, tokens: int = 0) -> None:
+        if self.bucket is not None:
+            await self.bucket.take(tokens)
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        # Checked after taking a slot, so callers queued during a 429 wait too
+        while (wait := self.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(wait + random.uniform(0, BACKOFF_BASE))
+
+    async def release(self) -> None:
+        async with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()   # the window may have grown as well
+
+    def on_success(self, latency: float) -> None:
+        self.stats["ok"] += 1
+        self.best_latency = min(self.best_latency, latency)
+        if latency <= self.latency_factor * self.best_latency:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.stats["peak_limit"] = max(self.stats["peak_limit"], int(self.limit))
+
+    def on_overload(self, pause: float | None = None) -> None:
+        self.stats["throttled"] += 1
+        now = time.monotonic()
+        cooldown = self.best_latency if self.best_latency < math.inf else BACKOFF_BASE
+        if now - self.last_decrease >= cooldown:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self.last_decrease = now
+        if pause:
+            self.paused_until = max(self.paused_until, now + pause)
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    async def call(self, fn, tokens: int = 0):
+        """Await ``fn()`` inside the window, retrying throttled or failed attempts."""
+        for attempt in range(self.max_attempts):
+            # Tokens are reserved once: a throttled attempt was not counted against the server's TPM
+            await self.acquire(tokens if attempt == 0 else 0)
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                pause = retry_after(e)
+                self.on_overload(pause)
+                if attempt == self.max_attempts - 1:
+                    raise
+                delay = 0.0 if pause else backoff_delay(attempt)   # acquire() waits out the pause
+            else:
+                self.on_success(time.monotonic() - start)
+                return result
+            finally:
+                await self.release()
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['ok']} ok, {s['throttled']} throttled/failed, {s['retries']} retries, "
+                f"window now {int(self.limit)} (peak {s['peak_limit']})")
@@ -0,0 +1,151 @@
+"""Tests for AdaptiveLimiter.call against stub API calls.
+
+The stubs raise exceptions shaped like the OpenAI/Anthropic SDK errors
+(``status_code`` plus a ``response`` with headers), which is all
+rate_control.py looks at. Backoff delays are patched to zero so the suite
+runs in well under a second; only the Retry-After test waits for real.
+
+Run from the project root:
+    python -m pytest data_generation/tests
+"""
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rate_control
+from rate_control import AdaptiveLimiter
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response    = SimpleNamespace(headers=headers or {})
+
+
+def scripted(*outcomes, latency=0.01):
+    """Async callable that raises or returns each outcome in turn; records when it was called."""
+    outcomes = list(outcomes)
+    calls    = []
+
+    async def fn():
+        calls.append(time.monotonic())
+        await asyncio.sleep(latency)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    fn.calls = calls
+    return fn
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_control, "backoff_delay", lambda attempt: 0.0)
+    monkeypatch.setattr(rate_control, "BACKOFF_BASE", 0.0)   # no extra jitter after a pause
+
+
+def test_429_then_200_returns_the_result():
+    limiter = AdaptiveLimiter(initial=8)
+    fn      = scripted(FakeAPIError(429), "ok")
+
+    assert asyncio.run(limiter.call(fn)) == "ok"
+    assert len(fn.calls) == 2
+    assert limiter.stats == {"ok": 1, "throttled": 1, "retries": 1, "peak_limit": 8}
+    assert limiter.in_flight == 0
+
+
+def test_window_halves_on_429_and_grows_on_success():
+    limiter = AdaptiveLimiter(initial=8)
+
+    async def run():
+        await limiter.call(scripted(FakeAPIError(429), "ok"))
+        after_throttle = limiter.limit
+        for _ in range(4):
+            await limiter.call(scripted("ok"))
+        return after_throttle
+
+    after_throttle = asyncio.run(run())
+    # Halved to 4, then +1/window for the success that followed the retry
+    assert after_throttle == pytest.approx(4 + 1 / 4)
+    assert limiter.limit > after_throttle
+    assert limiter.limit <= after_throttle + 5 / 4
+
+
+def test_window_respects_min_and_max():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=3)
+
+    async def run():
+        for _ in range(20):
+            await limiter.call(scripted("ok"))
+
+    asyncio.run(run())
+    assert limiter.limit == 3
+
+    limiter.on_overload()
+    limiter.last_decrease = float("-inf")   # skip the once-per-round-trip cooldown
+    limiter.on_overload()
+    limiter.last_decrease = float("-inf")
+    limiter.on_overload()
+    assert limiter.limit == 1
+
+
+def test_retry_after_pauses_the_whole_limiter():
+    limiter   = AdaptiveLimiter(initial=4)
+    throttled = scripted(FakeAPIError(429, {"retry-after": "0.3"}), "first")
+    other     = scripted("second")
+
+    async def run():
+        start = time.monotonic()
+        first = asyncio.create_task(limiter.call(throttled))
+        await asyncio.sleep(0.05)   # the 429 has arrived and paused the limiter
+        assert limiter.paused_until > time.monotonic()
+        second = await limiter.call(other)
+        return start, await first, second
+
+    start, first, second = asyncio.run(run())
+    assert (first, second) == ("first", "second")
+    # Neither the retry nor the unrelated request went out before Retry-After elapsed
+    assert throttled.calls[1] - start >= 0.3
+    assert other.calls[0] - start >= 0.3
+
+
+def test_non_retryable_error_is_raised_without_retry():
+    limiter = AdaptiveLimiter(initial=4)
+    fn      = scripted(FakeAPIError(400), "unreachable")
+
+    with pytest.raises(FakeAPIError) as exc:
+        asyncio.run(limiter.call(fn))
+    assert exc.value.status_code == 400
+    assert len(fn.calls) == 1
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_retryable_error_is_raised_after_max_attempts():
+    limiter = AdaptiveLimiter(initial=4, max_attempts=3)
+    fn      = scripted(*[FakeAPIError(503)] * 3)
+
+    with pytest.raises(FakeAPIError):
+        asyncio.run(limiter.call(fn))
+    assert len(fn.calls) == 3
+    assert limiter.stats["retries"] == 2
+    assert limiter.stats["throttled"] == 3   # the final failure counts too
+    assert limiter.limit < 4
+    assert limiter.in_flight == 0
+
+
+def test_retries_do_not_take_tokens_again():
+    limiter = AdaptiveLimiter(initial=4, tpm=6000)
+    fn      = scripted(FakeAPIError(429), FakeAPIError(429), "ok")
+
+    assert asyncio.run(limiter.call(fn, tokens=1000)) == "ok"
+    # One reservation for the request, not one per attempt (refill during the test is negligible)
+    assert limiter.bucket.tokens == pytest.approx(5000, abs=10)
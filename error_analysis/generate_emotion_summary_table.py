@@ -1,20 +1,26 @@
+import argparse
 import os
 import json
+import sys
 from google import genai
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_tools.cache import LLMCache
+
 # ── Config ──────────────────────────────────────────────────────────────────
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 ENV_PATH = os.path.join(SCRIPT_DIR, "..", ".env")
 IN_JSONL = os.path.join(SCRIPT_DIR, "results", "emotion_contrastive_insights.jsonl")
 OUT_MD = os.path.join(SCRIPT_DIR, "results", "emotion_contrastive_summary.md")
+MODEL = "gemini-2.5-flash"
 
 # Load environment variables
 load_dotenv(ENV_PATH)
 API_KEY = os.getenv("GEMINI_API_KEY")
 client = genai.Client(api_key=API_KEY)
 
-def generate_summary():
+def generate_summary(cache=None):
     print("Loading insights...")
     if not os.path.exists(IN_JSONL):
         print("Error: insights file not found.")
@@ -55,15 +61,22 @@ def generate_summary():
     {chr(10).join(insights)}
     """
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=prompt,
-        config=genai.types.GenerateContentConfig(
-            temperature=0.2,
+    # Unchanged insights give the same prompt, so the cached table is reused
+    cache_key = LLMCache.key("gemini", MODEL, "", prompt, {"temperature": 0.2})
+    summary_md = cache.get(cache_key) if cache else None
+    if summary_md is None:
+        response = client.models.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config=genai.types.GenerateContentConfig(
+                temperature=0.2,
+            )
         )
-    )
-
-    summary_md = response.text
+        summary_md = response.text
+        if cache and summary_md:
+            cache.put(cache_key, summary_md, "gemini", MODEL)
+    else:
+        print("Using cached summary table.")
     
     with open(OUT_MD, "w", encoding="utf-8") as f:
         f.write("# Emotion Contrastive Error Analysis: Executive Summary Table\n\n")
@@ -72,4 +85,8 @@ def generate_summary():
     print(f"Summary successfully generated at: {OUT_MD}")
 
 if __name__ == "__main__":
-    generate_summary()
+    parser = argparse.ArgumentParser(description="Synthesise emotion contrastive insights into a summary table with Gemini.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the API instead of reusing cached responses (llm_tools/cache.py)")
+    args = parser.parse_args()
+    generate_summary(None if args.no_cache else LLMCache())
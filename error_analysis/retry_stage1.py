@@ -2,8 +2,11 @@
 retry_stage1.py — Retry failed rows from Stage 1 of the ErrorMap Pipeline
 Identifies missing rows by comparing CSV vs JSONL, re-runs them through Gemini.
 Appends results to the existing stage1_errors.jsonl.
+Shares run_stage1.py's response cache (llm_tools/cache.py); rows whose
+response failed to parse were dropped from it, so they reach the API again.
 """
 
+import argparse
 import json
 import time
 import csv
@@ -13,6 +16,9 @@ import sys
 from dotenv import load_dotenv
 from google import genai
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_tools.cache import LLMCache
+
 # ── System prompt (identical to run_stage1.py) ──────────────────────────────
 STAGE_1_SYSTEM_PROMPT = """You are an expert analyst. Your job is to evaluate evidence step by step, consider alternatives, and reach a justified conclusion. Reasoning: high.
 
@@ -60,6 +66,11 @@ OUTPUT_JSONL = os.path.join(SCRIPT_DIR, "results", "stage1_errors.jsonl")
 MODEL        = "gemini-2.5-flash"
 SLEEP_SECS   = 1.5
 
+parser = argparse.ArgumentParser(description="Retry Stage 1 rows missing from stage1_errors.jsonl.")
+parser.add_argument("--no-cache", action="store_true",
+                    help="Always call the API instead of reusing cached responses (llm_tools/cache.py)")
+args = parser.parse_args()
+
 # ── Load API key ────────────────────────────────────────────────────────────
 load_dotenv(os.path.join(PROJECT_DIR, ".env"))
 api_key = os.environ.get("Gemini_API_Key") or os.environ.get("GOOGLE_API_KEY")
@@ -68,6 +79,10 @@ if not api_key:
     sys.exit(1)
 client = genai.Client(api_key=api_key)
 
+# Same key as run_stage1.py, so both scripts share cached responses
+cache        = None if args.no_cache else LLMCache()
+CACHE_PARAMS = {"response_mime_type": "application/json", "max_output_tokens": 4096}
+
 # ── Load CSV rows ──────────────────────────────────────────────────────────
 rows = []
 with open(INPUT_CSV, "r", encoding="utf-8") as f:
@@ -116,37 +131,46 @@ for i, (idx, row) in enumerate(missing):
         f"Incorrect Prediction: {predicted}"
     )
 
+    cache_key = LLMCache.key("gemini", MODEL, STAGE_1_SYSTEM_PROMPT, user_message, CACHE_PARAMS)
+    raw_text  = cache.get(cache_key) if cache else None
+    cached    = raw_text is not None
+
     try:
-        response = None
-        max_retries = 5
-        for attempt in range(max_retries):
-            try:
-                response = client.models.generate_content(
-                    model=MODEL,
-                    contents=user_message,
-                    config=genai.types.GenerateContentConfig(
-                        system_instruction=STAGE_1_SYSTEM_PROMPT,
-                        response_mime_type="application/json",
-                        max_output_tokens=4096,
-                    ),
-                )
-                break
-            except Exception as retry_err:
-                err_str = str(retry_err).lower()
-                is_transient = any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"])
-                if is_transient and attempt < max_retries - 1:
-                    wait = 8 * (attempt + 1)
-                    print(f"  [retry {i+1}/{len(missing)}, row {idx}] ... Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
-                    time.sleep(wait)
-                elif is_transient:
-                    raise Exception(f"All {max_retries} retries failed: {retry_err}")
-                else:
-                    raise
-
-        if response is None:
-            raise Exception(f"All {max_retries} retries failed")
-
-        raw_text = response.text.strip()
+        if not cached:
+            response = None
+            max_retries = 5
+            for attempt in range(max_retries):
+                try:
+                    response = client.models.generate_content(
+                        model=MODEL,
+                        contents=user_message,
+                        config=genai.types.GenerateContentConfig(
+                            system_instruction=STAGE_1_SYSTEM_PROMPT,
+                            response_mime_type="application/json",
+                            max_output_tokens=4096,
+                        ),
+                    )
+                    break
+                except Exception as retry_err:
+                    err_str = str(retry_err).lower()
+                    is_transient = any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"])
+                    if is_transient and attempt < max_retries - 1:
+                        wait = 8 * (attempt + 1)
+                        print(f"  [retry {i+1}/{len(missing)}, row {idx}] ... Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
+                        time.sleep(wait)
+                    elif is_transient:
+                        raise Exception(f"All {max_retries} retries failed: {retry_err}")
+                    else:
+                        raise
+
+            if response is None:
+                raise Exception(f"All {max_retries} retries failed")
+
+            raw_text = response.text or ""
+            if cache:
+                cache.put(cache_key, raw_text, "gemini", MODEL)
+
+        raw_text = raw_text.strip()
 
         if raw_text.startswith("```"):
             raw_text = raw_text.split("```")[1]
@@ -176,13 +200,16 @@ for i, (idx, row) in enumerate(missing):
 
     except json.JSONDecodeError as e:
         error_count += 1
+        if cache:
+            cache.delete(cache_key)
         print(f"  [{i+1}/{len(missing)}] row {idx} -> JSON parse error: {e}")
 
     except Exception as e:
         error_count += 1
         print(f"  [{i+1}/{len(missing)}] row {idx} -> ERROR: {e}")
 
-    time.sleep(SLEEP_SECS)
+    if not cached:
+        time.sleep(SLEEP_SECS)
 
 # ── Summary ─────────────────────────────────────────────────────────────────
 print(f"\n{'='*50}")
@@ -190,4 +217,6 @@ print(f"RETRY COMPLETE")
 print(f"  Successful: {success_count}")
 print(f"  Errors:     {error_count}")
 print(f"  Total in JSONL: {len(processed_indices) + success_count}")
+if cache:
+    print(f"  Cache:      {cache.summary()}")
 print(f"{'='*50}")
@@ -1,14 +1,21 @@
+import argparse
 import os
 import json
+import sys
 import time
 from google import genai
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_tools.cache import LLMCache
+
 # ── Config ──────────────────────────────────────────────────────────────────
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 ENV_PATH = os.path.join(SCRIPT_DIR, "..", ".env")
 IN_JSONL = os.path.join(SCRIPT_DIR, "data", "emotion_icp_pairs.jsonl")
 OUT_JSONL = os.path.join(SCRIPT_DIR, "results", "emotion_contrastive_insights.jsonl")
+MODEL = "gemini-2.5-flash"
+GEN_PARAMS = {"temperature": 0.1, "max_output_tokens": 4096, "response_mime_type": "application/json"}
 
 # Load environment variables
 load_dotenv(ENV_PATH)
@@ -43,7 +50,7 @@ Output your analysis strictly in this JSON format:
 }
 """
 
-def generate_insights():
+def generate_insights(cache=None):
     print("Loading ICP pairs...")
     if not os.path.exists(IN_JSONL):
         raise FileNotFoundError(f"Missing {IN_JSONL}")
@@ -94,38 +101,47 @@ def generate_insights():
                 f"{correct_text}\n"
             )
 
+            cache_key = LLMCache.key("gemini", MODEL, ICP_SYSTEM_PROMPT, user_msg, GEN_PARAMS)
+            raw_text = cache.get(cache_key) if cache else None
+            cached = raw_text is not None
+
             try:
-                # Add retry backoff for rate limiting
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        response = client.models.generate_content(
-                            model='gemini-2.5-flash',
-                            contents=user_msg,
-                            config=genai.types.GenerateContentConfig(
-                                system_instruction=ICP_SYSTEM_PROMPT,
-                                temperature=0.1,
-                                max_output_tokens=4096,
-                                response_mime_type="application/json",
+                if not cached:
+                    # Add retry backoff for rate limiting
+                    max_retries = 3
+                    for attempt in range(max_retries):
+                        try:
+                            response = client.models.generate_content(
+                                model=MODEL,
+                                contents=user_msg,
+                                config=genai.types.GenerateContentConfig(
+                                    system_instruction=ICP_SYSTEM_PROMPT,
+                                    **GEN_PARAMS,
+                                )
                             )
-                        )
-                        break
-                    except Exception as retry_err:
-                        err_str = str(retry_err).lower()
-                        if any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"]) and attempt < max_retries - 1:
-                            wait = 8 * (attempt + 1)
-                            print(f"  [{i}/{len(to_process)}] Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
-                            time.sleep(wait)
-                        else:
-                            raise retry_err
+                            break
+                        except Exception as retry_err:
+                            err_str = str(retry_err).lower()
+                            if any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"]) and attempt < max_retries - 1:
+                                wait = 8 * (attempt + 1)
+                                print(f"  [{i}/{len(to_process)}] Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
+                                time.sleep(wait)
+                            else:
+                                raise retry_err
+                    raw_text = response.text or ""
+                    if cache:
+                        cache.put(cache_key, raw_text, "gemini", MODEL)
 
                 # Try to parse the LLM output as JSON to ensure validity before saving
                 try:
-                    insights_json = json.loads(response.text)
+                    insights_json = json.loads(raw_text)
                 except json.JSONDecodeError:
                     print(f"[{i}/{len(to_process)}] Error: Invalid JSON returned by model. Skipping.")
                     fail_count += 1
-                    time.sleep(2)
+                    if cache:
+                        cache.delete(cache_key)  # ask the API again next run
+                    if not cached:
+                        time.sleep(2)
                     continue
 
                 # Merge original metadata with new insights
@@ -141,11 +157,18 @@ def generate_insights():
                 print(f"[{i}/{len(to_process)}] API Error: {e}")
                 fail_count += 1
             
-            # Rate limiting
-            time.sleep(2)
+            # Rate limiting (cache hits never reached the API)
+            if not cached:
+                time.sleep(2)
 
     print(f"\nFinished processing. Success: {success_count}, Failed: {fail_count}.")
     print(f"Insights appended to {OUT_JSONL}")
+    if cache:
+        print(f"Cache: {cache.summary()}")
 
 if __name__ == "__main__":
-    generate_insights()
+    parser = argparse.ArgumentParser(description="Contrastive (ICP) analysis of emotion error/correct pairs with Gemini.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the API instead of reusing cached responses (llm_tools/cache.py)")
+    args = parser.parse_args()
+    generate_insights(None if args.no_cache else LLMCache())
@@ -1,22 +1,34 @@
+import argparse
 import os
 import json
+import sys
 import time
 from google import genai
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_tools.cache import LLMCache
+
 # ── Config ──────────────────────────────────────────────────────────────────
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 ENV_PATH = os.path.join(SCRIPT_DIR, "..", ".env")
 IN_JSONL = os.path.join(SCRIPT_DIR, "data", "icp_pairs.jsonl")
 OUT_JSONL = os.path.join(SCRIPT_DIR, "results", "contrastive_insights.jsonl")
+MOCK_URL = os.getenv("LLM_MOCK_URL", "http://127.0.0.1:8400")  # llm_tools/mock_server.py
+MODEL = "gemini-2.5-flash"
+GEN_PARAMS = {"temperature": 0.1, "max_output_tokens": 4096, "response_mime_type": "application/json"}
 
 # Load environment variables
 load_dotenv(ENV_PATH)
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file.")
 
-client = genai.Client(api_key=API_KEY)
+
+def make_client(mock_url=None):
+    """Gemini client for the live API, or for the local mock server at ``mock_url``."""
+    api_key = os.getenv("GEMINI_API_KEY") or ("mock" if mock_url else None)
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in .env file.")
+    http_options = genai.types.HttpOptions(base_url=mock_url) if mock_url else None
+    return genai.Client(api_key=api_key, http_options=http_options)
 
 # ── Prompting ───────────────────────────────────────────────────────────────
 
@@ -43,15 +55,19 @@ Output your analysis strictly in this JSON format:
 }
 """
 
-def generate_insights():
+def generate_insights(client, out_jsonl=OUT_JSONL, pause=2.0, cache=None, cache_provider="gemini"):
+    """Append one contrastive analysis per unprocessed pair to ``out_jsonl``.
+
+    With an ``LLMCache``, pairs already answered for this prompt are read back from it instead of the API.
+    """
     print("Loading ICP pairs...")
     if not os.path.exists(IN_JSONL):
         raise FileNotFoundError(f"Missing {IN_JSONL}")
         
     # Read existing insights to resume if interrupted
     processed_texts = set()
-    if os.path.exists(OUT_JSONL):
-        with open(OUT_JSONL, "r", encoding="utf-8") as f:
+    if os.path.exists(out_jsonl):
+        with open(out_jsonl, "r", encoding="utf-8") as f:
             for line in f:
                 if line.strip():
                     try:
@@ -74,12 +90,12 @@ def generate_insights():
         print("All pairs processed.")
         return
 
-    os.makedirs(os.path.dirname(OUT_JSONL), exist_ok=True)
+    os.makedirs(os.path.dirname(out_jsonl), exist_ok=True)
 
     success_count = 0
     fail_count = 0
 
-    with open(OUT_JSONL, "a", encoding="utf-8") as f_out:
+    with open(out_jsonl, "a", encoding="utf-8") as f_out:
         for i, pair in enumerate(to_process, 1):
             true_label = pair["true_label"]
             error_text = pair["error_text"]
@@ -94,38 +110,47 @@ def generate_insights():
                 f"{correct_text}\n"
             )
 
+            cache_key = LLMCache.key(cache_provider, MODEL, ICP_SYSTEM_PROMPT, user_msg, GEN_PARAMS)
+            raw_text = cache.get(cache_key) if cache else None
+            cached = raw_text is not None
+
             try:
-                # Add retry backoff for rate limiting
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        response = client.models.generate_content(
-                            model='gemini-2.5-flash',
-                            contents=user_msg,
-                            config=genai.types.GenerateContentConfig(
-                                system_instruction=ICP_SYSTEM_PROMPT,
-                                temperature=0.1,
-                                max_output_tokens=4096,
-                                response_mime_type="application/json",
+                if not cached:
+                    # Add retry backoff for rate limiting
+                    max_retries = 3
+                    for attempt in range(max_retries):
+                        try:
+                            response = client.models.generate_content(
+                                model=MODEL,
+                                contents=user_msg,
+                                config=genai.types.GenerateContentConfig(
+                                    system_instruction=ICP_SYSTEM_PROMPT,
+                                    **GEN_PARAMS,
+                                )
                             )
-                        )
-                        break
-                    except Exception as retry_err:
-                        err_str = str(retry_err).lower()
-                        if any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"]) and attempt < max_retries - 1:
-                            wait = 8 * (attempt + 1)
-                            print(f"  [{i}/{len(to_process)}] Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
-                            time.sleep(wait)
-                        else:
-                            raise retry_err
+                            break
+                        except Exception as retry_err:
+                            err_str = str(retry_err).lower()
+                            if any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"]) and attempt < max_retries - 1:
+                                wait = 8 * (attempt + 1)
+                                print(f"  [{i}/{len(to_process)}] Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
+                                time.sleep(wait)
+                            else:
+                                raise retry_err
+                    raw_text = response.text or ""
+                    if cache:
+                        cache.put(cache_key, raw_text, cache_provider, MODEL)
 
                 # Try to parse the LLM output as JSON to ensure validity before saving
                 try:
-                    insights_json = json.loads(response.text)
+                    insights_json = json.loads(raw_text)
                 except json.JSONDecodeError:
                     print(f"[{i}/{len(to_process)}] Error: Invalid JSON returned by model. Skipping.")
                     fail_count += 1
-                    time.sleep(2)
+                    if cache:
+                        cache.delete(cache_key)  # ask the API again next run
+                    if not cached:
+                        time.sleep(pause)
                     continue
 
                 # Merge original metadata with new insights
@@ -141,11 +166,28 @@ def generate_insights():
                 print(f"[{i}/{len(to_process)}] API Error: {e}")
                 fail_count += 1
             
-            # Rate limiting
-            time.sleep(2)
+            # Rate limiting (cache hits never reached the API)
+            if not cached:
+                time.sleep(pause)
 
     print(f"\nFinished processing. Success: {success_count}, Failed: {fail_count}.")
-    print(f"Insights appended to {OUT_JSONL}")
+    print(f"Insights appended to {out_jsonl}")
+    if cache:
+        print(f"Cache: {cache.summary()}")
 
 if __name__ == "__main__":
-    generate_insights()
+    parser = argparse.ArgumentParser(description="Contrastive (ICP) analysis of error/correct pairs with Gemini.")
+    parser.add_argument("--mock", nargs="?", const=MOCK_URL, default=None, metavar="URL",
+                        help=f"Send requests to the local mock API at URL (default: {MOCK_URL})")
+    parser.add_argument("--output", default=None,
+                        help="Output JSONL, appended to and resumed from (default: results/contrastive_insights.jsonl)")
+    parser.add_argument("--pause", type=float, default=2.0, help="Seconds to sleep after each request (default: 2)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the API instead of reusing cached responses (llm_tools/cache.py)")
+    args = parser.parse_args()
+
+    out_jsonl = args.output or (OUT_JSONL.replace(".jsonl", "_mock.jsonl") if args.mock else OUT_JSONL)
+    cache = None if args.no_cache else LLMCache()
+    # Mock responses are cached under their own provider label, never mixed with real ones
+    provider = f"gemini@{args.mock}" if args.mock else "gemini"
+    generate_insights(make_client(args.mock), out_jsonl, args.pause, cache, provider)
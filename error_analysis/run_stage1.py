@@ -2,8 +2,15 @@
 run_stage1.py — Stage 1 of the ErrorMap Pipeline
 Sends each incorrect prediction to Gemini for error classification.
 Output: error_analysis/results/stage1_errors.jsonl
+        (stage1_errors_mock.jsonl with --mock, which sends requests to
+        llm_tools/mock_server.py instead of the live API)
+Responses are cached in llm_tools/cache/ (see llm_tools/cache.py), so a
+re-run with the same prompt and inputs makes no API calls; --no-cache skips it.
+With --batch-api, all uncached rows are submitted as one Gemini batch job
+(llm_tools/batch_jobs.py) instead of one paced request at a time.
 """
 
+import argparse
 import json
 import time
 import csv
@@ -13,6 +20,10 @@ import sys
 from dotenv import load_dotenv
 from google import genai
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_tools.batch_jobs import POLL_INTERVAL, GeminiBatches, clear_results, run_batch
+from llm_tools.cache import LLMCache
+
 # ── Placeholder: paste your Stage 1 prompt here ────────────────────────────
 STAGE_1_SYSTEM_PROMPT = """You are an expert analyst. Your job is to evaluate evidence step by step, consider alternatives, and reach a justified conclusion. Reasoning: high.
 
@@ -59,16 +70,40 @@ INPUT_CSV    = os.path.join(SCRIPT_DIR, "data", "incorrect_predictions.csv")
 OUTPUT_JSONL = os.path.join(SCRIPT_DIR, "results", "stage1_errors.jsonl")
 MODEL        = "gemini-2.5-flash"
 SLEEP_SECS   = 1.5  # ~40 RPM (stay well within free-tier limits)
+MOCK_URL     = os.getenv("LLM_MOCK_URL", "http://127.0.0.1:8400")  # llm_tools/mock_server.py
+
+parser = argparse.ArgumentParser(description="Stage 1: classify each incorrect prediction's error with Gemini.")
+parser.add_argument("--mock", nargs="?", const=MOCK_URL, default=None, metavar="URL",
+                    help=f"Send requests to the local mock API at URL (default: {MOCK_URL})")
+parser.add_argument("--output", default=None,
+                    help="Output JSONL, appended to and resumed from (default: results/stage1_errors.jsonl)")
+parser.add_argument("--sleep", type=float, default=SLEEP_SECS,
+                    help=f"Seconds to sleep after each request (default: {SLEEP_SECS})")
+parser.add_argument("--no-cache", action="store_true",
+                    help="Always call the API instead of reusing cached responses (llm_tools/cache.py)")
+parser.add_argument("--batch-api", action="store_true",
+                    help="Submit all rows as one Gemini batch job instead of paced requests")
+parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                    help=f"Seconds before the first batch status check; grows while waiting (default: {POLL_INTERVAL:.0f})")
+args = parser.parse_args()
+OUTPUT_JSONL = args.output or (OUTPUT_JSONL.replace(".jsonl", "_mock.jsonl") if args.mock else OUTPUT_JSONL)
+SLEEP_SECS   = args.sleep
 
 # ── Load API key ────────────────────────────────────────────────────────────
 load_dotenv(os.path.join(PROJECT_DIR, ".env"))
 
-api_key = os.environ.get("Gemini_API_Key") or os.environ.get("GOOGLE_API_KEY")
+api_key = os.environ.get("Gemini_API_Key") or os.environ.get("GOOGLE_API_KEY") or ("mock" if args.mock else None)
 if not api_key:
     print("ERROR: No Gemini API key found. Set Gemini_API_Key in .env")
     sys.exit(1)
 
-client = genai.Client(api_key=api_key)
+http_options = genai.types.HttpOptions(base_url=args.mock) if args.mock else None
+client = genai.Client(api_key=api_key, http_options=http_options)
+
+# Mock responses are cached under their own provider label, never mixed with real ones
+cache          = None if args.no_cache else LLMCache()
+CACHE_PROVIDER = f"gemini@{args.mock}" if args.mock else "gemini"
+CACHE_PARAMS   = {"response_mime_type": "application/json", "max_output_tokens": 4096}
 
 # ── Resume support: find already-processed row indices ──────────────────────
 processed_indices = set()
@@ -94,13 +129,65 @@ with open(INPUT_CSV, "r", encoding="utf-8") as f:
 total = len(rows)
 to_process = total - len(processed_indices)
 print(f"Total rows: {total} | To process: {to_process}")
-print(f"Model: {MODEL}")
+print(f"Model: {MODEL}{f' (mock API at {args.mock})' if args.mock else ''}")
 print(f"Output: {OUTPUT_JSONL}")
-print(f"Rate limit: {SLEEP_SECS}s sleep per request (~{int(60/SLEEP_SECS)} RPM)\n")
+if args.batch_api:
+    print("Execution: one Gemini batch job (no per-request sleep)\n")
+else:
+    print(f"Rate limit: {SLEEP_SECS}s sleep per request (~{int(60/SLEEP_SECS) if SLEEP_SECS else 'unlimited'} RPM)\n")
 
 # ── Ensure output directory exists ──────────────────────────────────────────
 os.makedirs(os.path.dirname(OUTPUT_JSONL), exist_ok=True)
 
+# ── Gemini call ─────────────────────────────────────────────────────────────
+def call_gemini(user_message, label):
+    """Response text for one row, retrying transient API errors (overloaded, rate limit, unavailable)."""
+    max_retries = 5
+    for attempt in range(max_retries):
+        try:
+            response = client.models.generate_content(
+                model=MODEL,
+                contents=user_message,
+                config=genai.types.GenerateContentConfig(
+                    system_instruction=STAGE_1_SYSTEM_PROMPT,
+                    response_mime_type="application/json",
+                    max_output_tokens=4096,
+                ),
+            )
+            return response.text or ""
+        except Exception as retry_err:
+            err_str = str(retry_err).lower()
+            is_transient = any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"])
+            if is_transient and attempt < max_retries - 1:
+                wait = 8 * (attempt + 1)
+                print(f"  {label} ... Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
+                time.sleep(wait)
+            elif is_transient:
+                raise Exception(f"All {max_retries} retries failed: {retry_err}")
+            else:
+                raise  # non-transient error, don't retry
+
+def build_user_message(row):
+    return (
+        f"Context: {row['text']}\n"
+        f"Reference: {row['ground_truth_urgency']}\n"
+        f"Incorrect Prediction: {row['predicted_urgency']}"
+    )
+
+# ── Batch job (--batch-api): fetch every uncached response up front ─────────
+batch_texts = {}
+if args.batch_api:
+    pending = []
+    for idx, row in enumerate(rows):
+        user_message = build_user_message(row)
+        cache_key = LLMCache.key(CACHE_PROVIDER, MODEL, STAGE_1_SYSTEM_PROMPT, user_message, CACHE_PARAMS)
+        if idx not in processed_indices and not (cache and cache_key in cache):
+            pending.append({"custom_id": f"row-{idx}", "system": STAGE_1_SYSTEM_PROMPT,
+                            "user": user_message, "params": CACHE_PARAMS})
+    backend = GeminiBatches(client, MODEL, CACHE_PROVIDER)
+    batch_texts = run_batch(backend, pending, "stage1", args.poll_interval)
+    print()
+
 # ── Main loop ───────────────────────────────────────────────────────────────
 success_count = 0
 error_count = 0
@@ -112,45 +199,24 @@ for idx, row in enumerate(rows):
     text = row["text"]
     ground_truth = row["ground_truth_urgency"]
     predicted = row["predicted_urgency"]
+    user_message = build_user_message(row)
 
-    user_message = (
-        f"Context: {text}\n"
-        f"Reference: {ground_truth}\n"
-        f"Incorrect Prediction: {predicted}"
-    )
+    cache_key = LLMCache.key(CACHE_PROVIDER, MODEL, STAGE_1_SYSTEM_PROMPT, user_message, CACHE_PARAMS)
+    raw_text  = cache.get(cache_key) if cache else None
+    cached    = raw_text is not None
 
     try:
-        # Retry loop for transient API errors (overloaded, rate limit, unavailable)
-        response = None
-        max_retries = 5
-        for attempt in range(max_retries):
-            try:
-                response = client.models.generate_content(
-                    model=MODEL,
-                    contents=user_message,
-                    config=genai.types.GenerateContentConfig(
-                        system_instruction=STAGE_1_SYSTEM_PROMPT,
-                        response_mime_type="application/json",
-                        max_output_tokens=4096,
-                    ),
-                )
-                break  # success
-            except Exception as retry_err:
-                err_str = str(retry_err).lower()
-                is_transient = any(kw in err_str for kw in ["429", "rate", "quota", "overloaded", "unavailable", "503", "500"])
-                if is_transient and attempt < max_retries - 1:
-                    wait = 8 * (attempt + 1)
-                    print(f"  [{idx+1}/{total}] ... Retry {attempt+1}/{max_retries} in {wait}s ({type(retry_err).__name__})")
-                    time.sleep(wait)
-                elif is_transient:
-                    raise Exception(f"All {max_retries} retries failed: {retry_err}")
-                else:
-                    raise  # non-transient error, don't retry
-
-        if response is None:
-            raise Exception(f"All {max_retries} retries failed")
-
-        raw_text = response.text.strip()
+        if not cached:
+            if args.batch_api:
+                raw_text = batch_texts.get(f"row-{idx}")
+                if raw_text is None:
+                    raise Exception("request failed in the batch job; re-run to retry it")
+            else:
+                raw_text = call_gemini(user_message, f"[{idx+1}/{total}]")
+            if cache:
+                cache.put(cache_key, raw_text, CACHE_PROVIDER, MODEL)
+
+        raw_text = raw_text.strip()
 
         # Parse JSON from response (handle markdown code blocks)
         if raw_text.startswith("```"):
@@ -182,14 +248,20 @@ for idx, row in enumerate(rows):
 
     except json.JSONDecodeError as e:
         error_count += 1
+        if cache:
+            cache.delete(cache_key)   # retry against the API next run
         print(f"  [{idx+1}/{total}] ⚠ JSON parse error — skipping. {e}")
 
     except Exception as e:
         error_count += 1
         print(f"  [{idx+1}/{total}] ✗ Unexpected error — skipping. {e}")
 
-    # Rate limiting
-    time.sleep(SLEEP_SECS)
+    # Rate limiting (cache hits and batch results never reached the API here)
+    if not cached and not args.batch_api:
+        time.sleep(SLEEP_SECS)
+
+if args.batch_api:
+    clear_results("stage1")   # every collected row is in OUTPUT_JSONL (or the cache) now
 
 # ── Summary ─────────────────────────────────────────────────────────────────
 print(f"\n{'='*50}")
@@ -197,4 +269,6 @@ print(f"STAGE 1 COMPLETE")
 print(f"  Successful: {success_count}")
 print(f"  Errors:     {error_count}")
 print(f"  Output:     {OUTPUT_JSONL}")
+if cache:
+    print(f"  Cache:      {cache.summary()}")
 print(f"{'='*50}")
@@ -2,8 +2,11 @@
 run_stage2.py — Stage 2 of the ErrorMap Pipeline
 Clusters Stage 1 error labels into a hierarchical taxonomy via a single LLM call.
 Output: error_analysis/results/final_taxonomy.json
+The response is cached in llm_tools/cache/ (see llm_tools/cache.py), so a
+re-run on unchanged Stage 1 output makes no API call; --no-cache skips it.
 """
 
+import argparse
 import json
 import os
 import sys
@@ -13,6 +16,9 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_tools.cache import LLMCache
+
 # ── Paste your Stage 2 taxonomy prompt here before running ─────────────────
 STAGE_2_SYSTEM_PROMPT = """
 You are an expert AI data analyst. Your task is to review a list of specific
@@ -54,6 +60,11 @@ INPUT_JSONL = SCRIPT_DIR / "stage1_errors.jsonl"
 OUTPUT_JSON = SCRIPT_DIR / "results" / "final_taxonomy.json"
 MODEL       = "gemini-2.5-flash"
 
+parser = argparse.ArgumentParser(description="Stage 2: cluster Stage 1 error labels into a taxonomy with Gemini.")
+parser.add_argument("--no-cache", action="store_true",
+                    help="Always call the API instead of reusing cached responses (llm_tools/cache.py)")
+args = parser.parse_args()
+
 # ── Load API key ────────────────────────────────────────────────────────────
 load_dotenv(SCRIPT_DIR.parent / ".env")
 api_key = os.environ.get("Gemini_API_Key") or os.environ.get("GOOGLE_API_KEY")
@@ -81,24 +92,35 @@ print(f"Loaded {len(errors)} error entries from Stage 1.")
 errors_json = json.dumps(errors, ensure_ascii=False)
 user_message = f"{STAGE_2_SYSTEM_PROMPT}\n\nHere are the Stage 1 error labels:\n{errors_json}"
 
-# ── Single API call ─────────────────────────────────────────────────────────
-print(f"Calling {MODEL} ...")
-response = client.models.generate_content(
-    model=MODEL,
-    contents=user_message,
-    config=types.GenerateContentConfig(
-        response_mime_type="application/json",
-    ),
-)
+# ── Single API call (or cached response) ────────────────────────────────────
+cache     = None if args.no_cache else LLMCache()
+cache_key = LLMCache.key("gemini", MODEL, "", user_message, {"response_mime_type": "application/json"})
+raw_text  = cache.get(cache_key) if cache else None
+if raw_text is not None:
+    print(f"Using cached {MODEL} response.")
+else:
+    print(f"Calling {MODEL} ...")
+    response = client.models.generate_content(
+        model=MODEL,
+        contents=user_message,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+        ),
+    )
+    raw_text = response.text or ""
+    if cache:
+        cache.put(cache_key, raw_text, "gemini", MODEL)
 
 # ── Parse & validate ────────────────────────────────────────────────────────
 try:
-    taxonomy = json.loads(response.text)
+    taxonomy = json.loads(raw_text)
 except json.JSONDecodeError as e:
+    if cache:
+        cache.delete(cache_key)
     print("ERROR: Could not parse model response as JSON.")
     print(f"JSONDecodeError: {e}")
     print("\n--- Raw response ---")
-    print(response.text)
+    print(raw_text)
     sys.exit(1)
 
 # ── Save output ─────────────────────────────────────────────────────────────
@@ -0,0 +1 @@
+"""Shared tooling for the LLM-calling scripts: response cache and local mock API."""
@@ -0,0 +1,250 @@
+"""Provider batch APIs for bulk LLM classification and error analysis.
+
+Instead of pacing hundreds of synchronous calls with sleeps, a script can
+package every request into one asynchronous batch job:
+
+  1. write   — the requests go to a JSONL job file in the provider's own
+               batch format (Anthropic ``{"custom_id", "params"}``, Gemini
+               ``{"key", "request"}``) under llm_tools/batches/
+  2. submit  — one create call carrying all requests
+  3. poll    — the job is checked at a growing interval until it ends
+  4. collect — results are mapped back to requests by custom id
+
+Batch jobs have their own quota, separate from the per-minute limits, and
+are billed at about half the synchronous price. They finish asynchronously,
+usually within minutes and at most in 24 h. No client-side pacing is needed.
+
+The job id is saved next to the job file until the results are collected.
+Re-running with the same requests after a crash or Ctrl-C resumes polling
+that job instead of submitting and paying for a second one.
+
+Collected texts are appended to ``<name>.results.jsonl`` (keyed by a hash of
+each request, not its custom id) before the job's state is dropped. A run
+that crashes while storing them, or one without a response cache, therefore
+gets them back on the next call instead of submitting them again. Callers
+``clear_results(name)`` once they have persisted every row.
+
+Gemini requests are sent inline, which the API accepts up to 20 MB per job.
+That is ample for Stage 1/ICP-sized inputs.
+
+The local mock (llm_tools/mock_server.py) implements both batch APIs, so
+the whole path runs offline with ``--mock``.
+
+Usage:
+    backend  = AnthropicBatches(client, MODEL)
+    requests = [{"custom_id": "call-0001", "system": SYSTEM_PROMPT, "user": user_prompt,
+                 "params": {"max_tokens": 1024, "temperature": 0.0}}, ...]
+    texts    = run_batch(backend, requests, "haiku_baseline")
+    texts["call-0001"]     # response text, or None if that request failed
+    ...                    # store the rows
+    clear_results("haiku_baseline")
+"""
+
+import hashlib
+import json
+import os
+import time
+
+# ── Config ───────────────────────────────────────────────────────────────────
+JOB_DIR           = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batches")
+POLL_INTERVAL     = 30.0     # seconds before the first status check
+MAX_POLL_INTERVAL = 300.0
+POLL_BACKOFF      = 1.5
+
+
+def _camel(name):
+    head, *rest = name.split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+class AnthropicBatches:
+    """Message Batches API (``client.messages.batches``)."""
+
+    def __init__(self, client, model, label="anthropic"):
+        self.client = client
+        self.model  = model
+        self.label  = label   # provider label; include a mock URL so its jobs are never resumed against the real API
+
+    def job_line(self, request):
+        return {
+            "custom_id": request["custom_id"],
+            "params": {
+                "model": self.model,
+                "system": request["system"],
+                "messages": [{"role": "user", "content": request["user"]}],
+                **request["params"],
+            },
+        }
+
+    def submit(self, requests):
+        return self.client.messages.batches.create(requests=[self.job_line(r) for r in requests]).id
+
+    def status(self, job_id):
+        """``(ended, progress message)``."""
+        batch = self.client.messages.batches.retrieve(job_id)
+        c = batch.request_counts
+        return batch.processing_status == "ended", (
+            f"{batch.processing_status}: {c.succeeded} succeeded, {c.errored} errored, "
+            f"{c.processing} processing, {c.expired} expired"
+        )
+
+    def results(self, job_id, custom_ids):
+        texts = {}
+        for item in self.client.messages.batches.results(job_id):
+            result = item.result
+            texts[item.custom_id] = result.message.content[0].text if result.type == "succeeded" else None
+        return texts
+
+
+class GeminiBatches:
+    """Gemini Batch API (``client.batches``) with inline requests."""
+
+    ENDED = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+    def __init__(self, client, model, label="gemini"):
+        self.client = client
+        self.model  = model
+        self.label  = label
+
+    def job_line(self, request):
+        """One line of a Gemini batch input file (REST field names)."""
+        body = {"contents": [{"role": "user", "parts": [{"text": request["user"]}]}]}
+        if request["system"]:
+            body["systemInstruction"] = {"parts": [{"text": request["system"]}]}
+        if request["params"]:
+            body["generationConfig"] = {_camel(k): v for k, v in request["params"].items()}
+        return {"key": request["custom_id"], "request": body}
+
+    def submit(self, requests):
+        inlined = [
+            {
+                "contents": r["user"],
+                "config": {**({"system_instruction": r["system"]} if r["system"] else {}), **r["params"]},
+                "metadata": {"key": r["custom_id"]},
+            }
+            for r in requests
+        ]
+        job = self.client.batches.create(model=self.model, src=inlined,
+                                         config={"display_name": f"batch-{len(requests)}-requests"})
+        return job.name
+
+    def status(self, job_id):
+        job = self.client.batches.get(name=job_id)
+        state = getattr(job.state, "value", job.state)
+        return state in self.ENDED, state
+
+    def results(self, job_id, custom_ids):
+        """Responses come back in request order; the ``key`` metadata is used when present."""
+        job = self.client.batches.get(name=job_id)
+        responses = (job.dest.inlined_responses if job.dest else None) or []
+        texts = {}
+        for custom_id, item in zip(custom_ids, responses):
+            key = (item.metadata or {}).get("key", custom_id)
+            texts[key] = item.response.text if item.response is not None and not item.error else None
+        return texts
+
+
+def request_hash(backend, request):
+    """Identity of one request's content; the custom id is left out so a re-run may renumber."""
+    content = {"provider": backend.label, "model": backend.model,
+               **{k: request[k] for k in ("system", "user", "params")}}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def results_path(name, job_dir=JOB_DIR):
+    return os.path.join(job_dir, f"{name}.results.jsonl")
+
+
+def load_results(path):
+    """``{request hash: text}`` collected by earlier runs; a line cut short by a kill is ignored."""
+    saved = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                saved[record["hash"]] = record["text"]
+    return saved
+
+
+def save_results(path, records):
+    """Append ``(request hash, text)`` pairs and fsync them before the job state is dropped."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps({"hash": h, "text": text}, ensure_ascii=False) + "\n" for h, text in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def clear_results(name, job_dir=JOB_DIR):
+    """Forget the collected texts of ``name`` once the caller has stored its rows."""
+    path = results_path(name, job_dir)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def run_batch(backend, requests, name, poll_interval=POLL_INTERVAL, job_dir=JOB_DIR):
+    """Run ``requests`` as one batch job, or resume the one already submitted for them.
+
+    Requests whose results an earlier run already collected (see ``clear_results``)
+    are answered from ``<name>.results.jsonl`` and not submitted again.
+
+    Each request is a dict with ``custom_id``, ``system``, ``user`` and ``params`` (decoding
+    settings, in the SDK's own names). Returns ``{custom_id: response text or None}``; requests
+    that errored, expired or are missing from the results map to None.
+    """
+    if not requests:
+        return {}
+    os.makedirs(job_dir, exist_ok=True)
+    store  = results_path(name, job_dir)
+    hashes = {r["custom_id"]: request_hash(backend, r) for r in requests}
+    saved  = load_results(store)
+    texts  = {cid: saved[h] for cid, h in hashes.items() if h in saved}
+    if texts:
+        print(f"Reusing {len(texts)} results collected by an earlier run ({store})")
+    requests = [r for r in requests if r["custom_id"] not in texts]
+    if requests:
+        texts.update(_run_job(backend, requests, name, poll_interval, job_dir, store, hashes))
+    return {cid: texts.get(cid) for cid in hashes}
+
+
+def _run_job(backend, requests, name, poll_interval, job_dir, store, hashes):
+    lines  = [backend.job_line(r) for r in requests]
+    digest = hashlib.sha256((backend.label + json.dumps(lines, sort_keys=True)).encode("utf-8")).hexdigest()[:12]
+    job_path   = os.path.join(job_dir, f"{name}-{digest}.jsonl")
+    state_path = os.path.join(job_dir, f"{name}-{digest}.state.json")
+
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        print(f"Resuming batch job {state['job_id']} ({len(requests)} requests, submitted "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(state['submitted']))})")
+    else:
+        with open(job_path, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        state = {"provider": backend.label, "model": backend.model, "job_id": backend.submit(requests),
+                 "custom_ids": [r["custom_id"] for r in requests], "submitted": time.time()}
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        print(f"Submitted batch job {state['job_id']}: {len(requests)} requests ({job_path})")
+
+    # ── Poll ─────────────────────────────────────────────────────────────────
+    delay = poll_interval
+    while True:
+        ended, progress = backend.status(state["job_id"])
+        print(f"  [{time.time() - state['submitted']:.0f}s] {progress}")
+        if ended:
+            break
+        time.sleep(delay)
+        delay = min(delay * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+    texts = backend.results(state["job_id"], state["custom_ids"])
+    texts = {cid: texts.get(cid) for cid in state["custom_ids"]}
+    # Stored before the state goes, so a crash from here on never pays for the job twice
+    save_results(store, [(hashes[cid], text) for cid, text in texts.items() if text is not None])
+    os.remove(state_path)   # the job file stays as a record of what was sent
+    failed = sum(text is None for text in texts.values())
+    print(f"Batch job {state['job_id']} collected: {len(texts) - failed} succeeded, {failed} failed")
+    return texts
@@ -0,0 +1,195 @@
+"""On-disk cache of LLM responses shared by every LLM-calling script.
+
+Entries are keyed by (provider, model, sha256 of the system prompt, sha256
+of the user prompt, decoding parameters), so an identical request is paid
+for once. Re-running a temperature-0 baseline or Stage 1/ICP analysis then
+costs nothing and returns instantly, which also makes iterating on the
+downstream parsing fast. Prompts are stored only as hashes.
+
+The store is one SQLite file (WAL, safe across processes) with:
+  - TTL          — entries older than ``ttl`` seconds are ignored and purged
+  - size cap     — at most ``max_entries`` rows / ``max_bytes`` of responses
+  - LRU eviction — past the cap, the least recently read entries go first
+
+Bookkeeping is kept off the hot path. Entry count and total size are
+tracked as running totals, so a put only scans the table when a cap is
+crossed or every ``SCAN_EVERY`` puts (which also purges expired rows and
+picks up entries other processes added). Hits record their ``last_used``
+time in memory and write them in one batch every ``TOUCH_BATCH`` hits,
+before any eviction and on close (also run at interpreter exit).
+
+Callers cache the raw response text and parse it afterwards. If the text
+turns out to be unusable, they ``delete`` the key so the next attempt goes
+back to the API instead of replaying the bad answer.
+
+Counters exposed by ``stats()``: hits, misses, expired, evictions, entries,
+bytes and hit_rate.
+
+Usage:
+    cache = LLMCache()
+    key   = cache.key("anthropic", MODEL, SYSTEM_PROMPT, user_prompt, {"temperature": 0.0})
+    text  = cache.get(key)
+    if text is None:
+        text = call_the_api()
+        cache.put(key, text)
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# ── Config ───────────────────────────────────────────────────────────────────
+CACHE_PATH  = os.getenv("LLM_CACHE_PATH",
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "llm_responses.sqlite"))
+TTL         = 30 * 24 * 3600     # seconds
+MAX_ENTRIES = 100_000
+MAX_BYTES   = 512 * 1024 * 1024
+SCAN_EVERY  = 1000               # puts between full recounts / TTL purges
+TOUCH_BATCH = 100                # hits buffered before their last_used times are written
+
+
+def sha256(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with TTL, size cap and LRU eviction."""
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.path        = path
+        self.ttl         = ttl
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.lock        = threading.Lock()
+        self.counters    = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self.touched     = {}   # key -> last_used not yet written
+        self.puts        = 0    # since the last full scan
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, provider TEXT, model TEXT, response TEXT,"
+            " size INTEGER, created REAL, last_used REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.db.commit()
+        self._scan(time.time())
+        atexit.register(self.close)
+
+    @staticmethod
+    def key(provider, model, system, user, params=None):
+        """Cache key for one request; ``params`` holds the decoding settings (temperature, max tokens, ...)."""
+        parts = [provider, model, sha256(system), sha256(user), json.dumps(params or {}, sort_keys=True)]
+        return sha256("\n".join(parts))
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    def get(self, key):
+        """Cached response text, or None on a miss or an expired entry."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._delete(key)
+                self.db.commit()
+                self.counters["expired"] += 1
+                row = None
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self.touched[key] = now
+            if len(self.touched) >= TOUCH_BATCH:
+                self._flush_touched()
+                self.db.commit()
+            self.counters["hits"] += 1
+            return row[0]
+
+    def __contains__(self, key):
+        """Whether a live entry exists; unlike ``get`` it leaves counters and recency alone."""
+        with self.lock:
+            row = self.db.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and not (self.ttl and time.time() - row[0] > self.ttl)
+
+    def put(self, key, response, provider="", model=""):
+        now  = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            self._delete(key)   # a replaced entry leaves the running totals first
+            self.db.execute("INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (key, provider, model, response, size, now, now))
+            self.entries += 1
+            self.bytes   += size
+            self.puts    += 1
+            if self.puts >= SCAN_EVERY or self.entries > self.max_entries or self.bytes > self.max_bytes:
+                self._scan(now)
+                self._evict()
+            self.db.commit()
+
+    def delete(self, key):
+        with self.lock:
+            self._delete(key)
+            self.db.commit()
+
+    # ── Bookkeeping ──────────────────────────────────────────────────────────
+    def _delete(self, key):
+        row = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.touched.pop(key, None)
+        if row is not None:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.entries -= 1
+            self.bytes   -= row[0]
+
+    def _flush_touched(self):
+        if self.touched:
+            self.db.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                [(used, key) for key, used in self.touched.items()])
+            self.touched.clear()
+
+    def _scan(self, now):
+        """Purge expired rows and recount, picking up changes made by other processes."""
+        if self.ttl:
+            self.db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self.entries, self.bytes = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self.puts = 0
+
+    def _evict(self):
+        """Delete least recently used rows until under both caps."""
+        if self.entries <= self.max_entries and self.bytes <= self.max_bytes:
+            return
+        self._flush_touched()
+        evicted = 0
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if self.entries <= self.max_entries and self.bytes <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.entries -= 1
+            self.bytes   -= size
+            evicted      += 1
+        self.counters["evictions"] += evicted
+
+    # ── Reporting ────────────────────────────────────────────────────────────
+    def stats(self):
+        with self.lock:
+            c = dict(self.counters)
+            c["entries"], c["bytes"] = self.entries, self.bytes
+        lookups = c["hits"] + c["misses"]
+        c["hit_rate"] = round(c["hits"] / lookups, 4) if lookups else 0.0
+        return c
+
+    def summary(self):
+        s = self.stats()
+        return f"{s['hits']} hits, {s['misses']} misses ({s['entries']} entries, {s['bytes'] / 1e6:.1f} MB on disk)"
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self._flush_touched()
+                self.db.commit()
+                self.db.close()
+                self.db = None
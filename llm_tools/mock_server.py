@@ -0,0 +1,588 @@
+"""Local stand-in for the OpenAI, Anthropic and Gemini APIs.
+
+Lets every LLM-driven script (generate_complaints.py, baseline_llm_haiku.py,
+run_stage1.py, run_icp_analysis.py) run offline, so their concurrency,
+retry and throughput behaviour can be benchmarked and regression-tested
+without a key or any spend. Each script takes ``--mock`` to point its SDK
+here.
+
+Response sources (``--mode``):
+  synthetic — built from the prompt. The shapes match what each pipeline
+              parses: N complaints, N urgency/emotion labels, a Stage 1
+              final_answer or an ICP analysis. Content is derived from a
+              hash of the request, so it is the same on every run.
+  replay    — served from a cassette (JSONL of recorded exchanges keyed by
+              provider, path and canonical request body). A miss falls back
+              to synthetic, or returns 404 with ``--strict``.
+  record    — forwarded to the real vendor API with the client's
+              credentials, then appended to the cassette and returned.
+
+Limits are enforced the way the real APIs enforce them. Requests and
+estimated tokens are counted over a sliding window (60 s by default).
+Anything over ``--rpm``/``--tpm``, or beyond ``--max-in-flight`` concurrent
+requests, gets a 429 in the provider's error shape with a Retry-After
+header. Latency grows with load. ``--error-rate`` injects 500s. With
+``--seed``, the injected errors and latency jitter depend only on the
+request and how many times it has been seen, not on thread timing.
+
+Batch jobs (Anthropic Message Batches, Gemini Batch API) are accepted
+whole, outside the rate limits, and end ``--batch-delay`` seconds after
+submission. Each request in a job is answered as if it had been sent to
+the synchronous endpoint, so cassettes recorded from synchronous runs
+replay into batches too. ``--error-rate`` fails individual requests.
+Record mode does not take batches.
+
+Endpoints:
+  POST /v1/chat/completions                          — OpenAI
+  POST /v1/messages                                  — Anthropic
+  POST /v1/messages/batches                          — Anthropic batch: create
+  GET  /v1/messages/batches/<id>[/results]           — Anthropic batch: status, JSONL results
+  POST /v1beta/models/<model>:generateContent        — Gemini
+  POST /v1beta/models/<model>:batchGenerateContent   — Gemini batch: create
+  GET  /v1beta/batches/<id>                          — Gemini batch: status and inline results
+  GET  /stats                                        — per-provider counters
+
+Usage:
+    python llm_tools/mock_server.py --rpm 500 --tpm 400000 --latency-ms 800
+    python llm_tools/mock_server.py --mode record --cassette cassettes/stage1.jsonl --rpm 0 --tpm 0 --latency-ms 0
+    python llm_tools/mock_server.py --mode replay --cassette cassettes/stage1.jsonl --strict
+    python llm_tools/mock_server.py --batch-delay 5
+    python data_generation/generate_complaints.py --mock --total 500 --output /tmp/mock_complaints.csv
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ── Config ───────────────────────────────────────────────────────────────────
+HOST            = "127.0.0.1"
+PORT            = 8400
+CHARS_PER_TOKEN = 4
+LABELS          = ["Low", "Medium", "High"]
+UPSTREAMS       = {
+    "openai":    "https://api.openai.com",
+    "anthropic": "https://api.anthropic.com",
+    "gemini":    "https://generativelanguage.googleapis.com",
+}
+# Request headers passed through to the vendor in record mode
+FORWARD_HEADERS = ["authorization", "x-api-key", "anthropic-version", "anthropic-beta", "x-goog-api-key",
+                   "content-type"]
+
+
+class RateWindow:
+    """Requests and tokens admitted over the last ``window`` seconds."""
+
+    def __init__(self, rpm, tpm, max_in_flight, window=60.0):
+        self.rpm           = rpm
+        self.tpm           = tpm
+        self.max_in_flight = max_in_flight
+        self.window        = window
+        self.events        = deque()   # (timestamp, tokens)
+        self.tokens        = 0
+        self.in_flight     = 0
+        self.lock          = threading.Lock()
+        self.counters      = Counter()
+
+    def admit(self, provider, tokens):
+        """Reserve a slot; returns None if admitted, else seconds to wait."""
+        with self.lock:
+            now = time.monotonic()
+            while self.events and now - self.events[0][0] >= self.window:
+                self.tokens -= self.events.popleft()[1]
+            self.counters[f"{provider}.requests"] += 1
+            over = (
+                (self.rpm and len(self.events) >= self.rpm)
+                or (self.tpm and self.tokens + tokens > self.tpm)
+                or (self.max_in_flight and self.in_flight >= self.max_in_flight)
+            )
+            if over:
+                self.counters[f"{provider}.rate_limited"] += 1
+                oldest = self.events[0][0] if self.events else now
+                return max(0.1, min(self.window - (now - oldest), 5.0))
+            self.events.append((now, tokens))
+            self.tokens    += tokens
+            self.in_flight += 1
+            self.counters["peak_in_flight"] = max(self.counters["peak_in_flight"], self.in_flight)
+            return None
+
+    def done(self, provider, outcome):
+        with self.lock:
+            self.in_flight -= 1
+            self.counters[f"{provider}.{outcome}"] += 1
+
+    def count(self, name, n=1):
+        """Counter outside the window, e.g. batch requests."""
+        with self.lock:
+            self.counters[name] += n
+
+    def stats(self):
+        with self.lock:
+            return {**dict(sorted(self.counters.items())), "in_flight": self.in_flight,
+                    "window_tokens": self.tokens}
+
+
+class Cassette:
+    """Append-only JSONL store of recorded exchanges, indexed by request key."""
+
+    def __init__(self, path):
+        self.path    = path
+        self.entries = {}
+        self.lock    = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[entry["key"]] = entry
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, provider, path, request, status, response):
+        entry = {"key": key, "provider": provider, "path": path, "request": request,
+                 "status": status, "response": response}
+        with self.lock:
+            self.entries[key] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class BatchStore:
+    """Submitted batch jobs; each ends ``delay`` seconds after submission."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.jobs  = {}
+        self.lock  = threading.Lock()
+
+    def submit(self, provider, model, items, display_name=""):
+        """Store a job of ``items`` (``(custom_id, sync path, sync body)``) and return it."""
+        prefix = "msgbatch_mock_" if provider == "anthropic" else ""
+        job = {"id": prefix + uuid.uuid4().hex[:20], "provider": provider, "model": model, "items": items,
+               "display_name": display_name, "created": datetime.now(timezone.utc), "results": None}
+        with self.lock:
+            self.jobs[job["id"]] = job
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def ended(self, job):
+        return datetime.now(timezone.utc) >= job["created"] + timedelta(seconds=self.delay)
+
+
+def _iso(moment):
+    return moment.isoformat().replace("+00:00", "Z") if moment else None
+
+
+def request_key(provider, path, body):
+    """Cassette key: provider, path and canonical request body."""
+    return hashlib.sha256(f"{provider}\n{path}\n{json.dumps(body, sort_keys=True)}".encode("utf-8")).hexdigest()
+
+
+# ── Provider request/response shapes ─────────────────────────────────────────
+def route(path):
+    """Provider and model for a request path, or ``(None, None)``."""
+    path = path.split("?", 1)[0].rstrip("/")
+    if path.endswith("/chat/completions"):
+        return "openai", None
+    if path.endswith("/messages"):
+        return "anthropic", None
+    match = re.search(r"/models/([^/:]+):generateContent$", path)
+    if match:
+        return "gemini", match.group(1)
+    return None, None
+
+
+def _text(content):
+    """Flatten a string or a list of text blocks/parts."""
+    if isinstance(content, str):
+        return content
+    return "\n".join(block.get("text", "") for block in content or [] if isinstance(block, dict))
+
+
+def parse_request(provider, body):
+    """Normalise a request into ``(model, system, prompt, json_mode)``."""
+    if provider == "openai":
+        messages = body.get("messages", [])
+        system = "\n".join(_text(m.get("content")) for m in messages if m.get("role") in ("system", "developer"))
+        prompt = "\n".join(_text(m.get("content")) for m in messages if m.get("role") == "user")
+        json_mode = (body.get("response_format") or {}).get("type") in ("json_object", "json_schema")
+        return body.get("model", "mock"), system, prompt, json_mode
+    if provider == "anthropic":
+        prompt = "\n".join(_text(m.get("content")) for m in body.get("messages", []) if m.get("role") == "user")
+        return body.get("model", "mock"), _text(body.get("system")), prompt, False
+    # Gemini (REST field names are camelCase; some clients send snake_case)
+    system_part = body.get("systemInstruction") or body.get("system_instruction") or {}
+    config = body.get("generationConfig") or body.get("generation_config") or {}
+    prompt = "\n".join(_text(c.get("parts")) for c in body.get("contents", []))
+    json_mode = (config.get("responseMimeType") or config.get("response_mime_type")) == "application/json"
+    return None, _text(system_part.get("parts")), prompt, json_mode
+
+
+def build_response(provider, model, prompt_tokens, text):
+    completion_tokens = len(text) // CHARS_PER_TOKEN
+    rid = hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+    if provider == "openai":
+        return {
+            "id": f"chatcmpl-mock-{rid}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+    if provider == "anthropic":
+        return {
+            "id": f"msg_mock_{rid}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+        }
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": completion_tokens,
+                          "totalTokenCount": prompt_tokens + completion_tokens},
+        "modelVersion": model,
+    }
+
+
+def error_response(provider, status, message):
+    if provider == "anthropic":
+        kind = {429: "rate_limit_error", 404: "not_found_error"}.get(status, "api_error")
+        return {"type": "error", "error": {"type": kind, "message": message}}
+    if provider == "gemini":
+        kind = {429: "RESOURCE_EXHAUSTED", 404: "NOT_FOUND"}.get(status, "INTERNAL")
+        return {"error": {"code": status, "message": message, "status": kind}}
+    kind = {429: "rate_limit_exceeded", 404: "not_found"}.get(status, "server_error")
+    return {"error": {"message": message, "type": kind, "code": kind}}
+
+
+def anthropic_batch(job, ended, base_url):
+    """A MessageBatch object; ``results`` is filled in once the job has ended."""
+    counts = Counter(status == 200 for status, _payload in job["results"] or [])
+    n = len(job["items"])
+    return {
+        "id": job["id"],
+        "type": "message_batch",
+        "processing_status": "ended" if ended else "in_progress",
+        "request_counts": {"processing": 0 if ended else n, "succeeded": counts[True], "errored": counts[False],
+                           "canceled": 0, "expired": 0},
+        "created_at": _iso(job["created"]),
+        "expires_at": _iso(job["created"] + timedelta(hours=24)),
+        "ended_at": _iso(job.get("ended_at")),
+        "archived_at": None,
+        "cancel_initiated_at": None,
+        "results_url": f"{base_url}/v1/messages/batches/{job['id']}/results" if ended else None,
+    }
+
+
+def anthropic_batch_results(job):
+    """JSONL body of a finished Anthropic batch, one line per request."""
+    lines = []
+    for (custom_id, _path, _body), (status, payload) in zip(job["items"], job["results"]):
+        result = ({"type": "succeeded", "message": payload} if status == 200
+                  else {"type": "errored", "error": payload})
+        lines.append(json.dumps({"custom_id": custom_id, "result": result}))
+    return "\n".join(lines) + "\n"
+
+
+def gemini_batch(job, ended):
+    """A batch operation; inline responses keep each request's metadata."""
+    metadata = {
+        "@type": "type.googleapis.com/google.ai.generativelanguage.v1beta.GenerateContentBatch",
+        "model": f"models/{job['model']}",
+        "displayName": job["display_name"],
+        "state": "BATCH_STATE_SUCCEEDED" if ended else "BATCH_STATE_RUNNING",
+        "createTime": _iso(job["created"]),
+    }
+    if ended:
+        responses = []
+        for (custom_id, _path, _body), (status, payload) in zip(job["items"], job["results"]):
+            entry = {"response": payload} if status == 200 else {"error": payload["error"]}
+            if custom_id is not None:
+                entry["metadata"] = {"key": custom_id}
+            responses.append(entry)
+        metadata["output"] = {"inlinedResponses": {"inlinedResponses": responses}}
+    return {"name": f"batches/{job['id']}", "metadata": metadata, "done": ended}
+
+
+# ── Synthetic content ────────────────────────────────────────────────────────
+def synthetic_text(system, prompt, json_mode, rng):
+    """A body each pipeline can parse, chosen by recognising its prompt."""
+    generate = re.search(r"Generate exactly (\d+) distinct customer complaints", prompt)
+    if generate:
+        return json.dumps({"complaints": [
+            f"Synthetic complaint {i + 1}: my service has been unreliable since the "
+            f"{rng.randint(1, 28)}th and two calls have not fixed it. Reference {rng.getrandbits(32):08x}."
+            for i in range(int(generate.group(1)))
+        ]})
+    classify = re.search(r"Classify each of the following (\d+) complaints", prompt)
+    if classify:
+        return json.dumps({"results": [
+            {"urgency": rng.choice(LABELS), "emotion": rng.choice(LABELS)} for _ in range(int(classify.group(1)))
+        ]})
+    if "error_title" in system:
+        title = rng.choice(["Missed explicit deadline", "Overweighted emotional tone", "Ignored service outage"])
+        return json.dumps({"required_criteria": [], "final_answer": {
+            "error_summary": f"Synthetic summary: the model {title.lower()}.", "error_title": title}})
+    if "linguistic_delta" in system:
+        return json.dumps({
+            "linguistic_delta": "Synthetic: the correct text states the impact in its first sentence.",
+            "algorithmic_blindspot": "Synthetic: urgency cues late in long texts.",
+            "actionable_fix": "Synthetic: add examples with the urgency cue at the end of the text.",
+        })
+    return json.dumps({"response": "synthetic"}) if json_mode else "Synthetic response."
+
+
+# ── HTTP ─────────────────────────────────────────────────────────────────────
+class MockHandler(BaseHTTPRequestHandler):
+    limits     = None    # RateWindow, set in main()
+    cassette   = None    # Cassette
+    mode       = "synthetic"
+    strict     = False
+    latency    = 0.5     # seconds at zero load
+    error_rate = 0.0
+    seed       = None
+    batches    = None    # BatchStore
+    seen       = Counter()
+    seen_lock  = threading.Lock()
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _rng(self, key):
+        """Per-request RNG: seeded by the request and how often it has been seen."""
+        with self.seen_lock:
+            self.seen[key] += 1
+            n = self.seen[key]
+        return random.Random(f"{self.seed}:{key}:{n}")
+
+    def _upstream(self, provider, raw):
+        """Forward the request to the real API (record mode)."""
+        headers = {k: v for k, v in self.headers.items() if k.lower() in FORWARD_HEADERS}
+        request = urllib.request.Request(UPSTREAMS[provider] + self.path, data=raw, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b"{}")
+
+    def _offline(self, provider, model, path, body):
+        """Replayed, strict-miss or synthetic answer: ``(status, payload, outcome)``."""
+        parsed_model, system, prompt, json_mode = parse_request(provider, body)
+        model = model or parsed_model
+        key = request_key(provider, path, body)
+        recorded = self.cassette.get(key)
+        if recorded is not None:
+            return recorded["status"], recorded["response"], "replayed"
+        if self.strict:
+            return 404, error_response(provider, 404, f"No cassette entry for request {key[:12]}"), "misses"
+        # Synthetic content depends on the request only, not on retries
+        text = synthetic_text(system, prompt, json_mode, random.Random(f"{self.seed}:{key}"))
+        prompt_tokens = (len(system) + len(prompt)) // CHARS_PER_TOKEN
+        return 200, build_response(provider, model, prompt_tokens, text), "synthetic"
+
+    # ── Batch jobs ───────────────────────────────────────────────────────────
+    def _create_batch(self, provider, model, body):
+        """Accept a batch, each request rewritten as its synchronous path and body."""
+        if self.mode == "record":
+            self._send_json(400, error_response(provider, 400, "Batches are not recorded; record the "
+                                                               "synchronous calls and replay them into batches"))
+            return
+        items = []
+        if provider == "anthropic":
+            for request in body.get("requests", []):
+                items.append((request["custom_id"], "/v1/messages", request["params"]))
+        else:
+            batch = body.get("batch", {})
+            for entry in batch.get("inputConfig", {}).get("requests", {}).get("requests", []):
+                request = dict(entry["request"])
+                item_model = request.pop("model", None) or model
+                items.append(((entry.get("metadata") or {}).get("key"),
+                              f"/v1beta/models/{item_model.split('/')[-1]}:generateContent", request))
+        job = self.batches.submit(provider, model, items, body.get("batch", {}).get("displayName", ""))
+        self.limits.count(f"{provider}.batch_jobs")
+        self.limits.count(f"{provider}.batch_requests", len(items))
+        self._send_json(200, self._batch_status(job))
+
+    def _finish_batch(self, job):
+        """Answer every request once the job's delay has passed."""
+        with self.batches.lock:
+            if job["results"] is not None or not self.batches.ended(job):
+                return
+            results = []
+            for custom_id, path, body in job["items"]:
+                model = path.split("/models/")[-1].split(":")[0] if job["provider"] == "gemini" else None
+                if self._rng(request_key(job["provider"], path, body)).random() < self.error_rate:
+                    status, payload, outcome = 500, error_response(job["provider"], 500,
+                                                                   "Injected server error (mock)"), "server_errors"
+                else:
+                    status, payload, outcome = self._offline(job["provider"], model, path, body)
+                self.limits.count(f"{job['provider']}.batch_{outcome}")
+                results.append((status, payload))
+            job["results"]  = results
+            job["ended_at"] = datetime.now(timezone.utc)
+
+    def _batch_status(self, job):
+        self._finish_batch(job)
+        ended = job["results"] is not None
+        if job["provider"] == "anthropic":
+            return anthropic_batch(job, ended, f"http://{self.headers.get('Host', f'{HOST}:{PORT}')}")
+        return gemini_batch(job, ended)
+
+    # ── Routing ──────────────────────────────────────────────────────────────
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/stats":
+            self._send_json(200, self.limits.stats())
+            return
+        # /v1/messages/batches/<id>[/results] (Anthropic) or /v1beta/batches/<id> (Gemini)
+        match = re.search(r"/batches/([^/]+)(/results)?$", path)
+        job = self.batches.get(match.group(1)) if match else None
+        if job is None:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+        elif match.group(2):
+            self._finish_batch(job)
+            if job["results"] is None:
+                self._send_json(400, error_response("anthropic", 400, "Batch has not ended yet"))
+                return
+            body = anthropic_batch_results(job).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/binary")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(200, self._batch_status(job))
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?", 1)[0]
+        batch_model = re.search(r"/models/([^/:]+):batchGenerateContent$", path)
+        if path.rstrip("/").endswith("/v1/messages/batches"):
+            self._create_batch("anthropic", None, json.loads(raw or b"{}"))
+            return
+        if batch_model:
+            self._create_batch("gemini", batch_model.group(1), json.loads(raw or b"{}"))
+            return
+        provider, path_model = route(self.path)
+        if provider is None:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        body = json.loads(raw or b"{}")
+        model, system, prompt, json_mode = parse_request(provider, body)
+        model = path_model or model
+        key = request_key(provider, path, body)
+        rng = self._rng(key)
+        prompt_tokens = (len(system) + len(prompt)) // CHARS_PER_TOKEN
+
+        wait = self.limits.admit(provider, prompt_tokens)
+        if wait is not None:
+            self._send_json(429, error_response(provider, 429, "Rate limit reached (mock)"),
+                            {"Retry-After": f"{wait:.2f}"})
+            return
+
+        outcome = "server_errors"
+        try:
+            if rng.random() < self.error_rate:
+                time.sleep(self.latency * rng.uniform(0.1, 0.5))
+                self._send_json(500, error_response(provider, 500, "Injected server error (mock)"))
+                return
+
+            if self.mode == "record":
+                status, payload = self._upstream(provider, raw)
+                if status == 200:
+                    self.cassette.put(key, provider, path, body, status, payload)
+                outcome = "recorded"
+            else:
+                status, payload, outcome = self._offline(provider, model, path, body)
+
+            if self.mode != "record":
+                # Latency rises with load, like a shared backend under pressure
+                load = self.limits.in_flight / (self.limits.max_in_flight or 64)
+                time.sleep(self.latency * (1 + load) * rng.uniform(0.8, 1.2))
+            self._send_json(status, payload)
+        finally:
+            self.limits.done(provider, outcome)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI, Anthropic and Gemini APIs.")
+    parser.add_argument("--host", default=HOST, help=f"Bind address (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port (default: {PORT})")
+    parser.add_argument("--mode", choices=["synthetic", "replay", "record"], default="synthetic",
+                        help="Where responses come from (default: synthetic)")
+    parser.add_argument("--cassette", default=None, help="JSONL cassette read in replay mode, appended in record mode")
+    parser.add_argument("--strict", action="store_true",
+                        help="Replay mode: answer 404 on a cassette miss instead of a synthetic response")
+    parser.add_argument("--rpm", type=int, default=500, help="Requests per window before 429 (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=400_000, help="Prompt tokens per window before 429 (0 = unlimited)")
+    parser.add_argument("--max-in-flight", type=int, default=32,
+                        help="Concurrent requests before 429 (0 = unlimited)")
+    parser.add_argument("--window", type=float, default=60.0,
+                        help="Rate-limit window in seconds; shorten it for quick runs (default: 60)")
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="Response latency at zero load (default: 500)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of admitted requests answered with 500")
+    parser.add_argument("--batch-delay", type=float, default=10.0,
+                        help="Seconds from batch submission until the job has ended (default: 10)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for injected errors, latency jitter and synthetic content (default: 0)")
+    args = parser.parse_args()
+
+    if args.mode != "synthetic" and not args.cassette:
+        parser.error(f"--mode {args.mode} needs --cassette")
+
+    MockHandler.limits     = RateWindow(args.rpm, args.tpm, args.max_in_flight, args.window)
+    MockHandler.cassette   = Cassette(args.cassette)
+    MockHandler.mode       = args.mode
+    MockHandler.strict     = args.strict
+    MockHandler.latency    = args.latency_ms / 1000
+    MockHandler.error_rate = args.error_rate
+    MockHandler.seed       = args.seed
+    MockHandler.batches    = BatchStore(args.batch_delay)
+
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print(f"Mock LLM API on http://{args.host}:{args.port} ({args.mode}"
+          f"{f', {len(MockHandler.cassette.entries)} cassette entries' if args.cassette else ''}; "
+          f"rpm {args.rpm or 'inf'}, tpm {args.tpm or 'inf'}, max in-flight {args.max_in_flight or 'inf'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nShutting down. {MockHandler.limits.stats()}")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
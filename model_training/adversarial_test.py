@@ -1,40 +1,24 @@
+import argparse
 import os
-import torch
-import torch.nn as nn
-from transformers import AutoTokenizer, AutoModel, AutoConfig
 
-# ── Config ───────────────────────────────────────────────────────────────────
-MODEL_DIR  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_output")
-MAX_LENGTH = 192
-LABEL_NAMES = ["Low", "Medium", "High"]
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+from inference import InferenceEngine
+from modeling import DEVICE, MODEL_DIR, cache_variant, weights_path
+from prediction_cache import PredictionCache
 
-# ── Model (must match train.py architecture exactly) ─────────────────────────
-class DeBERTaMultiHead(nn.Module):
-    def __init__(self, config_path, num_classes=3):
-        super().__init__()
-        config            = AutoConfig.from_pretrained(config_path)
-        self.backbone     = AutoModel.from_config(config)   # structure only, weights loaded from state dict
-        hidden_size       = config.hidden_size
-        self.urgency_head = nn.Linear(hidden_size, num_classes)
-        self.emotion_head = nn.Linear(hidden_size, num_classes)
-
-    def forward(self, input_ids, attention_mask, token_type_ids=None):
-        outputs = self.backbone(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            token_type_ids=token_type_ids,
-        )
-        cls = outputs.last_hidden_state[:, 0, :]
-        return self.urgency_head(cls), self.emotion_head(cls)
+parser = argparse.ArgumentParser(description="Run the 10-item adversarial test.")
+parser.add_argument("--int8", action="store_true",
+                    help="Use the int8 weights written by quantize_model.py (CPU)")
+parser.add_argument("--cache-db", default=None,
+                    help="SQLite file for cached predictions, reused across runs")
+args = parser.parse_args()
 
 # ── Load model & tokenizer ───────────────────────────────────────────────────
-print(f"Loading model from '{MODEL_DIR}' ...")
-tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR)
-model     = DeBERTaMultiHead(MODEL_DIR).to(DEVICE)
-model.load_state_dict(torch.load(os.path.join(MODEL_DIR, "model_weights.pt"), map_location=DEVICE))
-model.eval()
-print(f"Model loaded. Running on {DEVICE}.\n")
+print(f"Loading {'int8' if args.int8 else 'fp32'} model from '{MODEL_DIR}' ...")
+pred_cache = PredictionCache(weights_path(MODEL_DIR, args.int8), db_path=args.cache_db,
+                             variant=cache_variant(MODEL_DIR))
+engine = InferenceEngine.from_pretrained(MODEL_DIR, DEVICE, quantized=args.int8, cache_tokens=True,
+                                         prediction_cache=pred_cache)
+print(f"Model loaded. Running on {engine.device}.\n")
 
 # ── Adversarial test cases ───────────────────────────────────────────────────
 TESTS = [
@@ -120,27 +104,11 @@ TESTS = [
     },
 ]
 
-# ── Inference helper ─────────────────────────────────────────────────────────
-def predict(text):
-    enc = tokenizer(
-        text,
-        max_length=MAX_LENGTH,
-        padding="max_length",
-        truncation=True,
-        return_tensors="pt",
-    )
-    input_ids      = enc["input_ids"].to(DEVICE)
-    attention_mask = enc["attention_mask"].to(DEVICE)
-    token_type_ids = enc.get("token_type_ids", torch.zeros_like(input_ids)).to(DEVICE)
-
-    with torch.no_grad():
-        urg_logits, emo_logits = model(input_ids, attention_mask, token_type_ids)
-
-    urg_probs = torch.softmax(urg_logits, dim=-1).squeeze().cpu().tolist()
-    emo_probs = torch.softmax(emo_logits, dim=-1).squeeze().cpu().tolist()
-    urg_pred  = LABEL_NAMES[int(torch.argmax(urg_logits))]
-    emo_pred  = LABEL_NAMES[int(torch.argmax(emo_logits))]
-    return urg_pred, emo_pred, urg_probs, emo_probs
+# ── Inference ────────────────────────────────────────────────────────────────
+# All ten cases go through the engine in one bucketed pass.
+results = engine.predict(t["text"] for t in TESTS)
+print(f"Prediction cache: {pred_cache.stats()}\n")
+pred_cache.close()
 
 # ── Run tests ────────────────────────────────────────────────────────────────
 from datetime import datetime
@@ -155,11 +123,12 @@ def out(text=""):
 out("=" * 70)
 out("10-ITEM ADVERSARIAL TEST")
 out(f"Timestamp : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-out(f"Model dir : {MODEL_DIR}")
+out(f"Model dir : {MODEL_DIR}{' (int8)' if args.int8 else ''}")
 out("=" * 70)
 
-for t in TESTS:
-    urg_pred, emo_pred, urg_probs, emo_probs = predict(t["text"])
+for i, t in enumerate(TESTS):
+    urg_pred,  emo_pred  = results["urgency_pred"][i],  results["emotion_pred"][i]
+    urg_probs, emo_probs = results["urgency_probs"][i], results["emotion_probs"][i]
     urg_ok = urg_pred == t["expected_urgency"]
     emo_ok = emo_pred == t["expected_emotion"]
     both_ok = urg_ok and emo_ok
@@ -8,8 +8,21 @@ models are evaluated on identical data.
 Speed optimisation: batching 10 complaints per API call reduces total
 calls from 750 to 75, cutting runtime from ~28 min to ~4 min at the
 50 req/min rate limit.
+
+Pass --mock to run against llm_tools/mock_server.py instead of the live
+API (synthetic or cassette-replayed labels); outputs get a _mock suffix.
+
+Responses are cached in llm_tools/cache/ (see llm_tools/cache.py). At
+temperature 0 a re-run with the same prompt and split is answered entirely
+from the cache in seconds, with no rate-limit pauses; --no-cache disables it.
+
+--batch-api submits all API calls as one Message Batches job instead of
+sending them in paced groups (llm_tools/batch_jobs.py): no rate-limit
+pauses, half the price, results usually within minutes. Calls that fail in
+the batch are retried synchronously.
 """
 
+import argparse
 import json
 import os
 import subprocess
@@ -26,6 +39,10 @@ from sklearn.metrics import (
 )
 from sklearn.model_selection import train_test_split
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from llm_tools.batch_jobs import POLL_INTERVAL, AnthropicBatches, clear_results, run_batch
+from llm_tools.cache import LLMCache
+
 load_dotenv(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
 
 # ── Config ──────────────────────────────────────────────────────────────────
@@ -43,6 +60,21 @@ BATCH_PAUSE = 62.0           # Seconds between batches
 MAX_RETRIES = 3
 RETRY_DELAY = 10.0
 FEW_SHOT_SEED = 42           # Fixed seed for reproducible example selection
+MOCK_URL = os.getenv("LLM_MOCK_URL", "http://127.0.0.1:8400")  # llm_tools/mock_server.py
+
+parser = argparse.ArgumentParser(description="Few-shot Claude Haiku baseline on the held-out test set.")
+parser.add_argument("--mock", nargs="?", const=MOCK_URL, default=None, metavar="URL",
+                    help=f"Send requests to the local mock API at URL (default: {MOCK_URL})")
+parser.add_argument("--batch-pause", type=float, default=BATCH_PAUSE,
+                    help=f"Seconds to wait between rate-limit batches (default: {BATCH_PAUSE:.0f})")
+parser.add_argument("--no-cache", action="store_true",
+                    help="Always call the API instead of reusing cached responses (llm_tools/cache.py)")
+parser.add_argument("--batch-api", action="store_true",
+                    help="Submit all calls as one Message Batches job instead of paced synchronous calls")
+parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                    help=f"Seconds before the first batch status check; grows while waiting (default: {POLL_INTERVAL:.0f})")
+args = parser.parse_args()
+BATCH_PAUSE = args.batch_pause
 
 # ── Data — identical split to train.py ──────────────────────────────────────
 df = pd.read_csv(CSV_PATH)
@@ -111,53 +143,74 @@ except ImportError:
     import anthropic
 
 
-def classify_batch(
-    client: anthropic.Anthropic,
-    texts: list[str],
-    batch_label: str,
-) -> list[dict]:
-    """Classify a batch of complaints in a single API call, with retries."""
+def build_user_prompt(texts: list[str]) -> str:
+    """Numbered complaints with the output instructions for one API call."""
     n = len(texts)
-
-    # Build numbered list of complaints
     numbered = "\n\n".join(
         f"[{i + 1}] {text}" for i, text in enumerate(texts)
     )
-    user_prompt = (
+    return (
         f"Classify each of the following {n} complaints. "
         f"Return a JSON object with a single key \"results\" containing "
         f"a list of exactly {n} objects, each with \"urgency\" and \"emotion\" keys.\n\n"
         f"{numbered}"
     )
 
-    for attempt in range(1, MAX_RETRIES + 2):
-        try:
-            response = client.messages.create(
-                model=MODEL,
-                max_tokens=1024,
-                system=SYSTEM_PROMPT,
-                messages=[{"role": "user", "content": user_prompt}],
-                temperature=0.0,
-            )
-            raw = response.content[0].text.strip()
-            # Strip markdown code fences if present
-            if raw.startswith("```"):
-                raw = raw.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
-            parsed = json.loads(raw)
 
-            results = parsed.get("results", parsed.get("classifications", []))
-            if isinstance(parsed, list):
-                results = parsed
+def parse_classifications(raw: str, n: int) -> list[dict]:
+    """Labels from a response; invalid labels become Medium/Medium. Raises JSONDecodeError."""
+    raw = raw.strip()
+    # Strip markdown code fences if present
+    if raw.startswith("```"):
+        raw = raw.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+    parsed = json.loads(raw)
 
-            # Validate all results have valid labels
-            validated = []
-            for r in results[:n]:
-                urg = r.get("urgency", "").strip()
-                emo = r.get("emotion", "").strip()
-                if urg in LABEL_NAMES and emo in LABEL_NAMES:
-                    validated.append({"urgency": urg, "emotion": emo})
-                else:
-                    validated.append({"urgency": "Medium", "emotion": "Medium"})
+    if isinstance(parsed, list):
+        results = parsed
+    else:
+        results = parsed.get("results", parsed.get("classifications", []))
+
+    # Validate all results have valid labels
+    validated = []
+    for r in results[:n]:
+        urg = r.get("urgency", "").strip()
+        emo = r.get("emotion", "").strip()
+        if urg in LABEL_NAMES and emo in LABEL_NAMES:
+            validated.append({"urgency": urg, "emotion": emo})
+        else:
+            validated.append({"urgency": "Medium", "emotion": "Medium"})
+    return validated
+
+
+def classify_batch(
+    client: anthropic.Anthropic,
+    texts: list[str],
+    batch_label: str,
+    cache: LLMCache | None = None,
+) -> list[dict]:
+    """Classify a batch of complaints in a single API call, with retries.
+
+    A cached response for the same prompt is used instead of the API; one that
+    fails validation is dropped from the cache so the retry asks the API again.
+    """
+    n = len(texts)
+    user_prompt = build_user_prompt(texts)
+    cache_key = LLMCache.key(CACHE_PROVIDER, MODEL, SYSTEM_PROMPT, user_prompt, CACHE_PARAMS)
+
+    for attempt in range(1, MAX_RETRIES + 2):
+        try:
+            raw = cache.get(cache_key) if cache else None
+            if raw is None:
+                response = client.messages.create(
+                    model=MODEL,
+                    system=SYSTEM_PROMPT,
+                    messages=[{"role": "user", "content": user_prompt}],
+                    **CACHE_PARAMS,
+                )
+                raw = response.content[0].text
+                if cache:
+                    cache.put(cache_key, raw, CACHE_PROVIDER, MODEL)
+            validated = parse_classifications(raw, n)
 
             if len(validated) == n:
                 return validated
@@ -170,12 +223,55 @@ def classify_batch(
             print(f"  {batch_label}: {type(e).__name__}, attempt {attempt}")
             if "rate_limit" in str(e).lower() or "429" in str(e):
                 time.sleep(RETRY_DELAY * attempt)
+        if cache:
+            cache.delete(cache_key)
 
     # All retries exhausted — default to Medium/Medium for all
     print(f"  {batch_label}: retries exhausted, defaulting {n} to Medium/Medium")
     return [{"urgency": "Medium", "emotion": "Medium"}] * n
 
 
+def classify_with_batch_api(
+    client: anthropic.Anthropic,
+    chunks: list[list[str]],
+    cache: LLMCache | None = None,
+) -> list[dict]:
+    """Classify all chunks through one Message Batches job.
+
+    Cached calls are not resubmitted. Calls that error in the batch or fail
+    validation fall back to ``classify_batch`` and its synchronous retries.
+    """
+    prompts = [build_user_prompt(chunk) for chunk in chunks]
+    keys = [LLMCache.key(CACHE_PROVIDER, MODEL, SYSTEM_PROMPT, p, CACHE_PARAMS) for p in prompts]
+    raws = {f"call-{i:04d}": cache.get(k) if cache else None for i, k in enumerate(keys)}
+    pending = [
+        {"custom_id": cid, "system": SYSTEM_PROMPT, "user": prompts[i], "params": CACHE_PARAMS}
+        for i, (cid, raw) in enumerate(raws.items()) if raw is None
+    ]
+    print(f"  {len(chunks) - len(pending)} calls answered from cache, {len(pending)} submitted as a batch job\n")
+    backend = AnthropicBatches(client, MODEL, CACHE_PROVIDER)
+    texts = run_batch(backend, pending, "haiku_baseline", args.poll_interval)
+
+    results: list[dict] = []
+    for i, (cid, chunk) in enumerate(zip(raws, chunks)):
+        raw = raws[cid] if raws[cid] is not None else texts.get(cid)
+        try:
+            validated = parse_classifications(raw, len(chunk)) if raw is not None else []
+        except Exception:
+            validated = []
+        if len(validated) == len(chunk):
+            if cache and raws[cid] is None:
+                cache.put(keys[i], raw, CACHE_PROVIDER, MODEL)
+            results.extend(validated)
+            continue
+        if cache:
+            cache.delete(keys[i])
+        label = f"call {i + 1}/{len(chunks)}"
+        print(f"  {label}: {'failed in batch' if raw is None else 'invalid batch response'}, retrying synchronously")
+        results.extend(classify_batch(client, chunk, label, cache))
+    return results
+
+
 # ── Run classification ──────────────────────────────────────────────────────
 test_texts = test_df["complaint_text"].tolist()
 total = len(test_texts)
@@ -190,48 +286,66 @@ num_batches = (total_api_calls + API_CALLS_PER_BATCH - 1) // API_CALLS_PER_BATCH
 
 print(f"\nClassifying {total} complaints with {MODEL} (few-shot)")
 print(f"  {total_api_calls} API calls ({COMPLAINTS_PER_CALL} complaints each)")
-print(f"  {num_batches} rate-limit batches, ~{BATCH_PAUSE:.0f}s pause between")
-est_minutes = (num_batches * BATCH_PAUSE + total_api_calls * 3) / 60
-print(f"  Estimated time: ~{est_minutes:.0f} minutes\n")
-
-api_key = os.getenv("ANTHROPIC_API_KEY")
+if args.batch_api:
+    print("  Submitted as one Message Batches job (usually done within minutes, at most 24h)\n")
+else:
+    print(f"  {num_batches} rate-limit batches, ~{BATCH_PAUSE:.0f}s pause between")
+    est_minutes = (num_batches * BATCH_PAUSE + total_api_calls * 3) / 60
+    print(f"  Estimated time: ~{est_minutes:.0f} minutes\n")
+
+api_key = os.getenv("ANTHROPIC_API_KEY") or ("mock" if args.mock else None)
 if not api_key:
     print("Error: ANTHROPIC_API_KEY not set. Add it to .env or environment.")
     sys.exit(1)
 
-client = anthropic.Anthropic(api_key=api_key)
+client = anthropic.Anthropic(api_key=api_key, base_url=args.mock)
+if args.mock:
+    print(f"Using mock API at {args.mock}")
+
+# Mock responses are cached under their own provider label, never mixed with real ones
+cache = None if args.no_cache else LLMCache()
+CACHE_PROVIDER = f"anthropic@{args.mock}" if args.mock else "anthropic"
+CACHE_PARAMS = {"max_tokens": 1024, "temperature": 0.0}
 start = time.time()
 
-results: list[dict] = []
-for batch_idx in range(num_batches):
-    chunk_start = batch_idx * API_CALLS_PER_BATCH
-    chunk_end = min(chunk_start + API_CALLS_PER_BATCH, total_api_calls)
-    batch_chunks = api_chunks[chunk_start:chunk_end]
-
-    complaint_start = chunk_start * COMPLAINTS_PER_CALL + 1
-    complaint_end = min(chunk_end * COMPLAINTS_PER_CALL, total)
-    print(f"  Batch {batch_idx + 1}/{num_batches}: "
-          f"{len(batch_chunks)} API calls "
-          f"[complaints {complaint_start}–{complaint_end}]")
-
-    for i, chunk in enumerate(batch_chunks):
-        call_idx = chunk_start + i
-        label = f"call {call_idx + 1}/{total_api_calls}"
-        chunk_results = classify_batch(client, chunk, label)
-        results.extend(chunk_results)
-
-    elapsed_so_far = time.time() - start
-    classified_so_far = len(results)
-    print(f"    {classified_so_far}/{total} classified "
-          f"({elapsed_so_far:.0f}s elapsed)")
-
-    # Pause between batches to respect rate limit (skip after last)
-    if batch_idx < num_batches - 1:
-        print(f"    Waiting {BATCH_PAUSE:.0f}s for rate limit window...")
-        time.sleep(BATCH_PAUSE)
+if args.batch_api:
+    results = classify_with_batch_api(client, api_chunks, cache)
+else:
+    results: list[dict] = []
+    for batch_idx in range(num_batches):
+        chunk_start = batch_idx * API_CALLS_PER_BATCH
+        chunk_end = min(chunk_start + API_CALLS_PER_BATCH, total_api_calls)
+        batch_chunks = api_chunks[chunk_start:chunk_end]
+
+        complaint_start = chunk_start * COMPLAINTS_PER_CALL + 1
+        complaint_end = min(chunk_end * COMPLAINTS_PER_CALL, total)
+        misses_before = cache.stats()["misses"] if cache else None
+        print(f"  Batch {batch_idx + 1}/{num_batches}: "
+              f"{len(batch_chunks)} API calls "
+              f"[complaints {complaint_start}–{complaint_end}]")
+
+        for i, chunk in enumerate(batch_chunks):
+            call_idx = chunk_start + i
+            label = f"call {call_idx + 1}/{total_api_calls}"
+            chunk_results = classify_batch(client, chunk, label, cache)
+            results.extend(chunk_results)
+
+        elapsed_so_far = time.time() - start
+        classified_so_far = len(results)
+        print(f"    {classified_so_far}/{total} classified "
+              f"({elapsed_so_far:.0f}s elapsed)")
+
+        # Pause between batches to respect rate limit (skip after last, and
+        # after a batch answered entirely from the cache)
+        all_cached = cache is not None and cache.stats()["misses"] == misses_before
+        if batch_idx < num_batches - 1 and not all_cached:
+            print(f"    Waiting {BATCH_PAUSE:.0f}s for rate limit window...")
+            time.sleep(BATCH_PAUSE)
 
 elapsed = time.time() - start
 print(f"\nDone in {elapsed:.1f}s")
+if cache:
+    print(f"Cache: {cache.summary()}")
 
 # Count fallbacks
 fallback_count = sum(
@@ -298,17 +412,21 @@ print(classification_report(
 
 # ── Save results ────────────────────────────────────────────────────────────
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+suffix = "_mock" if args.mock else ""
 
 output = {
     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     "run_id": timestamp,
     "model": MODEL,
+    "mock_url": args.mock,
     "method": "few-shot (9 examples, 1 per urgency x emotion cell)",
     "few_shot_seed": FEW_SHOT_SEED,
     "complaints_per_api_call": COMPLAINTS_PER_CALL,
     "temperature": 0.0,
+    "execution": "batch-api" if args.batch_api else "sequential",
     "test_samples": total,
     "elapsed_seconds": round(elapsed, 1),
+    "cache_hits": cache.stats()["hits"] if cache else None,
     "fallback_count": fallback_count,
     # Test — urgency
     "test_urgency_macro_f1": round(float(urg_macro), 4),
@@ -322,7 +440,7 @@ output = {
     "test_emotion_f1_high": round(float(emo_f1_per_class[2]), 4),
 }
 
-results_path = os.path.join(OUTPUT_DIR, f"llm_baseline_results_{timestamp}.json")
+results_path = os.path.join(OUTPUT_DIR, f"llm_baseline_results_{timestamp}{suffix}.json")
 with open(results_path, "w") as f:
     json.dump(output, f, indent=2)
 
@@ -333,8 +451,10 @@ predictions_df["predicted_emotion"] = [r["emotion"] for r in results]
 predictions_df["urgency_correct"] = predictions_df["intended_urgency"] == predictions_df["predicted_urgency"]
 predictions_df["emotion_correct"] = predictions_df["intended_emotion"] == predictions_df["predicted_emotion"]
 
-preds_path = os.path.join(OUTPUT_DIR, f"llm_predictions_{timestamp}.csv")
+preds_path = os.path.join(OUTPUT_DIR, f"llm_predictions_{timestamp}{suffix}.csv")
 predictions_df.to_csv(preds_path, index=False)
+if args.batch_api:
+    clear_results("haiku_baseline")   # every prediction is on disk now
 
 print(f"\nResults saved to '{results_path}'")
 print(f"Per-sample predictions saved to '{preds_path}'")
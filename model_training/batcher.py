@@ -0,0 +1,134 @@
+"""Asyncio micro-batching scheduler for concurrent scoring requests.
+
+Callers ``await scheduler.submit(text)`` from any number of coroutines. The
+scheduler coalesces pending texts until ``max_batch`` are queued or the
+oldest has waited ``max_wait`` seconds, runs one forward pass in a dedicated
+worker thread (so the event loop keeps accepting requests while the model
+runs) and resolves each caller's future with its own result.
+
+Counters exposed by ``stats()``:
+  - batches / items            — forward passes run and complaints scored
+  - mean_batch_size            — items per forward pass
+  - fill_ratio                 — mean_batch_size / max_batch
+  - mean/max_queue_wait_ms     — submit() to dispatch, per complaint
+  - mean_forward_ms            — wall time of one forward pass
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ── Config ───────────────────────────────────────────────────────────────────
+MAX_BATCH   = 32
+MAX_WAIT_MS = 5
+
+
+class MicroBatchScheduler:
+    """Coalesce concurrent ``submit`` calls into shared engine forward passes."""
+
+    def __init__(self, engine, max_batch=MAX_BATCH, max_wait=MAX_WAIT_MS / 1000, postprocess=None):
+        self.engine      = engine
+        self.max_batch   = max_batch
+        self.max_wait    = max_wait
+        # Maps engine.predict output to one result per text; identity if None
+        self.postprocess = postprocess or (lambda out: out)
+        self.queue       = None
+        self.task        = None
+        # One thread: the engine is not re-entrant and torch already
+        # parallelises a single forward pass across cores.
+        self.executor    = ThreadPoolExecutor(max_workers=1, thread_name_prefix="forward")
+        self.counters    = {
+            "batches": 0, "items": 0, "errors": 0,
+            "queue_wait_s": 0.0, "max_queue_wait_s": 0.0, "forward_s": 0.0,
+        }
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.task  = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=True)
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    async def submit(self, text):
+        """Queue one complaint and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future, time.monotonic()))
+        return await future
+
+    async def submit_many(self, texts):
+        """Queue several complaints; they may be split across forward passes."""
+        return await asyncio.gather(*(self.submit(t) for t in texts))
+
+    def stats(self):
+        c       = self.counters
+        batches = max(c["batches"], 1)
+        items   = max(c["items"], 1)
+        return {
+            "max_batch":          self.max_batch,
+            "max_wait_ms":        round(self.max_wait * 1000, 3),
+            "batches":            c["batches"],
+            "items":              c["items"],
+            "errors":             c["errors"],
+            "queue_depth":        self.queue.qsize() if self.queue else 0,
+            "mean_batch_size":    round(c["items"] / batches, 2),
+            "fill_ratio":         round(c["items"] / batches / self.max_batch, 4),
+            "mean_queue_wait_ms": round(c["queue_wait_s"] / items * 1000, 3),
+            "max_queue_wait_ms":  round(c["max_queue_wait_s"] * 1000, 3),
+            "mean_forward_ms":    round(c["forward_s"] / batches * 1000, 3),
+        }
+
+    # ── Scheduling loop ──────────────────────────────────────────────────────
+    async def _collect(self):
+        """Wait for one item, then fill the batch until it is full or the window closes."""
+        batch    = [await self.queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch:
+            # Anything already queued (e.g. arrived during the last forward pass) joins at once
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            dispatched = time.monotonic()
+            for _, _, enqueued in batch:
+                wait = dispatched - enqueued
+                self.counters["queue_wait_s"] += wait
+                self.counters["max_queue_wait_s"] = max(self.counters["max_queue_wait_s"], wait)
+
+            texts = [text for text, _, _ in batch]
+            try:
+                out = await loop.run_in_executor(self.executor, self.engine.predict, texts)
+                results = self.postprocess(out)
+            except Exception as e:
+                self.counters["errors"] += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            # Failed passes count as errors only, so mean_forward_ms stays per successful batch
+            self.counters["forward_s"] += time.monotonic() - dispatched
+            self.counters["batches"]   += 1
+            self.counters["items"]     += len(batch)
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():   # caller may have been cancelled
+                    future.set_result(result)
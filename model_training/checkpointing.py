@@ -0,0 +1,55 @@
+"""Training checkpoints that let an interrupted run continue exactly where it stopped.
+
+A checkpoint is a single ``torch.save`` dict written atomically (temp file +
+rename), so a job killed mid-write leaves the previous checkpoint intact.
+Together with the model/optimizer/scheduler/scaler state dicts it records the
+Python, NumPy, torch CPU and CUDA RNG states; restoring them reproduces the
+same dropout masks and data-loader seeds as an uninterrupted run.
+
+Usage:
+    save_checkpoint(path, {"epoch": epoch, "model": model.state_dict(), ...})
+    state = load_checkpoint(path)
+    set_rng_state(state["rng"][0])    # rank 0, or the only process
+"""
+
+import os
+import random
+
+import numpy as np
+import torch
+
+
+def rng_state():
+    state = {
+        "python": random.getstate(),
+        "numpy":  np.random.get_state(),
+        "torch":  torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def save_checkpoint(path, state, rng_states=None):
+    """Write ``state`` plus RNG states to ``path`` atomically.
+
+    ``rng_states`` is one ``rng_state()`` per rank for distributed runs;
+    by default the calling process's own state is stored.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    torch.save({**state, "rng": rng_states or [rng_state()]}, tmp)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    """Load a checkpoint onto the CPU; call ``set_rng_state(state["rng"][rank])`` once it is validated."""
+    return torch.load(path, map_location="cpu", weights_only=False)
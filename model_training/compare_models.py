@@ -8,19 +8,22 @@ Outputs (saved to model_training/results/):
   - metrics_summary_<timestamp>.json  — per-class and macro F1 for all three models
 """
 
+import argparse
 import json
 import os
 import sys
 from datetime import datetime
 
 import pandas as pd
-import torch
-import torch.nn as nn
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import f1_score
 from sklearn.model_selection import train_test_split
-from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+from inference import InferenceEngine
+from modeling import DEVICE, MODEL_DIR, cache_variant, weights_path
+from prediction_cache import PredictionCache
+from token_cache import STRATEGIES
 
 try:
     from sentence_transformers import SentenceTransformer
@@ -31,12 +34,18 @@ except ImportError:
 
 # ── Config ───────────────────────────────────────────────────────────────────
 CSV_PATH    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "telecoms_complaints.csv")
-MODEL_DIR   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_output")
 RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
 LABEL_MAP   = {"Low": 0, "Medium": 1, "High": 2}
 LABEL_NAMES = ["Low", "Medium", "High"]
-MAX_LENGTH  = 192
-DEVICE      = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+parser = argparse.ArgumentParser(description="Compare all models on the held-out test set.")
+parser.add_argument("--int8", action="store_true",
+                    help="Score DeBERTa with the int8 weights written by quantize_model.py (CPU)")
+parser.add_argument("--cache-db", default=None,
+                    help="SQLite file for cached DeBERTa predictions, reused across runs")
+parser.add_argument("--long-text", choices=STRATEGIES, default="truncate",
+                    help="How DeBERTa reads complaints longer than its max length (default: truncate)")
+args = parser.parse_args()
 
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
@@ -144,49 +153,18 @@ print("\n" + "=" * 60)
 print("MODEL 3: Fine-tuned DeBERTa-v3-base")
 print("=" * 60)
 
-class DeBERTaMultiHead(nn.Module):
-    def __init__(self, model_dir, num_classes=3):
-        super().__init__()
-        config            = AutoConfig.from_pretrained(model_dir)
-        self.backbone     = AutoModel.from_config(config)
-        hidden_size       = config.hidden_size
-        self.urgency_head = nn.Linear(hidden_size, num_classes)
-        self.emotion_head = nn.Linear(hidden_size, num_classes)
-
-    def forward(self, input_ids, attention_mask, token_type_ids=None):
-        out = self.backbone(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)
-        cls = out.last_hidden_state[:, 0, :]
-        return self.urgency_head(cls), self.emotion_head(cls)
-
-print(f"Loading model from '{MODEL_DIR}' ...")
-tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR)
-deberta   = DeBERTaMultiHead(MODEL_DIR).to(DEVICE)
-deberta.load_state_dict(torch.load(os.path.join(MODEL_DIR, "model_weights.pt"), map_location=DEVICE))
-deberta.eval()
+print(f"Loading {'int8' if args.int8 else 'fp32'} model from '{MODEL_DIR}' ...")
+pred_cache = PredictionCache(weights_path(MODEL_DIR, args.int8), db_path=args.cache_db,
+                             variant=cache_variant(MODEL_DIR, args.long_text))
+engine = InferenceEngine.from_pretrained(MODEL_DIR, DEVICE, quantized=args.int8, cache_tokens=True,
+                                         prediction_cache=pred_cache, strategy=args.long_text)
 print(f"Running inference on {len(test_df)} test samples...")
 
-deb_urg_preds, deb_emo_preds = [], []
-texts = test_df["complaint_text"].tolist()
-BATCH = 32
-
-for i in range(0, len(texts), BATCH):
-    batch_texts = texts[i: i + BATCH]
-    enc = tokenizer(
-        batch_texts,
-        max_length=MAX_LENGTH,
-        padding="max_length",
-        truncation=True,
-        return_tensors="pt",
-    )
-    input_ids      = enc["input_ids"].to(DEVICE)
-    attention_mask = enc["attention_mask"].to(DEVICE)
-    token_type_ids = enc.get("token_type_ids", torch.zeros_like(input_ids)).to(DEVICE)
-
-    with torch.no_grad():
-        urg_logits, emo_logits = deberta(input_ids, attention_mask, token_type_ids)
-
-    deb_urg_preds.extend(urg_logits.argmax(dim=-1).cpu().tolist())
-    deb_emo_preds.extend(emo_logits.argmax(dim=-1).cpu().tolist())
+deb_out = engine.predict(test_df["complaint_text"])
+print(f"Prediction cache: {pred_cache.stats()}")
+pred_cache.close()
+deb_urg_preds = deb_out["urgency_logits"].argmax(axis=-1).tolist()
+deb_emo_preds = deb_out["emotion_logits"].argmax(axis=-1).tolist()
 
 out_df["deberta_urgency_pred"] = [LABEL_NAMES[p] for p in deb_urg_preds]
 out_df["deberta_emotion_pred"] = [LABEL_NAMES[p] for p in deb_emo_preds]
@@ -208,6 +186,19 @@ metrics["deberta_finetuned"] = {
 print(f"  Urgency Macro F1: {metrics['deberta_finetuned']['urgency_macro_f1']:.4f}")
 print(f"  Emotion Macro F1: {metrics['deberta_finetuned']['emotion_macro_f1']:.4f}")
 
+# Complaints that do not fit in max_length are where --long-text matters
+n_tokens = [len(ids) for ids in engine.tokenizer(test_df["complaint_text"].tolist(), verbose=False)["input_ids"]]
+long_idx = [i for i, n in enumerate(n_tokens) if n > engine.max_length]
+long_text = {"strategy": args.long_text, "max_length": engine.max_length, "count": len(long_idx)}
+if long_idx:
+    long_text["urgency_macro_f1"] = round(float(f1_score(
+        [urg_true[i] for i in long_idx], [deb_urg_preds[i] for i in long_idx], average="macro", zero_division=0)), 4)
+    long_text["emotion_macro_f1"] = round(float(f1_score(
+        [emo_true[i] for i in long_idx], [deb_emo_preds[i] for i in long_idx], average="macro", zero_division=0)), 4)
+    print(f"  Long complaints (> {engine.max_length} tokens, {len(long_idx)}, {args.long_text}): "
+          f"urgency {long_text['urgency_macro_f1']:.4f} | emotion {long_text['emotion_macro_f1']:.4f}")
+metrics["deberta_finetuned"]["long_text"] = long_text
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Summary table
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -236,6 +227,8 @@ print(f"\nTest predictions saved to '{csv_path}'")
 summary = {
     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     "test_set_size": len(test_df),
+    "deberta_weights": "int8" if args.int8 else "fp32",
+    "deberta_long_text": args.long_text,
     "models": metrics,
 }
 json_path = os.path.join(RESULTS_DIR, f"metrics_summary_{timestamp}.json")
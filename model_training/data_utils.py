@@ -0,0 +1,133 @@
+"""Dataset split and dynamic-padding data path for DeBERTa training.
+
+Examples are stored as unpadded token id arrays. ``LengthBucketSampler``
+groups examples of similar length into the same batch and ``pad_collate``
+pads each batch only to its own longest sequence, so short complaints stop
+paying for 192 positions of attention in every forward and backward pass.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+from sklearn.model_selection import train_test_split
+from torch.utils.data import Dataset, Sampler
+
+# ── Config ───────────────────────────────────────────────────────────────────
+CSV_PATH  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "telecoms_complaints.csv")
+LABEL_MAP = {"Low": 0, "Medium": 1, "High": 2}
+
+
+def load_splits(csv_path=CSV_PATH):
+    """Return ``(train_df, val_df, test_df)`` — the 70/15/15 split used by train_deberta.py."""
+    df = pd.read_csv(csv_path)
+    df["urgency_label"] = df["intended_urgency"].map(LABEL_MAP)
+    df["emotion_label"] = df["intended_emotion"].map(LABEL_MAP)
+    df["strat_key"] = df["urgency_label"].astype(str) + "_" + df["emotion_label"].astype(str)
+
+    train_df, temp_df = train_test_split(df, test_size=0.30, stratify=df["strat_key"], random_state=42)
+    val_df,   test_df = train_test_split(temp_df, test_size=0.50, stratify=temp_df["strat_key"], random_state=42)
+    return train_df, val_df, test_df
+
+
+class ComplaintDataset(Dataset):
+    """Unpadded token ids plus urgency/emotion labels for one split."""
+
+    def __init__(self, input_ids, urgency_labels, emotion_labels):
+        self.input_ids      = [np.asarray(ids, dtype=np.int64) for ids in input_ids]
+        self.urgency_labels = list(urgency_labels)
+        self.emotion_labels = list(emotion_labels)
+
+    def __len__(self):
+        return len(self.input_ids)
+
+    def __getitem__(self, idx):
+        return self.input_ids[idx], self.urgency_labels[idx], self.emotion_labels[idx]
+
+    @property
+    def lengths(self):
+        return [len(ids) for ids in self.input_ids]
+
+
+class LengthBucketSampler(Sampler):
+    """Yield batches of indices whose sequences have similar lengths.
+
+    With ``shuffle=True`` the dataset is randomly permuted each epoch, cut
+    into buckets of ``bucket_batches * batch_size`` examples, each bucket is
+    sorted by length and split into batches, and the batch order is shuffled.
+    That keeps batches length-homogeneous while still mixing examples across
+    epochs. Without shuffling, batches are taken from a global length sort.
+    Call ``set_epoch`` before each epoch so every epoch gets a fresh order.
+
+    For distributed training pass ``num_replicas``/``rank``: every rank builds
+    the same batch list and keeps every ``num_replicas``-th batch. When
+    shuffling, the list is first wrapped around to a multiple of
+    ``num_replicas`` so all ranks run the same number of steps; without
+    shuffling (evaluation) each example is seen exactly once.
+    """
+
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_batches=50, seed=42, num_replicas=1, rank=0):
+        self.lengths        = np.asarray(lengths)
+        self.batch_size     = batch_size
+        self.shuffle        = shuffle
+        self.bucket_size    = batch_size * bucket_batches
+        self.seed           = seed
+        self.epoch          = 0
+        self.num_replicas   = num_replicas
+        self.rank           = rank
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _batches(self):
+        if not self.shuffle:
+            order = np.argsort(self.lengths, kind="stable")
+            return [order[start: start + self.batch_size].tolist() for start in range(0, len(order), self.batch_size)]
+
+        rng     = np.random.default_rng(self.seed + self.epoch)
+        perm    = rng.permutation(len(self.lengths))
+        batches = []
+        for b_start in range(0, len(perm), self.bucket_size):
+            bucket = perm[b_start: b_start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            for start in range(0, len(bucket), self.batch_size):
+                batches.append(bucket[start: start + self.batch_size].tolist())
+        return [batches[i] for i in rng.permutation(len(batches))]
+
+    def __iter__(self):
+        batches = self._batches()
+        if self.num_replicas > 1:
+            if self.shuffle:
+                batches += batches[: -len(batches) % self.num_replicas]
+            batches = batches[self.rank:: self.num_replicas]
+        yield from batches
+
+    def __len__(self):
+        # Bucket size is a multiple of batch size, so only the final batch can be short
+        n_batches = (len(self.lengths) + self.batch_size - 1) // self.batch_size
+        if self.shuffle:
+            return -(-n_batches // self.num_replicas)
+        return len(range(self.rank, n_batches, self.num_replicas))
+
+
+def pad_collate(pad_token_id):
+    """Return a collate_fn that pads a batch to its longest sequence.
+
+    Batches come out in the same tuple layout the training loop has always
+    used: ``(input_ids, attention_mask, token_type_ids, urg_labels, emo_labels)``.
+    """
+
+    def collate(batch):
+        width          = max(len(ids) for ids, _, _ in batch)
+        input_ids      = torch.full((len(batch), width), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, (ids, _, _) in enumerate(batch):
+            input_ids[row, : len(ids)]      = torch.from_numpy(ids)
+            attention_mask[row, : len(ids)] = 1
+        token_type_ids = torch.zeros_like(input_ids)
+        urg_labels     = torch.tensor([u for _, u, _ in batch], dtype=torch.long)
+        emo_labels     = torch.tensor([e for _, _, e in batch], dtype=torch.long)
+        return input_ids, attention_mask, token_type_ids, urg_labels, emo_labels
+
+    return collate
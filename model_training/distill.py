@@ -0,0 +1,282 @@
+"""Distil the fine-tuned DeBERTa model into a small, fast two-head student.
+
+The teacher (DeBERTaMultiHead from model_output/) scores the training and
+validation split once. A much smaller encoder (default: 6-layer, 384-dim
+MiniLM) gets the same urgency/emotion heads and is trained on
+
+    alpha * hard-label cross-entropy  +  (1 - alpha) * T^2 * KL(teacher || student)
+
+per head, with the teacher's logits softened by temperature T. The hard
+urgency loss keeps train_deberta.py's class weights. Split, length-bucketed
+batching, warmup schedule and early stopping on val combined F1 are the
+same as train_deberta.py (the loop itself is train_loop.fit).
+
+The student is saved as a model_output-style directory, so load_model(),
+InferenceEngine.from_pretrained(), export_onnx.py and quantize_model.py all
+take it as --model-dir. The test split is then scored by teacher, student
+and the SBERT + logistic-regression baseline. For each the report gives
+macro F1, single-complaint latency (p50/p95) and bulk throughput.
+
+Outputs:
+  - distill_output/                  — student weights, config and tokenizer
+  - results/distill_<timestamp>.json — per-epoch history and the comparison
+
+Usage:
+    python model_training/distill.py
+    python model_training/distill.py --student microsoft/MiniLM-L12-H384-uncased --temperature 4 --alpha 0.3
+    python model_training/distill.py --threads 4 --skip-sbert
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from transformers import AutoTokenizer
+
+from data_utils import ComplaintDataset, load_splits, pad_collate
+from inference import InferenceEngine
+from modeling import DEVICE, LABEL_NAMES, MODEL_DIR, DeBERTaMultiHead, load_model
+from token_cache import TokenCache
+from train_loop import fit, macro_f1s
+
+# ── Config ───────────────────────────────────────────────────────────────────
+HERE            = os.path.dirname(os.path.abspath(__file__))
+STUDENT_NAME    = "nreimers/MiniLM-L6-H384-uncased"
+OUTPUT_DIR      = os.path.join(HERE, "distill_output")
+RESULTS_DIR     = os.path.join(HERE, "results")
+SBERT_MODEL     = "all-MiniLM-L6-v2"
+MAX_LENGTH      = 192
+BATCH_SIZE      = 32
+LR              = 5e-5
+EPOCHS          = 10
+PATIENCE        = 3
+SEED            = 42
+URGENCY_WEIGHTS = [1.0, 1.5, 1.2]   # Low, Medium, High — as in train_deberta.py
+
+
+def distill_loss(logits, teacher_logits, labels, criterion, temperature, alpha):
+    """Hard-label loss blended with the temperature-scaled KL to the teacher."""
+    soft = F.kl_div(F.log_softmax(logits / temperature, dim=-1),
+                    F.log_softmax(teacher_logits / temperature, dim=-1),
+                    reduction="batchmean", log_target=True)
+    return alpha * criterion(logits, labels) + (1 - alpha) * temperature ** 2 * soft
+
+
+# ── Student training ─────────────────────────────────────────────────────────
+def train_student(args, splits, teacher_logits):
+    """Fit the student against teacher soft targets; returns (model, tokenizer, epoch history, best epoch)."""
+    torch.manual_seed(SEED)   # student head initialisation
+    tokenizer = AutoTokenizer.from_pretrained(args.student)
+    cache     = TokenCache(tokenizer, args.max_length)
+    data      = [ComplaintDataset(cache.encode(frame["complaint_text"].tolist()),
+                                  frame["urgency_label"].tolist(), frame["emotion_label"].tolist())
+                 for frame in splits[:2]]
+    train_ds, val_ds = data
+    print(f"Student tokenization: {cache.hits} cached, {cache.misses} newly tokenized")
+
+    model   = DeBERTaMultiHead(args.student, pretrained=True).to(DEVICE)
+    n_param = sum(p.numel() for p in model.parameters())
+    print(f"Student '{args.student}': {model.backbone.config.num_hidden_layers} layers, "
+          f"hidden {model.backbone.config.hidden_size}, {n_param / 1e6:.1f}M parameters")
+
+    urg_crit  = nn.CrossEntropyLoss(weight=torch.tensor(URGENCY_WEIGHTS, dtype=torch.float).to(DEVICE))
+    emo_crit  = nn.CrossEntropyLoss()
+    t_urg, t_emo = (torch.from_numpy(a) for a in teacher_logits["train"])
+
+    def loss_fn(model, batch, idx):
+        input_ids, attention_mask, token_type_ids, urg, emo = batch
+        urg_logits, emo_logits = model(input_ids, attention_mask, token_type_ids)
+        return (distill_loss(urg_logits, t_urg[idx].to(DEVICE), urg, urg_crit, args.temperature, args.alpha)
+                + distill_loss(emo_logits, t_emo[idx].to(DEVICE), emo, emo_crit, args.temperature, args.alpha))
+
+    # Validation goes through the same engine the student will be served with
+    val_engine = InferenceEngine(model, tokenizer, device=DEVICE, max_length=args.max_length,
+                                 batch_size=args.batch_size, cache_tokens=True)
+    val_texts  = splits[1]["complaint_text"].tolist()
+    val_true   = (val_ds.urgency_labels, val_ds.emotion_labels)
+
+    def validate(epoch, train_loss):
+        out = val_engine.predict(val_texts)
+        urg_logits, emo_logits = out["urgency_logits"], out["emotion_logits"]
+        val_urg, val_emo = macro_f1s(*val_true, urg_logits, emo_logits)
+        combined = (val_urg + val_emo) / 2
+        # Agreement with the teacher is what distillation optimises directly
+        agree = float(np.mean(np.concatenate([urg_logits.argmax(-1) == teacher_logits["val"][0].argmax(-1),
+                                              emo_logits.argmax(-1) == teacher_logits["val"][1].argmax(-1)])))
+        print(f"Epoch {epoch}/{args.epochs} | Train Loss: {train_loss:.4f} | "
+              f"Val Urgency F1: {val_urg:.4f} | Val Emotion F1: {val_emo:.4f} | "
+              f"Val Combined F1: {combined:.4f} | Teacher agreement: {agree:.2%}", flush=True)
+        return combined, {
+            "val_urgency_f1":        round(val_urg, 4),
+            "val_emotion_f1":        round(val_emo, 4),
+            "val_combined_f1":       round(combined, 4),
+            "val_teacher_agreement": round(agree, 4),
+        }
+
+    history, best_epoch = fit(model, train_ds, pad_collate(tokenizer.pad_token_id), loss_fn, validate,
+                              args.epochs, args.batch_size, args.lr, patience=args.patience, seed=SEED)
+    return model, tokenizer, history, best_epoch
+
+
+def save_student(out_dir, model, tokenizer):
+    """Write a model_output-style directory loadable with ``load_model(out_dir)``."""
+    os.makedirs(out_dir, exist_ok=True)
+    torch.save(model.state_dict(), os.path.join(out_dir, "model_weights.pt"))
+    model.backbone.config.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+
+
+# ── Comparison ───────────────────────────────────────────────────────────────
+def benchmark(name, predict, texts, urg_true, emo_true, latency_samples):
+    """Macro F1 plus per-complaint latency and bulk throughput of ``predict(texts) -> (urg, emo) logits``."""
+    predict(texts[:8])   # warm-up (allocator, lazy init)
+    start = time.perf_counter()
+    urg_logits, emo_logits = predict(texts)
+    bulk  = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:latency_samples]:
+        start = time.perf_counter()
+        predict([text])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    urg_f1, emo_f1 = macro_f1s(urg_true, emo_true, urg_logits, emo_logits)
+    row = {
+        "urgency_macro_f1":   round(urg_f1, 4),
+        "emotion_macro_f1":   round(emo_f1, 4),
+        "combined_f1":        round((urg_f1 + emo_f1) / 2, 4),
+        "latency_p50_ms":     round(float(np.percentile(latencies, 50)), 2),
+        "latency_p95_ms":     round(float(np.percentile(latencies, 95)), 2),
+        "complaints_per_sec": round(len(texts) / bulk, 1),
+    }
+    print(f"  {name:<8} urg {row['urgency_macro_f1']:.4f}  emo {row['emotion_macro_f1']:.4f}  "
+          f"p50 {row['latency_p50_ms']:.1f} ms  p95 {row['latency_p95_ms']:.1f} ms  "
+          f"{row['complaints_per_sec']:.0f}/s", flush=True)
+    return row
+
+
+def engine_predictor(engine):
+    def predict(texts):
+        out = engine.predict(texts)
+        return out["urgency_logits"], out["emotion_logits"]
+    return predict
+
+
+def sbert_predictor(train_df):
+    """Frozen all-MiniLM-L6-v2 + logistic regression, as in baseline_sbert_lr.py."""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        import subprocess
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "sentence-transformers", "-q"])
+        from sentence_transformers import SentenceTransformer
+    from sklearn.linear_model import LogisticRegression
+
+    sbert   = SentenceTransformer(SBERT_MODEL, device=str(DEVICE))
+    x_train = sbert.encode(train_df["complaint_text"].tolist(), batch_size=64)
+    lr      = {"max_iter": 1000, "solver": "lbfgs", "C": 1.0, "random_state": 42}
+    urg_clf = LogisticRegression(**lr).fit(x_train, train_df["urgency_label"])
+    emo_clf = LogisticRegression(**lr).fit(x_train, train_df["emotion_label"])
+
+    def predict(texts):
+        x = sbert.encode(texts, batch_size=BATCH_SIZE)
+        return urg_clf.decision_function(x), emo_clf.decision_function(x)
+    return predict
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Distil the fine-tuned DeBERTa model into a small student.")
+    parser.add_argument("--teacher-dir", default=MODEL_DIR, help="Fine-tuned teacher (default: model_output/)")
+    parser.add_argument("--student", default=STUDENT_NAME, help=f"Student encoder on the Hub (default: {STUDENT_NAME})")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where the student is saved (default: distill_output/)")
+    parser.add_argument("--temperature", type=float, default=2.0, help="Softmax temperature T (default: 2.0)")
+    parser.add_argument("--alpha", type=float, default=0.5,
+                        help="Weight of the hard-label loss; 1 - alpha goes to the teacher (default: 0.5)")
+    parser.add_argument("--lr", type=float, default=LR, help=f"Peak learning rate (default: {LR})")
+    parser.add_argument("--epochs", type=int, default=EPOCHS, help=f"Max epochs (default: {EPOCHS})")
+    parser.add_argument("--patience", type=int, default=PATIENCE, help=f"Early-stopping patience (default: {PATIENCE})")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Batch size (default: {BATCH_SIZE})")
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH, help=f"Max tokens (default: {MAX_LENGTH})")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch intra-op threads for the latency comparison (default: torch default)")
+    parser.add_argument("--latency-samples", type=int, default=200,
+                        help="Test complaints timed one at a time (default: 200)")
+    parser.add_argument("--skip-sbert", action="store_true", help="Leave the SBERT baseline out of the comparison")
+    args = parser.parse_args()
+
+    splits = load_splits()
+    train_df, val_df, test_df = splits
+    print(f"Train: {len(train_df)} | Val: {len(val_df)} | Test: {len(test_df)}")
+
+    # ── Teacher soft targets ─────────────────────────────────────────────────
+    print(f"\nScoring train/val with the teacher from '{args.teacher_dir}' ...")
+    teacher = InferenceEngine.from_pretrained(args.teacher_dir, max_length=MAX_LENGTH, cache_tokens=True)
+    teacher_logits = {}
+    for name, frame in (("train", train_df), ("val", val_df)):
+        out = teacher.predict(frame["complaint_text"].tolist())
+        teacher_logits[name] = (out["urgency_logits"], out["emotion_logits"])
+    t_urg, t_emo = macro_f1s(val_df["urgency_label"], val_df["emotion_label"], *teacher_logits["val"])
+    print(f"  Teacher val F1: urgency {t_urg:.4f} | emotion {t_emo:.4f}")
+
+    # ── Student ──────────────────────────────────────────────────────────────
+    print()
+    student, tokenizer, history, best_epoch = train_student(args, splits, teacher_logits)
+    save_student(args.output_dir, student, tokenizer)
+    print(f"Student (best epoch {best_epoch}) saved to '{args.output_dir}/'")
+
+    # ── Comparison on the test split ─────────────────────────────────────────
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    texts    = test_df["complaint_text"].tolist()
+    urg_true = test_df["urgency_label"].tolist()
+    emo_true = test_df["emotion_label"].tolist()
+    print(f"\nScoring {len(texts)} test complaints on {DEVICE} ({torch.get_num_threads()} threads) ...")
+
+    # Reloaded from disk, exactly as bulk scoring would use it
+    student_tokenizer, student_model = load_model(args.output_dir)
+    student_engine = InferenceEngine(student_model, student_tokenizer, max_length=args.max_length)
+    predictors = {"teacher": engine_predictor(teacher), "student": engine_predictor(student_engine)}
+    if not args.skip_sbert:
+        predictors["sbert_lr"] = sbert_predictor(train_df)
+    comparison = {name: benchmark(name, predict, texts, urg_true, emo_true, args.latency_samples)
+                  for name, predict in predictors.items()}
+    params = {name: sum(p.numel() for p in engine.model.parameters())
+              for name, engine in (("teacher", teacher), ("student", student_engine))}
+    speedup = comparison["student"]["complaints_per_sec"] / comparison["teacher"]["complaints_per_sec"]
+    print(f"\nStudent: {params['student'] / params['teacher']:.1%} of the teacher's parameters, "
+          f"{speedup:.1f}x its throughput, "
+          f"{comparison['student']['combined_f1'] - comparison['teacher']['combined_f1']:+.4f} combined F1")
+
+    # ── Save ─────────────────────────────────────────────────────────────────
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_path  = os.path.join(RESULTS_DIR, f"distill_{timestamp}.json")
+    with open(out_path, "w") as f:
+        json.dump({
+            "timestamp":       datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "teacher_dir":     args.teacher_dir,
+            "student":         args.student,
+            "student_dir":     args.output_dir,
+            "settings":        {k: v for k, v in vars(args).items()
+                                if k not in ("teacher_dir", "student", "output_dir")},
+            "urgency_weights": URGENCY_WEIGHTS,
+            "parameters":      params,
+            "best_epoch":      best_epoch,
+            "epoch_history":   history,
+            "test_set_size":   len(texts),
+            "threads":         torch.get_num_threads(),
+            "test":            comparison,
+            "labels":          LABEL_NAMES,
+        }, f, indent=2)
+    print(f"Distillation report saved to '{out_path}'")
+
+
+if __name__ == "__main__":
+    main()
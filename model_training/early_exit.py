@@ -0,0 +1,225 @@
+"""Train early-exit heads on the fine-tuned model and report F1 vs exit threshold.
+
+Starts from the fine-tuned DeBERTaMultiHead in model_output/ and adds a pair
+of linear urgency/emotion heads on [CLS] after each --exit-layers layer
+(default: every layer but the last). All exits are trained jointly; the
+loss is the per-exit urgency + emotion loss, weighted by depth so the final
+exit keeps most of the weight. With --freeze-backbone only the new heads
+train, so full-depth predictions stay exactly those of the source model.
+Early stopping uses the mean val combined F1 over all exits.
+
+At inference a complaint stops at the first exit where both heads' top
+softmax probability reaches the threshold. The report then sweeps
+--thresholds on the test split and, for each threshold, gives macro F1,
+average layers executed, the share of complaints leaving at each exit and
+complaints/sec, next to the full-depth model.
+
+The model is saved as a model_output-style directory plus early_exit.json
+(exit layers and the default --threshold). load_model() turns that into
+an EarlyExitMultiHead, so InferenceEngine.from_pretrained, serve.py and
+score_bulk.py take it as --model-dir. ONNX export traces the full-depth path.
+
+Outputs:
+  - model_output_early_exit/           — weights, config, tokenizer, early_exit.json
+  - results/early_exit_<timestamp>.json — per-exit val F1 and the threshold sweep
+
+Usage:
+    python model_training/early_exit.py
+    python model_training/early_exit.py --exit-layers 3 6 9 --freeze-backbone --lr 1e-3
+    python model_training/early_exit.py --thresholds 0.8 0.9 0.95 --threshold 0.95
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from data_utils import ComplaintDataset, load_splits, pad_collate
+from inference import InferenceEngine
+from modeling import (DEVICE, EARLY_EXIT_FILE, LABEL_NAMES, MODEL_DIR, PRUNING_FILE, WEIGHTS_FILE,
+                      EarlyExitMultiHead, apply_pruning, load_model)
+from token_cache import TokenCache
+from train_loop import fit, macro_f1s
+
+# ── Config ───────────────────────────────────────────────────────────────────
+HERE            = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR      = os.path.join(HERE, "model_output_early_exit")
+RESULTS_DIR     = os.path.join(HERE, "results")
+MAX_LENGTH      = 192
+BATCH_SIZE      = 16
+SEED            = 42
+URGENCY_WEIGHTS = [1.0, 1.5, 1.2]   # Low, Medium, High — as in train_deberta.py
+THRESHOLDS      = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+def frame_f1s(frame, urg_logits, emo_logits):
+    return macro_f1s(frame["urgency_label"], frame["emotion_label"], urg_logits, emo_logits)
+
+
+def build(args):
+    """EarlyExitMultiHead carrying the source model's backbone and final heads; new exit heads."""
+    tokenizer, source = load_model(args.model_dir, DEVICE)
+    if isinstance(source, EarlyExitMultiHead):
+        raise SystemExit(f"'{args.model_dir}' already has early exits; start from the plain fine-tuned model")
+    n_layers = len(source.backbone.encoder.layer)
+    exits    = args.exit_layers or list(range(1, n_layers))
+    if not all(1 <= layer < n_layers for layer in exits):
+        raise SystemExit(f"--exit-layers must lie in 1..{n_layers - 1} (layer {n_layers} is the final exit)")
+
+    model   = EarlyExitMultiHead(args.model_dir, exits)
+    pruning = os.path.join(args.model_dir, PRUNING_FILE)
+    if os.path.exists(pruning):
+        with open(pruning) as f:
+            apply_pruning(model, json.load(f))
+    missing, unexpected = model.load_state_dict(source.state_dict(), strict=False)
+    missing = [k for k in missing if not k.startswith("exit_heads.")]   # the new heads start untrained
+    if missing or unexpected:
+        raise RuntimeError(f"'{args.model_dir}' does not match EarlyExitMultiHead: "
+                           f"missing keys {missing}, unexpected keys {unexpected}")
+    return tokenizer, model.to(DEVICE)
+
+
+# ── Training ─────────────────────────────────────────────────────────────────
+def val_exit_f1s(model, tokenizer, frame, batch_size):
+    """Val combined F1 of every exit, all computed from one full-depth pass."""
+    model.eval()
+    engine = InferenceEngine(model, tokenizer, device=DEVICE, batch_size=batch_size, cache_tokens=True)
+    n_exits = len(model.depths)
+    logits  = [(np.zeros((len(frame), 3), np.float32), np.zeros((len(frame), 3), np.float32)) for _ in range(n_exits)]
+    with torch.no_grad():
+        for idx, features in engine.batches(engine.encode(frame["complaint_text"].tolist())):
+            tensors = {k: torch.from_numpy(v).to(DEVICE) for k, v in features.items()}
+            for k, (urg, emo) in enumerate(model.all_exit_logits(**tensors)):
+                logits[k][0][idx], logits[k][1][idx] = urg.float().cpu().numpy(), emo.float().cpu().numpy()
+    return [round(sum(frame_f1s(frame, urg, emo)) / 2, 4) for urg, emo in logits]
+
+
+def train(model, tokenizer, train_ds, val_df, args):
+    """Joint training of all exits; restores the epoch with the best mean val F1 over exits."""
+    if args.freeze_backbone:
+        for name, p in model.named_parameters():
+            p.requires_grad_(name.startswith("exit_heads."))
+    urg_crit = nn.CrossEntropyLoss(weight=torch.tensor(URGENCY_WEIGHTS, dtype=torch.float).to(DEVICE))
+    emo_crit = nn.CrossEntropyLoss()
+    weights  = torch.tensor(model.depths, dtype=torch.float) / sum(model.depths)
+
+    def loss_fn(model, batch, idx):
+        input_ids, attention_mask, token_type_ids, urg, emo = batch
+        exits = model.all_exit_logits(input_ids, attention_mask, token_type_ids)
+        return sum(w * (urg_crit(u, urg) + emo_crit(e, emo)) for w, (u, e) in zip(weights, exits))
+
+    def validate(epoch, train_loss):
+        f1s  = val_exit_f1s(model, tokenizer, val_df, args.batch_size)
+        mean = float(np.mean(f1s))
+        print(f"Epoch {epoch}/{args.epochs} | Train Loss: {train_loss:.4f} | "
+              f"Val F1 by exit: {' '.join(f'{f:.3f}' for f in f1s)} | mean {mean:.4f}", flush=True)
+        return mean, {"val_combined_f1_per_exit": f1s, "val_mean_exit_f1": round(mean, 4)}
+
+    history, _ = fit(model, train_ds, pad_collate(tokenizer.pad_token_id), loss_fn, validate,
+                     args.epochs, args.batch_size, args.lr, patience=args.patience, seed=SEED)
+    return history
+
+
+# ── Threshold sweep ──────────────────────────────────────────────────────────
+def sweep(model, tokenizer, test_df, thresholds, batch_size):
+    """Score the test split at each threshold (``None`` = full depth)."""
+    engine = InferenceEngine(model, tokenizer, device=DEVICE, batch_size=batch_size, cache_tokens=True)
+    texts  = test_df["complaint_text"].tolist()
+    engine.predict(texts[:batch_size])   # warm-up
+    rows   = []
+    for threshold in [None] + thresholds:
+        model.threshold = threshold
+        model.reset_exit_counts()
+        start   = time.perf_counter()
+        out     = engine.predict(texts)
+        elapsed = time.perf_counter() - start
+        urg, emo = frame_f1s(test_df, out["urgency_logits"], out["emotion_logits"])
+        counts   = model.exit_counts if threshold is not None else [0] * (len(model.depths) - 1) + [len(texts)]
+        rows.append({
+            "threshold":          threshold,
+            "urgency_macro_f1":   round(urg, 4),
+            "emotion_macro_f1":   round(emo, 4),
+            "combined_f1":        round((urg + emo) / 2, 4),
+            "avg_layers":         round(float(np.dot(counts, model.depths)) / len(texts), 2),
+            "exit_share":         {str(d): round(c / len(texts), 4) for d, c in zip(model.depths, counts)},
+            "complaints_per_sec": round(len(texts) / elapsed, 1),
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train early-exit heads and sweep the exit threshold.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Fine-tuned model to start from (default: model_output/)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where the early-exit model is saved")
+    parser.add_argument("--exit-layers", nargs="+", type=int, default=None,
+                        help="1-based layers that get exit heads (default: all but the last)")
+    parser.add_argument("--freeze-backbone", action="store_true",
+                        help="Train only the new exit heads; full-depth predictions stay unchanged")
+    parser.add_argument("--epochs", type=int, default=3, help="Max epochs (default: 3)")
+    parser.add_argument("--patience", type=int, default=2, help="Early-stopping patience (default: 2)")
+    parser.add_argument("--lr", type=float, default=1e-5,
+                        help="Peak learning rate (default: 1e-5; use ~1e-3 with --freeze-backbone)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Batch size (default: {BATCH_SIZE})")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=THRESHOLDS,
+                        help="Confidence thresholds to report on the test split")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="Threshold stored in early_exit.json for serving (default: 0.9)")
+    args = parser.parse_args()
+
+    tokenizer, model = build(args)
+    train_df, val_df, test_df = load_splits()
+    print(f"Train: {len(train_df)} | Val: {len(val_df)} | Test: {len(test_df)}")
+    print(f"Exit heads after layers {model.exit_layers} (final exit: layer {model.depths[-1]})")
+
+    cache    = TokenCache(tokenizer, MAX_LENGTH)
+    train_ds = ComplaintDataset(cache.encode(train_df["complaint_text"].tolist()),
+                                train_df["urgency_label"].tolist(), train_df["emotion_label"].tolist())
+    history  = train(model, tokenizer, train_ds, val_df, args)
+
+    print(f"\nScoring {len(test_df)} test complaints per threshold ...")
+    rows = sweep(model, tokenizer, test_df, sorted(args.thresholds), args.batch_size)
+    print(f"\n{'threshold':>9} {'urg F1':>7} {'emo F1':>7} {'layers':>7} {'/sec':>8}")
+    for row in rows:
+        label = "full" if row["threshold"] is None else f"{row['threshold']:g}"
+        print(f"{label:>9} {row['urgency_macro_f1']:>7.4f} {row['emotion_macro_f1']:>7.4f} "
+              f"{row['avg_layers']:>7.2f} {row['complaints_per_sec']:>8.1f}")
+
+    # ── Save ─────────────────────────────────────────────────────────────────
+    model.threshold = args.threshold
+    os.makedirs(args.output_dir, exist_ok=True)
+    torch.save(model.state_dict(), os.path.join(args.output_dir, WEIGHTS_FILE))
+    model.backbone.config.save_pretrained(args.output_dir)
+    tokenizer.save_pretrained(args.output_dir)
+    with open(os.path.join(args.output_dir, EARLY_EXIT_FILE), "w") as f:
+        json.dump({"exit_layers": model.exit_layers, "threshold": args.threshold}, f)
+    if os.path.exists(os.path.join(args.model_dir, PRUNING_FILE)):
+        shutil.copy(os.path.join(args.model_dir, PRUNING_FILE), args.output_dir)
+    print(f"\nEarly-exit model (threshold {args.threshold}) saved to '{args.output_dir}/'")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_path  = os.path.join(RESULTS_DIR, f"early_exit_{timestamp}.json")
+    with open(out_path, "w") as f:
+        json.dump({
+            "timestamp":     datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "model_dir":     args.model_dir,
+            "output_dir":    args.output_dir,
+            "exit_layers":   model.exit_layers,
+            "settings":      {k: v for k, v in vars(args).items() if k not in ("model_dir", "output_dir")},
+            "epoch_history": history,
+            "test_set_size": len(test_df),
+            "threads":       torch.get_num_threads(),
+            "thresholds":    rows,
+            "labels":        LABEL_NAMES,
+        }, f, indent=2)
+    print(f"Early-exit report saved to '{out_path}'")
+
+
+if __name__ == "__main__":
+    main()
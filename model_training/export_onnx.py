@@ -0,0 +1,121 @@
+"""Export the fine-tuned DeBERTaMultiHead to ONNX and check parity with PyTorch.
+
+Writes backbone + urgency_head + emotion_head as one graph with dynamic batch
+and sequence axes to model_output/model.onnx, then scores a sample of
+complaints through both the PyTorch and ONNX Runtime engines and compares
+logits, predicted labels and throughput.
+
+Usage:
+    python model_training/export_onnx.py
+    python model_training/export_onnx.py --n-check 256 --atol 1e-3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from inference import ONNX_FILE, InferenceEngine, OnnxInferenceEngine
+from modeling import MODEL_DIR, EarlyExitMultiHead, load_model
+
+# ── Config ───────────────────────────────────────────────────────────────────
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "telecoms_complaints.csv")
+OPSET    = 17
+
+
+def export(model, tokenizer, output_path, opset=OPSET):
+    """Trace the two-head model once and write it with dynamic batch/sequence axes."""
+    sample = tokenizer(
+        ["Broadband has been down since Monday.", "Wrong charge on my bill again."],
+        padding=True,
+        return_tensors="pt",
+    )
+    args = (sample["input_ids"], sample["attention_mask"], torch.zeros_like(sample["input_ids"]))
+    dynamic = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        model.cpu().eval(),
+        args,
+        output_path,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["urgency_logits", "emotion_logits"],
+        dynamic_axes={
+            "input_ids":      dynamic,
+            "attention_mask": dynamic,
+            "token_type_ids": dynamic,
+            "urgency_logits": {0: "batch"},
+            "emotion_logits": {0: "batch"},
+        },
+        opset_version=opset,
+        dynamo=False,
+    )
+
+
+def timed_predict(engine, texts):
+    start = time.perf_counter()
+    out = engine.predict(texts)
+    return out, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export DeBERTaMultiHead to ONNX and verify parity.")
+    parser.add_argument("--model-dir", default=MODEL_DIR,
+                        help="Directory with config, tokenizer and model_weights.pt")
+    parser.add_argument("--output", default=None,
+                        help=f"ONNX output path (default: <model-dir>/{ONNX_FILE})")
+    parser.add_argument("--opset", type=int, default=OPSET,
+                        help=f"ONNX opset version (default: {OPSET})")
+    parser.add_argument("--n-check", type=int, default=128,
+                        help="Complaints from the dataset used for the parity check (default: 128, 0 to skip)")
+    parser.add_argument("--atol", type=float, default=1e-3,
+                        help="Max absolute logit difference allowed (default: 1e-3)")
+    args = parser.parse_args()
+
+    output_path = args.output or os.path.join(args.model_dir, ONNX_FILE)
+    cpu = torch.device("cpu")
+
+    print(f"Loading model from '{args.model_dir}' ...")
+    tokenizer, model = load_model(args.model_dir, cpu)
+    if isinstance(model, EarlyExitMultiHead):
+        model.threshold = None   # the graph is the full-depth path; compare like with like
+
+    print(f"Exporting to '{output_path}' (opset {args.opset}) ...")
+    export(model, tokenizer, output_path, opset=args.opset)
+    print(f"  Size: {os.path.getsize(output_path) / 1e6:.1f} MB")
+
+    if args.n_check <= 0:
+        return
+
+    # ── Parity check ─────────────────────────────────────────────────────────
+    texts = pd.read_csv(CSV_PATH)["complaint_text"].head(args.n_check).tolist()
+    torch_engine = InferenceEngine(model, tokenizer, device=cpu)
+    onnx_engine  = OnnxInferenceEngine.from_pretrained(args.model_dir, onnx_path=output_path)
+
+    # Warm up both backends so timings exclude one-off initialisation
+    torch_engine.predict(texts[:2])
+    onnx_engine.predict(texts[:2])
+
+    torch_out, torch_secs = timed_predict(torch_engine, texts)
+    onnx_out,  onnx_secs  = timed_predict(onnx_engine, texts)
+
+    print(f"\nParity check on {len(texts)} complaints:")
+    ok = True
+    for head in ["urgency", "emotion"]:
+        diff  = float(np.abs(torch_out[f"{head}_logits"] - onnx_out[f"{head}_logits"]).max())
+        agree = float(np.mean(np.array(torch_out[f"{head}_pred"]) == np.array(onnx_out[f"{head}_pred"])))
+        print(f"  {head.title():<8} max |Δlogit| = {diff:.2e} | label agreement = {agree:.2%}")
+        ok = ok and diff <= args.atol
+    print(f"\n  PyTorch : {len(texts) / torch_secs:8.1f} complaints/s")
+    print(f"  ONNX RT : {len(texts) / onnx_secs:8.1f} complaints/s")
+
+    if not ok:
+        print(f"\nParity check FAILED (atol={args.atol}).")
+        sys.exit(1)
+    print("\nParity check passed.")
+
+
+if __name__ == "__main__":
+    main()
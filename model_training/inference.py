@@ -0,0 +1,222 @@
+"""Batched, dynamically padded inference for the fine-tuned DeBERTa model.
+
+Texts are tokenized once without padding, sorted by token length and grouped
+into batches of similar length. Each batch is padded only to its own longest
+sequence, so short complaints no longer pay for 192 positions of attention.
+Results are scattered back so they line up with the input order.
+
+Complaints longer than ``max_length`` tokens follow the engine's
+``strategy`` (see token_cache.py). With ``sliding``, a long complaint is
+split into overlapping ``max_length`` windows (``stride`` tokens apart),
+every window is scored like a short complaint and the window logits are
+averaged. Complaints that fit always take the single-pass path.
+
+Two backends share the same tokenization, bucketing and ``predict`` API:
+``InferenceEngine`` runs the PyTorch model eagerly and ``OnnxInferenceEngine``
+runs the graph written by ``export_onnx.py`` through ONNX Runtime on CPU.
+
+Usage:
+    engine = InferenceEngine.from_pretrained()
+    out    = engine.predict(texts)
+    out["urgency_probs"]   # (n, 3) numpy array, rows in input order
+"""
+
+import os
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+
+from modeling import DEVICE, LABEL_NAMES, MODEL_DIR, load_model
+from token_cache import TokenCache, tokenize
+
+# ── Config ───────────────────────────────────────────────────────────────────
+MAX_LENGTH = 192
+BATCH_SIZE = 32
+ONNX_FILE  = "model.onnx"
+
+
+def softmax(logits):
+    """Row-wise softmax over a numpy array of logits."""
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def build_output(urg_logits, emo_logits):
+    """Package per-head logits into the dict returned by every ``predict``."""
+    return {
+        "urgency_logits": urg_logits,
+        "emotion_logits": emo_logits,
+        "urgency_probs":  softmax(urg_logits),
+        "emotion_probs":  softmax(emo_logits),
+        "urgency_pred":   [LABEL_NAMES[i] for i in urg_logits.argmax(axis=-1)],
+        "emotion_pred":   [LABEL_NAMES[i] for i in emo_logits.argmax(axis=-1)],
+    }
+
+
+class InferenceEngine:
+    """Length-bucketed batch scorer for ``DeBERTaMultiHead``."""
+
+    def __init__(self, model, tokenizer, device=DEVICE, max_length=MAX_LENGTH, batch_size=BATCH_SIZE,
+                 cache_tokens=False, prediction_cache=None, strategy="truncate", stride=None):
+        self.model            = model
+        self.tokenizer        = tokenizer
+        self.device           = device
+        self.max_length       = max_length
+        self.batch_size       = batch_size
+        self.strategy         = strategy
+        self.stride           = stride or (max_length - 2) // 2   # sliding windows overlap by half
+        self.token_cache      = TokenCache(tokenizer, max_length, strategy=strategy) if cache_tokens else None
+        # Optional PredictionCache; must have been built from this engine's weights
+        self.prediction_cache = prediction_cache
+
+    @classmethod
+    def from_pretrained(cls, model_dir=MODEL_DIR, device=DEVICE, quantized=False, **kwargs):
+        if quantized:
+            device = torch.device("cpu")   # int8 dynamic quantization is CPU-only
+        tokenizer, model = load_model(model_dir, device, quantized=quantized)
+        return cls(model, tokenizer, device=device, **kwargs)
+
+    # ── Pipeline stages ──────────────────────────────────────────────────────
+    def encode(self, texts):
+        """Tokenize ``texts`` without padding; returns one id list per text."""
+        if self.token_cache is not None:
+            return self.token_cache.encode(texts)
+        return tokenize(self.tokenizer, texts, self.max_length, self.strategy)
+
+    def windows(self, input_ids):
+        """Split sequences longer than ``max_length`` into overlapping windows.
+
+        Returns ``(window_ids, owners)`` where ``owners[j]`` is the text that
+        window j belongs to, or ``(input_ids, None)`` when nothing needs
+        splitting. Every window keeps the sequence's [CLS] and [SEP].
+        """
+        if all(len(ids) <= self.max_length for ids in input_ids):
+            return input_ids, None
+        width   = self.max_length - 2
+        windows, owners = [], []
+        for i, ids in enumerate(input_ids):
+            if len(ids) <= self.max_length:
+                windows.append(ids)
+                owners.append(i)
+                continue
+            body   = ids[1:-1]
+            starts = list(range(0, len(body) - width, self.stride)) + [len(body) - width]
+            for start in starts:
+                windows.append(np.concatenate([ids[:1], body[start: start + width], ids[-1:]]))
+                owners.append(i)
+        return windows, np.asarray(owners)
+
+    @staticmethod
+    def pool(urg_logits, emo_logits, owners, n):
+        """Average window logits back into one row per text."""
+        if owners is None:
+            return urg_logits, emo_logits
+        counts = np.bincount(owners, minlength=n)[:, None]
+        pooled = []
+        for logits in (urg_logits, emo_logits):
+            total = np.zeros((n, logits.shape[1]), dtype=np.float32)
+            np.add.at(total, owners, logits)
+            pooled.append(total / counts)
+        return tuple(pooled)
+
+    def batches(self, input_ids):
+        """Yield ``(indices, features)`` with each batch padded to its own longest row."""
+        order = sorted(range(len(input_ids)), key=lambda i: len(input_ids[i]))
+        for start in range(0, len(order), self.batch_size):
+            idx   = order[start: start + self.batch_size]
+            width = len(input_ids[idx[-1]])
+            ids   = np.full((len(idx), width), self.tokenizer.pad_token_id, dtype=np.int64)
+            mask  = np.zeros((len(idx), width), dtype=np.int64)
+            for row, i in enumerate(idx):
+                ids[row, : len(input_ids[i])]  = input_ids[i]
+                mask[row, : len(input_ids[i])] = 1
+            yield idx, {
+                "input_ids":      ids,
+                "attention_mask": mask,
+                "token_type_ids": np.zeros_like(ids),
+            }
+
+    def forward(self, features):
+        """Run one padded batch; returns ``(urgency_logits, emotion_logits)`` as numpy."""
+        tensors = {k: torch.from_numpy(v).to(self.device) for k, v in features.items()}
+        with torch.no_grad():
+            urg_logits, emo_logits = self.model(**tensors)
+        return urg_logits.float().cpu().numpy(), emo_logits.float().cpu().numpy()
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    def predict(self, texts):
+        """Score an iterable of complaint texts.
+
+        Returns a dict of ``urgency_logits``, ``emotion_logits``,
+        ``urgency_probs`` and ``emotion_probs`` (each ``(n, num_classes)``)
+        plus ``urgency_pred`` / ``emotion_pred`` label names, all in input order.
+        """
+        texts = list(texts)
+        if self.prediction_cache is not None:
+            return self._predict_cached(texts)
+        urg_logits, emo_logits = self._logits(texts)
+        return build_output(urg_logits, emo_logits)
+
+    def _logits(self, texts):
+        n = len(texts)
+        input_ids, owners = self.windows(self.encode(texts)) if n else ([], None)
+        urg_logits = np.zeros((len(input_ids), len(LABEL_NAMES)), dtype=np.float32)
+        emo_logits = np.zeros((len(input_ids), len(LABEL_NAMES)), dtype=np.float32)
+        for idx, features in self.batches(input_ids):
+            urg_logits[idx], emo_logits[idx] = self.forward(features)
+        return self.pool(urg_logits, emo_logits, owners, n)
+
+    def _predict_cached(self, texts):
+        """Look texts up in the prediction cache; run the model once per unseen text."""
+        keys, cached = self.prediction_cache.get_many(texts)
+
+        todo = {}   # text hash -> first text with that hash
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                todo.setdefault(key, text)
+        if todo:
+            urg, emo = self._logits(list(todo.values()))
+            self.prediction_cache.put_many(list(todo), urg, emo)
+            cached.update({key: (urg[i], emo[i]) for i, key in enumerate(todo)})
+
+        shape = (len(keys), len(LABEL_NAMES))
+        urg_logits = np.array([cached[key][0] for key in keys], dtype=np.float32).reshape(shape)
+        emo_logits = np.array([cached[key][1] for key in keys], dtype=np.float32).reshape(shape)
+        return build_output(urg_logits, emo_logits)
+
+
+class OnnxInferenceEngine(InferenceEngine):
+    """Same API as ``InferenceEngine`` backed by an ONNX Runtime CPU session."""
+
+    def __init__(self, session, tokenizer, max_length=MAX_LENGTH, batch_size=BATCH_SIZE, cache_tokens=False,
+                 prediction_cache=None, strategy="truncate", stride=None):
+        super().__init__(None, tokenizer, device=torch.device("cpu"), max_length=max_length,
+                         batch_size=batch_size, cache_tokens=cache_tokens, prediction_cache=prediction_cache,
+                         strategy=strategy, stride=stride)
+        self.session     = session
+        # The exporter drops inputs the graph never reads (e.g. token_type_ids
+        # when type_vocab_size == 0), so only feed what the session declares.
+        self.input_names = [i.name for i in session.get_inputs()]
+
+    @classmethod
+    def from_pretrained(cls, model_dir=MODEL_DIR, onnx_path=None, num_threads=None, **kwargs):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        session = ort.InferenceSession(
+            onnx_path or os.path.join(model_dir, ONNX_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        return cls(session, tokenizer, **kwargs)
+
+    def forward(self, features):
+        feeds = {name: features[name] for name in self.input_names}
+        urg_logits, emo_logits = self.session.run(["urgency_logits", "emotion_logits"], feeds)
+        return urg_logits, emo_logits
@@ -0,0 +1,298 @@
+"""DeBERTaMultiHead model definition and loader for the saved weights.
+
+Shared by every script that runs the fine-tuned model so the architecture
+is defined in exactly one place and always matches the saved state dict.
+"""
+
+import json
+import os
+
+import torch
+import torch.nn as nn
+from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+# ── Config ───────────────────────────────────────────────────────────────────
+MODEL_DIR       = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_output")
+WEIGHTS_FILE    = "model_weights.pt"
+INT8_FILE       = "model_weights_int8.pt"
+PRUNING_FILE    = "pruning.json"
+EARLY_EXIT_FILE = "early_exit.json"
+LABEL_NAMES     = ["Low", "Medium", "High"]
+DEVICE          = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+# ── Model ────────────────────────────────────────────────────────────────────
+class DeBERTaMultiHead(nn.Module):
+    """DeBERTa backbone with independent urgency and emotion heads on [CLS].
+
+    With ``pretrained=True`` the backbone weights are downloaded from the Hub
+    (training); otherwise only the structure is built from the saved config
+    and the weights come from ``model_weights.pt`` (inference).
+    """
+
+    def __init__(self, model_name_or_dir, num_classes=3, pretrained=False):
+        super().__init__()
+        if pretrained:
+            self.backbone = AutoModel.from_pretrained(model_name_or_dir)
+        else:
+            config        = AutoConfig.from_pretrained(model_name_or_dir)
+            self.backbone = AutoModel.from_config(config)
+        hidden_size       = self.backbone.config.hidden_size
+        self.urgency_head = nn.Linear(hidden_size, num_classes)
+        self.emotion_head = nn.Linear(hidden_size, num_classes)
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        outputs = self.backbone(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+        )
+        # [CLS] token representation
+        cls = outputs.last_hidden_state[:, 0, :]
+        return self.urgency_head(cls), self.emotion_head(cls)
+
+
+class EarlyExitMultiHead(DeBERTaMultiHead):
+    """DeBERTaMultiHead with extra urgency/emotion heads after intermediate layers.
+
+    ``exit_layers`` are 1-based layer numbers below the last one; each gets
+    its own pair of linear heads on [CLS], and the last layer keeps the
+    inherited ``urgency_head`` / ``emotion_head``. With a ``threshold`` set,
+    eval-mode ``forward`` runs the encoder layer by layer and a complaint
+    leaves at the first exit where both heads' top softmax probability
+    reaches it; the rest of the batch carries on. ``exit_counts[k]`` counts
+    complaints that left at exit k (the last entry is the final layer).
+    Training, tracing (ONNX export) and ``threshold=None`` run full depth.
+    """
+
+    def __init__(self, model_name_or_dir, exit_layers, threshold=None, num_classes=3, pretrained=False):
+        super().__init__(model_name_or_dir, num_classes, pretrained)
+        hidden_size      = self.backbone.config.hidden_size
+        self.exit_layers = sorted(exit_layers)
+        self.exit_heads  = nn.ModuleList(
+            nn.ModuleDict({"urgency": nn.Linear(hidden_size, num_classes),
+                           "emotion": nn.Linear(hidden_size, num_classes)})
+            for _ in self.exit_layers
+        )
+        self.threshold = threshold
+        self.reset_exit_counts()
+
+    def reset_exit_counts(self):
+        self.exit_counts = [0] * (len(self.exit_layers) + 1)
+
+    @property
+    def depths(self):
+        """Layers executed for a complaint leaving at each exit."""
+        return self.exit_layers + [len(self.backbone.encoder.layer)]
+
+    def all_exit_logits(self, input_ids, attention_mask, token_type_ids=None):
+        """``[(urgency_logits, emotion_logits)]`` at every exit, shallowest first (for training)."""
+        hidden = self.backbone(input_ids=input_ids, attention_mask=attention_mask,
+                               token_type_ids=token_type_ids, output_hidden_states=True).hidden_states
+        logits = [(heads["urgency"](hidden[layer][:, 0, :]), heads["emotion"](hidden[layer][:, 0, :]))
+                  for layer, heads in zip(self.exit_layers, self.exit_heads)]
+        cls = hidden[-1][:, 0, :]
+        return logits + [(self.urgency_head(cls), self.emotion_head(cls))]
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        if self.threshold is None or self.training or torch.jit.is_tracing():
+            return super().forward(input_ids, attention_mask, token_type_ids)
+
+        backbone = self.backbone
+        encoder  = backbone.encoder
+        hidden   = backbone.embeddings(input_ids=input_ids, token_type_ids=token_type_ids, mask=attention_mask)
+        embedded = hidden
+        mask     = encoder.get_attention_mask(attention_mask)
+        rel_pos  = encoder.get_rel_pos(hidden)
+        rel_emb  = encoder.get_rel_embedding()
+
+        n   = input_ids.shape[0]
+        urg = torch.zeros(n, self.urgency_head.out_features, device=input_ids.device)
+        emo = torch.zeros(n, self.emotion_head.out_features, device=input_ids.device)
+        rows  = torch.arange(n, device=input_ids.device)   # original rows still running
+        exits = dict(zip(self.exit_layers, self.exit_heads))
+        for i, layer in enumerate(encoder.layer, start=1):
+            hidden, _ = layer(hidden, mask, relative_pos=rel_pos, rel_embeddings=rel_emb)
+            if i == 1 and encoder.conv is not None:
+                hidden = encoder.conv(embedded, hidden, attention_mask)
+            if i not in exits:
+                continue
+            cls      = hidden[:, 0, :]
+            urg_out  = exits[i]["urgency"](cls)
+            emo_out  = exits[i]["emotion"](cls)
+            done     = ((urg_out.softmax(-1).max(-1).values >= self.threshold)
+                        & (emo_out.softmax(-1).max(-1).values >= self.threshold))
+            urg[rows[done]], emo[rows[done]] = urg_out[done].float(), emo_out[done].float()
+            self.exit_counts[self.exit_layers.index(i)] += int(done.sum())
+            if done.all():
+                return urg, emo
+            keep   = ~done
+            rows   = rows[keep]
+            hidden = hidden[keep]
+            mask   = mask[keep]
+            attention_mask = attention_mask[keep]
+
+        cls = hidden[:, 0, :]
+        urg[rows], emo[rows] = self.urgency_head(cls).float(), self.emotion_head(cls).float()
+        self.exit_counts[-1] += len(rows)
+        return urg, emo
+
+
+# ── Fine-tuning controls ─────────────────────────────────────────────────────
+def _embedding_modules(backbone):
+    # DeBERTa keeps its relative-position table (and its LayerNorm) on the
+    # encoder; every layer reads it, so it belongs with the embeddings.
+    encoder = backbone.encoder
+    return [backbone.embeddings] + [m for m in (getattr(encoder, "rel_embeddings", None),
+                                                getattr(encoder, "LayerNorm", None)) if m is not None]
+
+
+def freeze_lower(model, embeddings=False, layers=0):
+    """Stop gradients to the embeddings and the first ``layers`` encoder layers.
+
+    Freezing any layer also freezes the embeddings, otherwise the backward
+    pass would still have to run through the frozen layers to reach them.
+    Returns the number of parameters left trainable.
+    """
+    frozen = []
+    if embeddings or layers:
+        frozen += _embedding_modules(model.backbone)
+    frozen += list(model.backbone.encoder.layer[:layers])
+    for module in frozen:
+        for p in module.parameters():
+            p.requires_grad_(False)
+    return sum(p.numel() for p in model.parameters() if p.requires_grad)
+
+
+def layerwise_param_groups(model, lr, decay=1.0):
+    """AdamW parameter groups with layer-wise learning-rate decay.
+
+    The heads train at ``lr``, encoder layer i (of L) at ``lr * decay**(L - i)``
+    and the embeddings at ``lr * decay**(L + 1)``. Frozen parameters are left
+    out so they carry no optimizer state.
+    """
+    layers = model.backbone.encoder.layer
+    n      = len(layers)
+    groups = [(model.urgency_head, 0), (model.emotion_head, 0)]
+    groups += [(layer, n - i) for i, layer in enumerate(layers)]
+    groups += [(module, n + 1) for module in _embedding_modules(model.backbone)]
+    return [
+        {"params": params, "lr": lr * decay ** depth}
+        for module, depth in groups
+        if (params := [p for p in module.parameters() if p.requires_grad])
+    ]
+
+
+# ── Structured pruning ───────────────────────────────────────────────────────
+def _select(linear, index, dim):
+    """Copy of ``linear`` keeping only output rows (dim 0) or input columns (dim 1) ``index``."""
+    index  = torch.as_tensor(index, dtype=torch.long, device=linear.weight.device)
+    weight = linear.weight.index_select(dim, index)
+    new    = nn.Linear(weight.shape[1], weight.shape[0], bias=linear.bias is not None)
+    new    = new.to(device=weight.device, dtype=weight.dtype)
+    with torch.no_grad():
+        new.weight.copy_(weight)
+        if linear.bias is not None:
+            new.bias.copy_(linear.bias[index] if dim == 0 else linear.bias)
+    return new
+
+
+def shrink_layer(layer, heads, units):
+    """Physically remove attention heads and FFN units from one DeBERTa encoder layer.
+
+    Only the heads in ``heads`` and the intermediate units in ``units`` are
+    kept; the projections around them lose the matching rows/columns, so the
+    layer does proportionally less work.
+    """
+    attn = layer.attention.self
+    size = attn.attention_head_size
+    rows = [h * size + i for h in heads for i in range(size)]
+    for name in ("query_proj", "key_proj", "value_proj", "pos_key_proj", "pos_query_proj"):
+        if isinstance(getattr(attn, name, None), nn.Linear):
+            setattr(attn, name, _select(getattr(attn, name), rows, dim=0))
+    layer.attention.output.dense = _select(layer.attention.output.dense, rows, dim=1)
+    attn.num_attention_heads     = len(heads)
+    attn.all_head_size           = len(rows)
+
+    layer.intermediate.dense = _select(layer.intermediate.dense, units, dim=0)
+    layer.output.dense       = _select(layer.output.dense, units, dim=1)
+
+
+def apply_pruning(model, spec):
+    """Shrink ``model`` to the per-layer ``num_heads`` / ``intermediate_size`` in a pruning.json spec.
+
+    Used when loading: kept heads and units were moved to the front when the
+    pruned weights were saved, so the structure only needs the right sizes.
+    """
+    for layer, heads, units in zip(model.backbone.encoder.layer, spec["num_heads"], spec["intermediate_size"]):
+        shrink_layer(layer, range(heads), range(units))
+    return model
+
+
+def build_model(model_dir):
+    """Untrained model with the structure of ``model_dir``: early-exit and/or pruned, if it was."""
+    early_exit = os.path.join(model_dir, EARLY_EXIT_FILE)
+    if os.path.exists(early_exit):
+        with open(early_exit) as f:
+            spec = json.load(f)
+        model = EarlyExitMultiHead(model_dir, spec["exit_layers"], spec.get("threshold"))
+    else:
+        model = DeBERTaMultiHead(model_dir)
+    pruning = os.path.join(model_dir, PRUNING_FILE)
+    if os.path.exists(pruning):
+        with open(pruning) as f:
+            apply_pruning(model, json.load(f))
+    return model
+
+
+def cache_variant(model_dir, strategy="truncate"):
+    """PredictionCache ``variant`` for ``model_dir``: the settings besides its weights that change its outputs.
+
+    That is the long-text strategy and, for an early-exit model, its
+    early_exit.json (exit layers and threshold), so editing the threshold
+    never serves predictions made at the old one.
+    """
+    parts = [] if strategy == "truncate" else [strategy]
+    early_exit = os.path.join(model_dir, EARLY_EXIT_FILE)
+    if os.path.exists(early_exit):
+        with open(early_exit) as f:
+            parts.append("early_exit=" + json.dumps(json.load(f), sort_keys=True))
+    return ":".join(parts)
+
+
+# ── Quantization ─────────────────────────────────────────────────────────────
+def quantize_int8(model):
+    """Dynamically quantize every nn.Linear (backbone and both heads) to int8.
+
+    Weights are stored as int8 and activations are quantized on the fly, so
+    no calibration data is needed. The result only runs on CPU.
+    """
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model.cpu().eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+# ── Loading ──────────────────────────────────────────────────────────────────
+def weights_path(model_dir=MODEL_DIR, quantized=False):
+    """Path of the fp32 (or int8) state dict inside ``model_dir``."""
+    return os.path.join(model_dir, INT8_FILE if quantized else WEIGHTS_FILE)
+
+
+def load_model(model_dir=MODEL_DIR, device=DEVICE, quantized=False):
+    """Load the tokenizer and fine-tuned model from ``model_dir`` in eval mode.
+
+    With ``quantized=True`` the int8 copy written by ``quantize_model.py``
+    (``model_weights_int8.pt``) is loaded instead and the model stays on CPU.
+    A ``pruning.json`` written by ``prune.py`` is applied before the weights
+    are loaded, and a directory with an ``early_exit.json`` from
+    ``early_exit.py`` loads as an ``EarlyExitMultiHead``.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    if quantized:
+        model = quantize_int8(build_model(model_dir))
+        model.load_state_dict(torch.load(weights_path(model_dir, quantized=True), map_location="cpu"))
+    else:
+        model = build_model(model_dir).to(device)
+        model.load_state_dict(torch.load(weights_path(model_dir), map_location=device))
+    model.eval()
+    return tokenizer, model
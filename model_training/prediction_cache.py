@@ -0,0 +1,151 @@
+"""Content-addressed cache of DeBERTa predictions for repeated complaint texts.
+
+Entries are keyed by (hash of the model weights file, hash of the normalised
+complaint text) and hold the raw urgency/emotion logits, so a byte-identical
+complaint — or one differing only in Unicode form or whitespace — is scored
+once per set of weights. Retraining or switching to the int8 weights changes
+the weights hash, so stale predictions are never served. Engines that read
+long complaints differently (``--long-text``) or stop early at a different
+exit threshold pass a ``variant`` (``modeling.cache_variant``) that is mixed
+into the model hash, so each setting keeps its own entries.
+
+Two tiers:
+  - memory  — LRU of the ``max_entries`` most recently used texts
+  - disk    — optional SQLite file shared across runs and processes; memory
+              misses fall through to it and disk hits are promoted to memory
+
+Counters exposed by ``stats()``: hits (memory), disk_hits, misses, evictions
+(memory LRU), entries and hit_rate.
+
+Usage:
+    cache  = PredictionCache(weights_path(MODEL_DIR), db_path="predictions.sqlite")
+    engine = InferenceEngine.from_pretrained(prediction_cache=cache)
+    engine.predict(texts)             # only unseen texts reach the model
+"""
+
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# ── Config ───────────────────────────────────────────────────────────────────
+MAX_ENTRIES = 100_000
+
+
+def normalize_text(text):
+    """Unicode NFC with runs of whitespace collapsed; casing is kept (the model is cased)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    """sha256 of a weights file, read in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """LRU memory tier plus optional SQLite tier of per-text logits."""
+
+    def __init__(self, weights_file, db_path=None, max_entries=MAX_ENTRIES, variant=""):
+        self.model_hash  = file_hash(weights_file)
+        if variant:
+            self.model_hash = hashlib.sha256(f"{self.model_hash}:{variant}".encode()).hexdigest()
+        self.max_entries = max_entries
+        self.memory      = OrderedDict()   # text hash -> (urg_logits, emo_logits)
+        # serve.py calls predict from its forward thread while /metrics reads
+        # stats from HTTP threads, so every access goes through one lock
+        self.lock        = threading.Lock()
+        self.counters    = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " model_hash TEXT, text_hash TEXT, urgency_logits BLOB, emotion_logits BLOB,"
+                " PRIMARY KEY (model_hash, text_hash))"
+            )
+            self.db.commit()
+
+    # ── Tiers ────────────────────────────────────────────────────────────────
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _disk_get(self, keys):
+        found = {}
+        keys  = list(keys)
+        for start in range(0, len(keys), 500):   # stay under SQLite's bound-parameter limit
+            chunk = keys[start: start + 500]
+            rows  = self.db.execute(
+                f"SELECT text_hash, urgency_logits, emotion_logits FROM predictions "
+                f"WHERE model_hash = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                [self.model_hash, *chunk],
+            )
+            for key, urg, emo in rows:
+                found[key] = (np.frombuffer(urg, dtype=np.float32), np.frombuffer(emo, dtype=np.float32))
+        return found
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    def get_many(self, texts):
+        """Return ``(keys, cached)``: one hash per text and a dict of the hashes found."""
+        keys = [text_hash(t) for t in texts]
+        with self.lock:
+            cached = {}
+            for key in set(keys):
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    cached[key] = self.memory[key]
+            self.counters["hits"] += sum(key in cached for key in keys)
+
+            if self.db is not None:
+                on_disk = self._disk_get({k for k in keys if k not in cached})
+                for key, value in on_disk.items():
+                    self._remember(key, value)
+                cached.update(on_disk)
+                self.counters["disk_hits"] += sum(key in on_disk for key in keys)
+
+            self.counters["misses"] += sum(key not in cached for key in keys)
+        return keys, cached
+
+    def put_many(self, keys, urg_logits, emo_logits):
+        """Store freshly computed logits (rows aligned with ``keys``)."""
+        urg_logits = np.asarray(urg_logits, dtype=np.float32)
+        emo_logits = np.asarray(emo_logits, dtype=np.float32)
+        with self.lock:
+            for key, urg, emo in zip(keys, urg_logits, emo_logits):
+                self._remember(key, (urg.copy(), emo.copy()))
+            if self.db is not None:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                    [(self.model_hash, key, urg.tobytes(), emo.tobytes())
+                     for key, urg, emo in zip(keys, urg_logits, emo_logits)],
+                )
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            c       = dict(self.counters)
+            lookups = c["hits"] + c["disk_hits"] + c["misses"]
+            c["entries"]  = len(self.memory)
+            c["hit_rate"] = round((c["hits"] + c["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return c
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,272 @@
+"""Structured pruning of attention heads and FFN units in the fine-tuned model.
+
+Importance is the first-order Taylor estimate of how much the combined
+urgency + emotion loss on the validation split changes when a unit is
+removed. Every attention head and every intermediate FFN unit gets a gate
+fixed at 1.0, and its score is |d loss / d gate| accumulated over the split.
+Scores are normalised within each layer, then ranked globally. Each layer
+keeps at least one head and one FFN unit.
+
+The lowest-ranked --heads / --ffn fraction is removed structurally.
+Query/key/value (and relative-position) projections lose their rows.
+Attention-output and FFN-output projections lose the matching columns.
+Each layer therefore does proportionally fewer FLOPs. An optional short
+fine-tune on the training split (--finetune-epochs) recovers accuracy; the
+best epoch by val combined F1 is kept, counting the pruned-only model as
+epoch 0.
+
+The result is a model_output-style directory plus pruning.json (kept heads
+and FFN width per layer). load_model() reads that file, so
+InferenceEngine.from_pretrained, export_onnx.py, quantize_model.py and
+serve.py all take the pruned directory as --model-dir.
+
+Outputs:
+  - model_output_pruned/             — weights, config, tokenizer, pruning.json
+  - results/pruning_<timestamp>.json — sizes, val/test F1 and throughput before and after
+
+Usage:
+    python model_training/prune.py --heads 0.3 --ffn 0.3
+    python model_training/prune.py --heads 0.5 --ffn 0.4 --finetune-epochs 2 --output-dir model_output_pruned50
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from data_utils import ComplaintDataset, LengthBucketSampler, load_splits, pad_collate
+from inference import InferenceEngine
+from modeling import DEVICE, LABEL_NAMES, MODEL_DIR, PRUNING_FILE, WEIGHTS_FILE, load_model, shrink_layer
+from token_cache import TokenCache
+from train_loop import fit, macro_f1s
+
+# ── Config ───────────────────────────────────────────────────────────────────
+HERE            = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR      = os.path.join(HERE, "model_output_pruned")
+RESULTS_DIR     = os.path.join(HERE, "results")
+MAX_LENGTH      = 192
+BATCH_SIZE      = 16
+SEED            = 42
+URGENCY_WEIGHTS = [1.0, 1.5, 1.2]   # Low, Medium, High — as in train_deberta.py
+
+
+# ── Importance ───────────────────────────────────────────────────────────────
+def attach_gates(model):
+    """Multiply every head's context and every FFN activation by a gate of 1.0.
+
+    Returns ``(head_gates, ffn_gates, hooks)``; gates are per-layer leaf
+    tensors whose gradients are the Taylor importance scores.
+    """
+    head_gates, ffn_gates, hooks = [], [], []
+    for layer in model.backbone.encoder.layer:
+        attn  = layer.attention.self
+        heads = torch.ones(attn.num_attention_heads, device=DEVICE, requires_grad=True)
+        units = torch.ones(layer.intermediate.dense.out_features, device=DEVICE, requires_grad=True)
+
+        def gate_heads(module, inputs, output, gate=heads):
+            context, *rest = output
+            shape = context.shape
+            context = (context.view(*shape[:-1], len(gate), -1) * gate[:, None]).view(shape)
+            return (context, *rest)
+
+        def gate_units(module, inputs, output, gate=units):
+            return output * gate
+
+        hooks.append(attn.register_forward_hook(gate_heads))
+        hooks.append(layer.intermediate.register_forward_hook(gate_units))
+        head_gates.append(heads)
+        ffn_gates.append(units)
+    return head_gates, ffn_gates, hooks
+
+
+def taylor_importance(model, loader, urg_criterion, emo_criterion):
+    """Per-layer |d loss / d gate| for heads and FFN units, summed over ``loader``."""
+    head_gates, ffn_gates, hooks = attach_gates(model)
+    head_scores = [torch.zeros_like(g) for g in head_gates]
+    ffn_scores  = [torch.zeros_like(g) for g in ffn_gates]
+    model.eval()   # no dropout, but gradients still flow to the gates
+    for input_ids, attention_mask, token_type_ids, urg, emo in loader:
+        urg_logits, emo_logits = model(input_ids.to(DEVICE), attention_mask.to(DEVICE), token_type_ids.to(DEVICE))
+        loss  = urg_criterion(urg_logits, urg.to(DEVICE)) + emo_criterion(emo_logits, emo.to(DEVICE))
+        grads = torch.autograd.grad(loss, head_gates + ffn_gates)
+        for scores, grad in zip(head_scores + ffn_scores, grads):
+            scores += grad.abs()
+    for hook in hooks:
+        hook.remove()
+    model.zero_grad(set_to_none=True)
+    return [s.cpu() for s in head_scores], [s.cpu() for s in ffn_scores]
+
+
+def select(scores, fraction):
+    """Indices to keep per layer after dropping the globally lowest ``fraction`` of units.
+
+    Scores are L2-normalised within each layer so layers are comparable; the
+    best unit of every layer is always kept.
+    """
+    normed  = [s / (s.norm() + 1e-12) for s in scores]
+    flat    = torch.cat(normed)
+    n_prune = int(fraction * len(flat))
+    if n_prune == 0:
+        return [list(range(len(s))) for s in scores]
+    protected = torch.cat([torch.nn.functional.one_hot(s.argmax(), len(s)).bool() for s in normed])
+    candidates = torch.where(~protected)[0]
+    order      = candidates[flat[candidates].argsort()][:n_prune]
+    drop       = torch.zeros(len(flat), dtype=torch.bool)
+    drop[order] = True
+    keep, start = [], 0
+    for s in scores:
+        keep.append(torch.where(~drop[start: start + len(s)])[0].tolist())
+        start += len(s)
+    return keep
+
+
+# ── Evaluation and fine-tuning ───────────────────────────────────────────────
+def evaluate(model, tokenizer, frame):
+    """Macro F1 and throughput of ``model`` on one split, scored with InferenceEngine."""
+    engine = InferenceEngine(model, tokenizer, device=DEVICE, cache_tokens=True)
+    texts  = frame["complaint_text"].tolist()
+    start  = time.perf_counter()
+    out    = engine.predict(texts)
+    elapsed = time.perf_counter() - start
+    urg, emo = macro_f1s(frame["urgency_label"], frame["emotion_label"], out["urgency_logits"], out["emotion_logits"])
+    return {
+        "urgency_macro_f1":   round(urg, 4),
+        "emotion_macro_f1":   round(emo, 4),
+        "combined_f1":        round((urg + emo) / 2, 4),
+        "complaints_per_sec": round(len(texts) / elapsed, 1),
+    }
+
+
+def finetune(model, tokenizer, train_ds, val_df, urg_criterion, emo_criterion, args):
+    """Recover accuracy after pruning; returns the per-epoch history, best epoch restored."""
+    def loss_fn(model, batch, idx):
+        input_ids, attention_mask, token_type_ids, urg, emo = batch
+        urg_logits, emo_logits = model(input_ids, attention_mask, token_type_ids)
+        return urg_criterion(urg_logits, urg) + emo_criterion(emo_logits, emo)
+
+    def validate(epoch, train_loss):
+        val = evaluate(model, tokenizer, val_df)["combined_f1"]
+        print(f"  Fine-tune epoch {epoch}/{args.finetune_epochs} | Train Loss: {train_loss:.4f} | "
+              f"Val Combined F1: {val:.4f}", flush=True)
+        return val, {"val_combined_f1": val}
+
+    baseline = evaluate(model, tokenizer, val_df)["combined_f1"]
+    history, _ = fit(model, train_ds, pad_collate(tokenizer.pad_token_id), loss_fn, validate,
+                     args.finetune_epochs, BATCH_SIZE, args.lr, baseline=baseline, seed=SEED)
+    return [{"epoch": 0, "val_combined_f1": baseline}] + history
+
+
+def count_params(model):
+    return sum(p.numel() for p in model.backbone.encoder.layer.parameters())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prune attention heads and FFN units from the fine-tuned model.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Fine-tuned model to prune (default: model_output/)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where the pruned model is saved")
+    parser.add_argument("--heads", type=float, default=0.3, help="Fraction of attention heads to remove (default: 0.3)")
+    parser.add_argument("--ffn", type=float, default=0.3, help="Fraction of FFN units to remove (default: 0.3)")
+    parser.add_argument("--finetune-epochs", type=int, default=0,
+                        help="Epochs of fine-tuning after pruning (default: 0)")
+    parser.add_argument("--lr", type=float, default=1e-5, help="Fine-tuning learning rate (default: 1e-5)")
+    args = parser.parse_args()
+    if os.path.abspath(args.output_dir) == os.path.abspath(args.model_dir):
+        parser.error("--output-dir must differ from --model-dir")
+
+    if os.path.exists(os.path.join(args.model_dir, PRUNING_FILE)):
+        parser.error(f"'{args.model_dir}' is already pruned; prune the unpruned model with larger fractions")
+
+    tokenizer, model = load_model(args.model_dir, DEVICE)
+    train_df, val_df, test_df = load_splits()
+    print(f"Train: {len(train_df)} | Val: {len(val_df)} | Test: {len(test_df)}")
+
+    cache    = TokenCache(tokenizer, MAX_LENGTH)
+    datasets = {name: ComplaintDataset(cache.encode(frame["complaint_text"].tolist()),
+                                       frame["urgency_label"].tolist(), frame["emotion_label"].tolist())
+                for name, frame in (("train", train_df), ("val", val_df))}
+    val_loader = torch.utils.data.DataLoader(
+        datasets["val"], batch_sampler=LengthBucketSampler(datasets["val"].lengths, BATCH_SIZE, shuffle=False),
+        collate_fn=pad_collate(tokenizer.pad_token_id))
+    urg_criterion = nn.CrossEntropyLoss(weight=torch.tensor(URGENCY_WEIGHTS, dtype=torch.float).to(DEVICE))
+    emo_criterion = nn.CrossEntropyLoss()
+
+    print("\nScoring the unpruned model ...")
+    before = {"val": evaluate(model, tokenizer, val_df), "test": evaluate(model, tokenizer, test_df)}
+    params_before = count_params(model)
+
+    # ── Score and prune ──────────────────────────────────────────────────────
+    print("Estimating head / FFN unit importance on the validation split ...")
+    head_scores, ffn_scores = taylor_importance(model, val_loader, urg_criterion, emo_criterion)
+    keep_heads = select(head_scores, args.heads)
+    keep_units = select(ffn_scores, args.ffn)
+    for layer, heads, units in zip(model.backbone.encoder.layer, keep_heads, keep_units):
+        shrink_layer(layer, heads, units)
+
+    spec = {
+        "num_heads":         [len(h) for h in keep_heads],
+        "intermediate_size": [len(u) for u in keep_units],
+        "kept_heads":        keep_heads,   # original head indices, for reference
+    }
+    print(f"{'layer':>5} {'heads':>7} {'ffn units':>11}")
+    for i, (h, u) in enumerate(zip(spec["num_heads"], spec["intermediate_size"])):
+        print(f"{i:>5} {h:>3}/{len(head_scores[i]):<3} {u:>5}/{len(ffn_scores[i]):<5}")
+    params_after = count_params(model)
+    print(f"Encoder parameters: {params_before / 1e6:.1f}M -> {params_after / 1e6:.1f}M "
+          f"({1 - params_after / params_before:.0%} removed)")
+
+    history = []
+    if args.finetune_epochs:
+        print(f"\nFine-tuning for up to {args.finetune_epochs} epochs ...")
+        history = finetune(model, tokenizer, datasets["train"], val_df, urg_criterion, emo_criterion, args)
+
+    print("\nScoring the pruned model ...")
+    after = {"val": evaluate(model, tokenizer, val_df), "test": evaluate(model, tokenizer, test_df)}
+
+    print(f"\n{'':<22} {'before':>10} {'after':>10} {'delta':>10}")
+    print("-" * 54)
+    for key in ["urgency_macro_f1", "emotion_macro_f1"]:
+        b, a = before["test"][key], after["test"][key]
+        print(f"{'test ' + key:<22} {b:>10.4f} {a:>10.4f} {a - b:>+10.4f}")
+    b, a = before["test"]["complaints_per_sec"], after["test"]["complaints_per_sec"]
+    print(f"{'complaints/sec':<22} {b:>10.1f} {a:>10.1f} {a / b:>9.2f}x")
+
+    # ── Save ─────────────────────────────────────────────────────────────────
+    os.makedirs(args.output_dir, exist_ok=True)
+    torch.save(model.state_dict(), os.path.join(args.output_dir, WEIGHTS_FILE))
+    model.backbone.config.save_pretrained(args.output_dir)
+    tokenizer.save_pretrained(args.output_dir)
+    with open(os.path.join(args.output_dir, PRUNING_FILE), "w") as f:
+        json.dump(spec, f)
+    for stale in ("model.onnx", "model_weights_int8.pt"):   # belong to the unpruned weights
+        if os.path.exists(os.path.join(args.output_dir, stale)):
+            os.remove(os.path.join(args.output_dir, stale))
+    print(f"\nPruned model saved to '{args.output_dir}/'")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_path  = os.path.join(RESULTS_DIR, f"pruning_{timestamp}.json")
+    with open(out_path, "w") as f:
+        json.dump({
+            "timestamp":         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "model_dir":         args.model_dir,
+            "output_dir":        args.output_dir,
+            "settings":          {k: v for k, v in vars(args).items() if k not in ("model_dir", "output_dir")},
+            "encoder_params":    {"before": params_before, "after": params_after},
+            "num_heads":         spec["num_heads"],
+            "intermediate_size": spec["intermediate_size"],
+            "head_importance":   [np.round(s.numpy(), 6).tolist() for s in head_scores],
+            "finetune_history":  history,
+            "before":            before,
+            "after":             after,
+            "labels":            LABEL_NAMES,
+        }, f, indent=2)
+    print(f"Pruning report saved to '{out_path}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Produce an int8 dynamically-quantized copy of the fine-tuned model.
+
+Quantizes every nn.Linear in DeBERTaMultiHead (backbone, urgency_head and
+emotion_head), saves it next to the fp32 weights as model_weights_int8.pt,
+then scores the standard 15% test split with both models so the accuracy
+cost can be weighed against the CPU speedup and smaller footprint.
+
+Load the int8 model with InferenceEngine.from_pretrained(quantized=True), or
+pass --int8 to adversarial_test.py / compare_models.py.
+
+Outputs (saved to model_training/results/):
+  - quantization_<timestamp>.json — macro/per-class F1 for fp32 and int8,
+    deltas, label agreement, weight file sizes and test-set throughput
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+from sklearn.metrics import f1_score
+
+from data_utils import load_splits
+from inference import InferenceEngine
+from modeling import INT8_FILE, LABEL_NAMES, MODEL_DIR, WEIGHTS_FILE, load_model, quantize_int8
+
+# ── Config ───────────────────────────────────────────────────────────────────
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def evaluate(engine, texts, urg_true, emo_true):
+    """Score ``texts`` and return (metrics dict, raw predict output)."""
+    start = time.perf_counter()
+    out = engine.predict(texts)
+    elapsed = time.perf_counter() - start
+
+    urg_pred = out["urgency_logits"].argmax(axis=-1)
+    emo_pred = out["emotion_logits"].argmax(axis=-1)
+    urg_f1 = f1_score(urg_true, urg_pred, average=None, labels=[0, 1, 2], zero_division=0)
+    emo_f1 = f1_score(emo_true, emo_pred, average=None, labels=[0, 1, 2], zero_division=0)
+    metrics = {
+        "urgency_macro_f1":  round(float(f1_score(urg_true, urg_pred, average="macro", zero_division=0)), 4),
+        "urgency_f1_low":    round(float(urg_f1[0]), 4),
+        "urgency_f1_medium": round(float(urg_f1[1]), 4),
+        "urgency_f1_high":   round(float(urg_f1[2]), 4),
+        "emotion_macro_f1":  round(float(f1_score(emo_true, emo_pred, average="macro", zero_division=0)), 4),
+        "emotion_f1_low":    round(float(emo_f1[0]), 4),
+        "emotion_f1_medium": round(float(emo_f1[1]), 4),
+        "emotion_f1_high":   round(float(emo_f1[2]), 4),
+        "seconds":           round(elapsed, 2),
+        "complaints_per_sec": round(len(texts) / elapsed, 1),
+    }
+    return metrics, out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Quantize DeBERTaMultiHead to int8 and compare against fp32.")
+    parser.add_argument("--model-dir", default=MODEL_DIR,
+                        help="Directory with config, tokenizer and model_weights.pt")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch intra-op threads for the comparison (default: torch default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    cpu = torch.device("cpu")
+
+    # ── Quantize and save ────────────────────────────────────────────────────
+    print(f"Loading fp32 model from '{args.model_dir}' ...")
+    tokenizer, fp32_model = load_model(args.model_dir, cpu)
+
+    print("Quantizing nn.Linear layers to int8 ...")
+    int8_model = quantize_int8(fp32_model)   # returns a quantized copy; fp32_model is untouched
+    int8_path  = os.path.join(args.model_dir, INT8_FILE)
+    torch.save(int8_model.state_dict(), int8_path)
+
+    fp32_mb = os.path.getsize(os.path.join(args.model_dir, WEIGHTS_FILE)) / 1e6
+    int8_mb = os.path.getsize(int8_path) / 1e6
+    print(f"  Saved '{int8_path}' ({int8_mb:.0f} MB vs {fp32_mb:.0f} MB fp32)")
+
+    # ── Compare on the test split ────────────────────────────────────────────
+    _, _, test_df = load_splits()
+    texts    = test_df["complaint_text"].tolist()
+    urg_true = test_df["urgency_label"].tolist()
+    emo_true = test_df["emotion_label"].tolist()
+    print(f"\nScoring {len(texts)} test complaints with each model ...")
+
+    fp32_metrics, fp32_out = evaluate(InferenceEngine(fp32_model, tokenizer, device=cpu), texts, urg_true, emo_true)
+    int8_metrics, int8_out = evaluate(InferenceEngine(int8_model, tokenizer, device=cpu), texts, urg_true, emo_true)
+
+    deltas = {
+        k: round(int8_metrics[k] - fp32_metrics[k], 4)
+        for k in fp32_metrics if k.endswith("_f1") or "_f1_" in k
+    }
+    agreement = {
+        head: round(float(np.mean(np.array(fp32_out[f"{head}_pred"]) == np.array(int8_out[f"{head}_pred"]))), 4)
+        for head in ["urgency", "emotion"]
+    }
+
+    print(f"\n{'':<20} {'fp32':>10} {'int8':>10} {'delta':>10}")
+    print("-" * 52)
+    for key in ["urgency_macro_f1", "emotion_macro_f1"]:
+        print(f"{key:<20} {fp32_metrics[key]:>10.4f} {int8_metrics[key]:>10.4f} {deltas[key]:>+10.4f}")
+    print(f"{'complaints/sec':<20} {fp32_metrics['complaints_per_sec']:>10.1f} {int8_metrics['complaints_per_sec']:>10.1f} "
+          f"{int8_metrics['complaints_per_sec'] / fp32_metrics['complaints_per_sec']:>9.2f}x")
+    print(f"{'weights (MB)':<20} {fp32_mb:>10.0f} {int8_mb:>10.0f} {int8_mb / fp32_mb:>9.2f}x")
+    for head in ["urgency", "emotion"]:
+        print(f"Label agreement ({head}): {agreement[head]:.2%}")
+
+    # ── Save ─────────────────────────────────────────────────────────────────
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    summary = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "model_dir": args.model_dir,
+        "test_set_size": len(texts),
+        "threads": torch.get_num_threads(),
+        "weights_mb": {"fp32": round(fp32_mb, 1), "int8": round(int8_mb, 1)},
+        "fp32": fp32_metrics,
+        "int8": int8_metrics,
+        "int8_minus_fp32": deltas,
+        "label_agreement": agreement,
+        "labels": LABEL_NAMES,
+    }
+    json_path = os.path.join(RESULTS_DIR, f"quantization_{timestamp}.json")
+    with open(json_path, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"\nQuantization report saved to '{json_path}'")
+
+
+if __name__ == "__main__":
+    main()
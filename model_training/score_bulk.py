@@ -0,0 +1,231 @@
+"""Stream-score a large complaint export with the fine-tuned DeBERTa model.
+
+Reads a CSV or JSONL file in chunks, scores each chunk through the
+length-bucketed inference engine and appends the predictions to the output
+file before reading the next chunk, so memory stays flat regardless of input
+size. Re-running with the same output file resumes by position: a partially
+written last line left by a killed run is trimmed, the rows already in the
+output are counted, and that many input rows are skipped (after checking that
+the last id written matches the input row at that position). Duplicate ids
+within a chunk are scored once; keep --chunk-size unchanged when resuming.
+
+Output columns (CSV) / keys (JSONL):
+  <id-col>, urgency_pred, emotion_pred,
+  urgency_prob_low/medium/high, emotion_prob_low/medium/high
+
+Usage:
+    python model_training/score_bulk.py --input exports/complaints.csv --output scored.csv
+    python model_training/score_bulk.py --input nightly.jsonl --output scored.jsonl --backend onnx
+    python model_training/score_bulk.py --input big.csv --output scored.csv --workers 8
+    python model_training/score_bulk.py --input emails.csv --output scored.csv --long-text sliding
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+import torch
+
+from inference import BATCH_SIZE, InferenceEngine, OnnxInferenceEngine
+from modeling import DEVICE, LABEL_NAMES, MODEL_DIR
+from scoring_pool import ScoringPool
+from token_cache import STRATEGIES
+
+# ── Config ───────────────────────────────────────────────────────────────────
+CHUNK_SIZE = 4096
+ID_COL     = "id"
+TEXT_COL   = "complaint_text"
+PROB_COLS  = [f"{head}_prob_{name.lower()}" for head in ["urgency", "emotion"] for name in LABEL_NAMES]
+
+
+def is_jsonl(path):
+    return path.lower().endswith((".jsonl", ".ndjson"))
+
+
+# ── Input ────────────────────────────────────────────────────────────────────
+def read_chunks(path, id_col, text_col, chunk_size):
+    """Yield DataFrames of at most ``chunk_size`` rows with ``id_col`` and ``text_col``."""
+    if not is_jsonl(path):
+        for chunk in pd.read_csv(path, usecols=[id_col, text_col], dtype={id_col: str}, chunksize=chunk_size):
+            yield chunk
+        return
+
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            rows.append({id_col: str(record[id_col]), text_col: record[text_col]})
+            if len(rows) >= chunk_size:
+                yield pd.DataFrame(rows)
+                rows = []
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+# ── Output / resume ──────────────────────────────────────────────────────────
+def trim_partial_line(path):
+    """Drop a trailing line without a newline — the remnant of an interrupted write."""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk back to the previous newline (files are appended chunk by chunk,
+        # so the partial tail is at most one chunk long)
+        pos = size - 1
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            nl = block.rfind(b"\n")
+            if nl != -1:
+                f.truncate(pos - step + nl + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+def resume_position(path, id_col):
+    """Return ``(rows already written to path, last id written)``; ``(0, None)`` if there are none."""
+    if not os.path.exists(path):
+        return 0, None
+    trim_partial_line(path)
+    count, last_id = 0, None
+    if is_jsonl(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    count  += 1
+                    last_id = line
+        if last_id is not None:
+            last_id = str(json.loads(last_id)[id_col])
+    elif os.path.getsize(path) > 0:
+        for chunk in pd.read_csv(path, usecols=[id_col], dtype={id_col: str}, chunksize=100_000):
+            if len(chunk):
+                count  += len(chunk)
+                last_id = chunk[id_col].iloc[-1]
+    return count, last_id
+
+
+def to_records(ids, out, id_col):
+    records = []
+    for i, row_id in enumerate(ids):
+        record = {id_col: row_id, "urgency_pred": out["urgency_pred"][i], "emotion_pred": out["emotion_pred"][i]}
+        for j, name in enumerate(LABEL_NAMES):
+            record[f"urgency_prob_{name.lower()}"] = round(float(out["urgency_probs"][i][j]), 4)
+        for j, name in enumerate(LABEL_NAMES):
+            record[f"emotion_prob_{name.lower()}"] = round(float(out["emotion_probs"][i][j]), 4)
+        records.append(record)
+    return records
+
+
+def append_records(path, records, id_col):
+    """Append one chunk of results and flush it to disk before returning."""
+    write_header = not is_jsonl(path) and (not os.path.exists(path) or os.path.getsize(path) == 0)
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        if is_jsonl(path):
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        else:
+            writer = csv.DictWriter(f, fieldnames=[id_col, "urgency_pred", "emotion_pred"] + PROB_COLS)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(records)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream-score a CSV/JSONL complaint export.")
+    parser.add_argument("--input", required=True, help="Input .csv or .jsonl file")
+    parser.add_argument("--output", required=True, help="Output .csv or .jsonl file (appended to; resumable)")
+    parser.add_argument("--id-col", default=ID_COL, help=f"Unique id column (default: {ID_COL})")
+    parser.add_argument("--text-col", default=TEXT_COL, help=f"Complaint text column (default: {TEXT_COL})")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help=f"Rows read, scored and written per chunk (default: {CHUNK_SIZE})")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"Complaints per forward pass (default: {BATCH_SIZE})")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Directory with the fine-tuned model")
+    parser.add_argument("--backend", choices=["torch", "int8", "onnx"], default="torch",
+                        help="Inference backend (default: torch)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="CPU worker processes sharing one copy of the weights (default: 1, torch/int8 only)")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Intra-op threads per worker (default: one per pinned core)")
+    parser.add_argument("--long-text", choices=STRATEGIES, default="truncate",
+                        help="How complaints longer than the model's max length are read (default: truncate)")
+    args = parser.parse_args()
+
+    if args.workers > 1 and args.backend == "onnx":
+        parser.error("--workers > 1 is only supported for the torch and int8 backends")
+
+    to_skip, last_id = resume_position(args.output, args.id_col)
+    if to_skip:
+        print(f"Resuming: {to_skip} rows already in '{args.output}' will be skipped.")
+
+    print(f"Loading {args.backend} model from '{args.model_dir}' ...")
+    if args.backend == "onnx":
+        engine = OnnxInferenceEngine.from_pretrained(args.model_dir, batch_size=args.batch_size,
+                                                     strategy=args.long_text)
+    else:
+        device = torch.device("cpu") if args.workers > 1 else DEVICE
+        engine = InferenceEngine.from_pretrained(args.model_dir, device, quantized=args.backend == "int8",
+                                                 batch_size=args.batch_size, strategy=args.long_text)
+    if args.workers > 1:
+        engine = ScoringPool(engine, args.workers, args.threads_per_worker)
+        print(f"Started {args.workers} workers on cores {engine.slices}")
+
+    start      = time.time()
+    scored     = 0
+    skipped    = 0
+    duplicates = 0
+    for chunk in read_chunks(args.input, args.id_col, args.text_col, args.chunk_size):
+        todo = chunk.drop_duplicates(subset=args.id_col)
+        duplicates += len(chunk) - len(todo)
+
+        # Skip the rows a previous run already wrote, checking we resume at the right place
+        if to_skip:
+            n = min(to_skip, len(todo))
+            if n == to_skip and todo[args.id_col].iloc[n - 1] != last_id:
+                sys.exit(f"Error: the last id in '{args.output}' ({last_id}) is not input row {skipped + n} "
+                         f"({todo[args.id_col].iloc[n - 1]}). Was it written from another input or --chunk-size?")
+            todo     = todo.iloc[n:]
+            to_skip -= n
+            skipped += n
+        if todo.empty:
+            continue
+
+        texts = todo[args.text_col].fillna("").astype(str).tolist()
+        out   = engine.predict(texts)
+        append_records(args.output, to_records(todo[args.id_col].tolist(), out, args.id_col), args.id_col)
+
+        scored += len(todo)
+        elapsed = time.time() - start
+        print(f"  {scored} scored, {skipped} skipped ({scored / elapsed:.1f} complaints/s)", flush=True)
+
+    if args.workers > 1:
+        engine.close()
+
+    if to_skip:
+        print(f"Warning: '{args.output}' has {to_skip} more rows than the input has left to match.")
+
+    elapsed = time.time() - start
+    print(f"\nDone: {scored} complaints scored, {skipped} skipped, {duplicates} duplicate ids dropped "
+          f"in {elapsed:.1f}s")
+    print(f"Results in '{args.output}'")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nInterrupted — re-run the same command to resume.")
+        sys.exit(130)
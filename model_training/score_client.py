@@ -0,0 +1,86 @@
+"""Local client for serve.py — smoke test and latency check.
+
+Sends complaints from the dataset to a running scoring server, one request
+per complaint from --concurrency threads, and reports p50/p95 latency and
+throughput. With --bulk the same complaints are sent in a single request.
+
+Usage:
+    python model_training/score_client.py
+    python model_training/score_client.py --n 500 --concurrency 16
+    python model_training/score_client.py --text "My broadband has been down for three days."
+"""
+
+import argparse
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# ── Config ───────────────────────────────────────────────────────────────────
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "telecoms_complaints.csv")
+URL      = "http://127.0.0.1:8000"
+
+
+def post_json(url, payload):
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def timed_score(url, text):
+    start = time.perf_counter()
+    result = post_json(f"{url}/score", {"text": text})
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send complaints to a running serve.py instance.")
+    parser.add_argument("--url", default=URL, help=f"Server base URL (default: {URL})")
+    parser.add_argument("--text", default=None, help="Score a single complaint and print the result")
+    parser.add_argument("--n", type=int, default=200, help="Complaints to send from the dataset (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel client threads (default: 8)")
+    parser.add_argument("--bulk", action="store_true", help="Send all complaints in one request")
+    args = parser.parse_args()
+
+    if args.text:
+        print(json.dumps(post_json(f"{args.url}/score", {"text": args.text}), indent=2))
+        return
+
+    texts = pd.read_csv(CSV_PATH)["complaint_text"].head(args.n).tolist()
+
+    if args.bulk:
+        start = time.perf_counter()
+        results = post_json(f"{args.url}/score", {"texts": texts})["results"]
+        elapsed = time.perf_counter() - start
+        print(f"Scored {len(results)} complaints in one request: {elapsed:.2f}s "
+              f"({len(results) / elapsed:.1f} complaints/s)")
+        return
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        timings = list(pool.map(lambda t: timed_score(args.url, t), texts))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array([secs for secs, _ in timings]) * 1000
+    print(f"Sent {len(texts)} requests with {args.concurrency} concurrent clients")
+    print(f"  p50 latency : {np.percentile(latencies_ms, 50):7.1f} ms")
+    print(f"  p95 latency : {np.percentile(latencies_ms, 95):7.1f} ms")
+    print(f"  throughput  : {len(texts) / elapsed:7.1f} complaints/s")
+    print(f"  example     : {json.dumps(timings[0][1])}")
+
+    with urllib.request.urlopen(f"{args.url}/metrics") as resp:
+        metrics = json.loads(resp.read())
+    print(f"  server      : {metrics['batches']} batches, fill ratio {metrics['fill_ratio']:.2f}, "
+          f"mean queue wait {metrics['mean_queue_wait_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
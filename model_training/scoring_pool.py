@@ -0,0 +1,127 @@
+"""Multi-process CPU scoring that shares one copy of the model weights.
+
+The model is loaded once in the parent, its parameters are moved to shared
+memory, and N worker processes are forked from it — so every worker maps the
+same weight pages instead of holding its own 700 MB copy. Each worker is
+pinned to its own slice of the available cores and runs with that many
+intra-op threads, which scales far better on 32–64 core boxes than one
+process using every core.
+
+The parent tokenizes and buckets texts (``InferenceEngine.encode`` /
+``batches``) and puts padded token batches on a shared work queue; workers
+only run forward passes and send back logits.
+
+Usage:
+    engine = InferenceEngine.from_pretrained(device=torch.device("cpu"))
+    with ScoringPool(engine, workers=8) as pool:
+        out = pool.predict(texts)     # same output as engine.predict
+"""
+
+import multiprocessing as mp
+import os
+import traceback
+
+import numpy as np
+import torch
+
+from inference import build_output
+from modeling import LABEL_NAMES
+
+
+def split_cores(workers, cores=None):
+    """Split the usable cores into ``workers`` contiguous, near-equal slices."""
+    cores = sorted(cores if cores is not None else os.sched_getaffinity(0))
+    if workers > len(cores):
+        raise ValueError(f"{workers} workers requested but only {len(cores)} cores available")
+    base, extra = divmod(len(cores), workers)
+    slices, start = [], 0
+    for w in range(workers):
+        size = base + (1 if w < extra else 0)
+        slices.append(cores[start: start + size])
+        start += size
+    return slices
+
+
+def _worker(engine, cores, threads, tasks, results):
+    """Worker loop: pin to ``cores``, then run forward passes until a None task arrives."""
+    os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        idx, features = task
+        try:
+            urg_logits, emo_logits = engine.forward(features)
+            results.put((idx, urg_logits, emo_logits, None))
+        except Exception:
+            results.put((idx, None, None, traceback.format_exc()))
+
+
+class ScoringPool:
+    """Fork ``workers`` processes sharing ``engine``'s weights; same ``predict`` API."""
+
+    def __init__(self, engine, workers, threads_per_worker=None, cores=None):
+        if engine.model is None:
+            raise ValueError("ScoringPool needs a PyTorch engine (torch or int8 backend)")
+        if engine.device.type != "cpu":
+            raise ValueError("ScoringPool is for CPU scoring; load the engine on torch.device('cpu')")
+
+        self.engine  = engine
+        self.slices  = split_cores(workers, cores)
+        self.threads = [threads_per_worker or len(s) for s in self.slices]
+
+        # Parameters and buffers go to shared memory so forked workers never
+        # copy them; int8 packed weights are not parameters and are shared
+        # copy-on-write instead (they are never written after load).
+        engine.model.share_memory()
+
+        ctx = mp.get_context("fork")
+        self.tasks   = ctx.Queue(maxsize=workers * 4)
+        self.results = ctx.Queue()
+        self.procs   = [
+            ctx.Process(target=_worker, args=(engine, cores_, threads, self.tasks, self.results), daemon=True)
+            for cores_, threads in zip(self.slices, self.threads)
+        ]
+        for p in self.procs:
+            p.start()
+
+    def predict(self, texts):
+        """Score ``texts`` across the pool; output matches ``InferenceEngine.predict``."""
+        texts = list(texts)
+        n = len(texts)
+        input_ids, owners = self.engine.windows(self.engine.encode(texts)) if n else ([], None)
+        urg_logits = np.zeros((len(input_ids), len(LABEL_NAMES)), dtype=np.float32)
+        emo_logits = np.zeros((len(input_ids), len(LABEL_NAMES)), dtype=np.float32)
+
+        # The task queue is bounded, so put() blocks while workers catch up;
+        # results go to an unbounded queue and are drained below.
+        pending = 0
+        for idx, features in self.engine.batches(input_ids):
+            self.tasks.put((idx, features))
+            pending += 1
+
+        # Drain every result even after a failure so the next call starts clean
+        error = None
+        for _ in range(pending):
+            idx, urg, emo, err = self.results.get()
+            if err is not None:
+                error = error or err
+            else:
+                urg_logits[idx], emo_logits[idx] = urg, emo
+        if error is not None:
+            raise RuntimeError(f"Scoring worker failed:\n{error}")
+
+        return build_output(*self.engine.pool(urg_logits, emo_logits, owners, n))
+
+    def close(self):
+        for _ in self.procs:
+            self.tasks.put(None)
+        for p in self.procs:
+            p.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,202 @@
+"""Long-running HTTP scoring service for urgency/emotion triage.
+
+Loads the tokenizer and DeBERTaMultiHead once at start-up and keeps them in
+memory. Concurrent requests are coalesced by the asyncio scheduler in
+batcher.py for up to --max-wait-ms (or until --max-batch complaints are
+pending) and scored in a single length-bucketed forward pass.
+
+Endpoints:
+  GET  /health  — {"status": "ok", "backend": ...}
+  GET  /metrics — batch fill ratio, queue wait and forward-pass counters,
+                  plus prediction cache hits/misses/evictions
+  POST /score   — {"text": "..."}            -> one result
+                  {"texts": ["...", "..."]}  -> {"results": [...]}
+
+Each result: {"urgency": "High", "emotion": "Low",
+              "urgency_probs": {"Low": .., "Medium": .., "High": ..},
+              "emotion_probs": {...}}
+
+Usage:
+    python model_training/serve.py --port 8000
+    python model_training/serve.py --backend onnx --max-batch 64 --max-wait-ms 10
+    python model_training/serve.py --long-text sliding
+    python model_training/score_client.py --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batcher import MAX_BATCH, MAX_WAIT_MS, MicroBatchScheduler
+from inference import ONNX_FILE, InferenceEngine, OnnxInferenceEngine
+from modeling import DEVICE, LABEL_NAMES, MODEL_DIR, cache_variant, weights_path
+from prediction_cache import MAX_ENTRIES, PredictionCache
+from token_cache import STRATEGIES
+
+# ── Config ───────────────────────────────────────────────────────────────────
+HOST          = "127.0.0.1"
+PORT          = 8000
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+def load_engine(backend, model_dir=MODEL_DIR, strategy="truncate"):
+    """Build the inference engine for ``backend`` (torch, int8 or onnx)."""
+    if backend == "onnx":
+        return OnnxInferenceEngine.from_pretrained(model_dir, strategy=strategy)
+    return InferenceEngine.from_pretrained(model_dir, DEVICE, quantized=backend == "int8", strategy=strategy)
+
+
+def backend_weights(backend, model_dir=MODEL_DIR):
+    """The file whose hash keys the prediction cache for ``backend``."""
+    if backend == "onnx":
+        return os.path.join(model_dir, ONNX_FILE)
+    return weights_path(model_dir, quantized=backend == "int8")
+
+
+def format_results(out):
+    """Turn an ``InferenceEngine.predict`` output into one JSON-ready dict per text."""
+    return [
+        {
+            "urgency": out["urgency_pred"][i],
+            "emotion": out["emotion_pred"][i],
+            "urgency_probs": {name: round(float(p), 4) for name, p in zip(LABEL_NAMES, out["urgency_probs"][i])},
+            "emotion_probs": {name: round(float(p), 4) for name, p in zip(LABEL_NAMES, out["emotion_probs"][i])},
+        }
+        for i in range(len(out["urgency_pred"]))
+    ]
+
+
+# ── Scheduler thread ─────────────────────────────────────────────────────────
+class SchedulerThread:
+    """Run a ``MicroBatchScheduler`` on its own event loop for the HTTP threads.
+
+    ``ThreadingHTTPServer`` handles each request on a separate thread; those
+    threads hand their texts to the scheduler's loop and block until the
+    results come back.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.loop      = asyncio.new_event_loop()
+        self.thread    = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(scheduler.start(), self.loop).result()
+
+    def score(self, texts):
+        return asyncio.run_coroutine_threadsafe(self.scheduler.submit_many(texts), self.loop).result()
+
+    def stats(self):
+        return self.scheduler.stats()
+
+
+# ── HTTP ─────────────────────────────────────────────────────────────────────
+class ScoringHandler(BaseHTTPRequestHandler):
+    scheduler = None   # set in main()
+    backend   = None
+    cache     = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "backend": self.backend})
+        elif self.path == "/metrics":
+            metrics = self.scheduler.stats()
+            if self.cache is not None:
+                metrics["prediction_cache"] = self.cache.stats()
+            self._send_json(200, metrics)
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_SIZE:
+            self._send_json(413, {"error": "request body too large"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "body is not valid JSON"})
+            return
+
+        if not isinstance(payload, dict):
+            payload = {}   # a JSON array/string/number is rejected below like a missing field
+        single = "text" in payload
+        texts  = [payload["text"]] if single else payload.get("texts")
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            self._send_json(400, {"error": 'expected {"text": str} or {"texts": [str, ...]}'})
+            return
+
+        try:
+            results = self.scheduler.score(texts)
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send_json(200, results[0] if single else {"results": results})
+
+    def log_message(self, format, *args):
+        pass   # per-request access logs would dominate stdout under load
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve urgency/emotion predictions over HTTP.")
+    parser.add_argument("--host", default=HOST, help=f"Bind address (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port (default: {PORT})")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Directory with the fine-tuned model")
+    parser.add_argument("--backend", choices=["torch", "int8", "onnx"], default="torch",
+                        help="Inference backend (default: torch)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                        help=f"Max complaints per forward pass (default: {MAX_BATCH})")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help=f"Max time to wait for a batch to fill (default: {MAX_WAIT_MS})")
+    parser.add_argument("--cache-size", type=int, default=MAX_ENTRIES,
+                        help=f"Complaints kept in the in-memory prediction cache, 0 disables it (default: {MAX_ENTRIES})")
+    parser.add_argument("--cache-db", default=None,
+                        help="SQLite file backing the prediction cache across restarts (default: memory only)")
+    parser.add_argument("--long-text", choices=STRATEGIES, default="truncate",
+                        help="How complaints longer than the model's max length are read (default: truncate)")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache_size > 0:
+        cache = PredictionCache(backend_weights(args.backend, args.model_dir), args.cache_db, args.cache_size,
+                                variant=cache_variant(args.model_dir, args.long_text))
+
+    print(f"Loading {args.backend} model from '{args.model_dir}' ...")
+    engine = load_engine(args.backend, args.model_dir, args.long_text)
+    engine.predict(["warm-up"])        # first call pays one-off allocation costs
+    engine.prediction_cache = cache    # attached after warm-up so it is not counted
+
+    scheduler = MicroBatchScheduler(
+        engine, args.max_batch, args.max_wait_ms / 1000,
+        postprocess=format_results,
+    )
+    ScoringHandler.scheduler = SchedulerThread(scheduler)
+    ScoringHandler.backend   = args.backend
+    ScoringHandler.cache     = cache
+    server = ThreadingHTTPServer((args.host, args.port), ScoringHandler)
+    print(f"Serving on http://{args.host}:{args.port} "
+          f"(max batch {args.max_batch}, max wait {args.max_wait_ms:g} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
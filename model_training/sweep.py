@@ -0,0 +1,242 @@
+"""Hyperparameter sweep over train_deberta.py with parallel trials and pruning.
+
+Samples trial configurations from a search space (lr, batch size, max
+length, urgency class weights, patience) and runs up to --workers trials at
+once, each as its own train_deberta.py process limited to an equal share of
+the CPU threads. Trials share the on-disk token cache, which is filled for
+every max length in the space before the first trial starts.
+
+Pruning is median-stopping: after every epoch each trial reports its val
+combined F1. From --warmup-epochs on, a running trial whose best F1 so far
+is below the median best-so-far of all trials that reached the same epoch
+(once at least --min-trials have) is told to stop. It then finishes like an
+early-stopped run, scoring the test set with its best epoch.
+
+Every trial writes the usual logs/run_<id>.json and a logs/summary.csv row
+(run id ``sweep_<sweep>_tNN``, hyperparameters in ``notes``). The sweep's
+own table is saved to sweeps/<sweep>/sweep.json, and only the best trial's
+weights are kept unless --keep-all is given.
+
+Search space JSON (--space): each key maps to a list of choices or to
+{"log_uniform": [low, high]}, e.g.
+    {"lr": {"log_uniform": [1e-5, 5e-5]}, "batch_size": [8, 16],
+     "urgency_weights": ["1.0,1.5,1.2", "1.0,2.0,1.2"]}
+
+Usage:
+    python model_training/sweep.py --trials 12 --workers 3
+    python model_training/sweep.py --space my_space.json --trials 20 --workers 4 --epochs 6
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from data_utils import load_splits
+from token_cache import TokenCache
+
+# ── Config ───────────────────────────────────────────────────────────────────
+HERE         = os.path.dirname(os.path.abspath(__file__))
+TRAIN_SCRIPT = os.path.join(HERE, "train_deberta.py")
+SWEEPS_DIR   = os.path.join(HERE, "sweeps")
+MODEL_NAME   = "microsoft/deberta-v3-base"
+POLL_SECONDS = 2.0
+
+SEARCH_SPACE = {
+    "lr":              {"log_uniform": [1e-5, 5e-5]},
+    "batch_size":      [8, 16, 32],
+    "max_length":      [128, 192, 256],
+    "urgency_weights": ["1.0,1.5,1.2", "1.0,2.0,1.2", "1.0,1.0,1.0"],
+    "patience":        [2, 3],
+}
+
+
+def sample(space, rng):
+    params = {}
+    for name, choices in space.items():
+        if isinstance(choices, dict):
+            low, high = choices["log_uniform"]
+            params[name] = float(f"{math.exp(rng.uniform(math.log(low), math.log(high))):.3g}")
+        else:
+            params[name] = rng.choice(choices)
+    return params
+
+
+def describe(params):
+    return ", ".join(f"{k}={v}" for k, v in params.items())
+
+
+# ── Trials ───────────────────────────────────────────────────────────────────
+class Trial:
+    """One train_deberta.py subprocess and the val F1 history it has reported."""
+
+    def __init__(self, sweep_id, number, params, sweep_dir):
+        self.number   = number
+        self.params   = params
+        self.run_id   = f"sweep_{sweep_id}_t{number:02d}"
+        self.dir      = os.path.join(sweep_dir, f"t{number:02d}")
+        self.progress = os.path.join(self.dir, "progress.jsonl")
+        self.prune    = os.path.join(self.dir, "PRUNE")
+        self.history  = []      # val combined F1 per finished epoch
+        self.status   = "pending"
+        self.proc     = None
+        self.log      = None
+
+    def start(self, extra_args, threads):
+        os.makedirs(self.dir, exist_ok=True)
+        cmd = [sys.executable, TRAIN_SCRIPT,
+               "--output-dir", self.dir, "--run-id", self.run_id,
+               "--notes", f"{self.run_id}: {describe(self.params)}",
+               "--progress-file", self.progress, "--prune-file", self.prune]
+        for name, value in self.params.items():
+            cmd += [f"--{name.replace('_', '-')}", str(value)]
+        cmd += extra_args
+        env = {**os.environ, "OMP_NUM_THREADS": str(threads), "MKL_NUM_THREADS": str(threads)}
+        self.log    = open(os.path.join(self.dir, "train.log"), "w")
+        self.proc   = subprocess.Popen(cmd, stdout=self.log, stderr=subprocess.STDOUT, env=env)
+        self.status = "running"
+
+    def poll(self):
+        """Pick up newly reported epochs; returns True once the process has exited."""
+        if os.path.exists(self.progress):
+            with open(self.progress) as f:
+                lines = [line for line in f if line.endswith("\n")]
+            self.history = [json.loads(line)["val_combined_f1"] for line in lines]
+        code = self.proc.poll()
+        if code is None:
+            return False
+        self.log.close()
+        if code != 0:
+            self.status = "failed"
+        elif os.path.exists(self.prune):
+            self.status = "pruned"
+        else:
+            self.status = "done"
+        # Checkpoints are only useful while the trial can still be resumed
+        ckpt = os.path.join(self.dir, "checkpoint.pt")
+        if os.path.exists(ckpt):
+            os.remove(ckpt)
+        return True
+
+    def best_at(self, epoch):
+        return max(self.history[:epoch])
+
+    @property
+    def best(self):
+        return max(self.history) if self.history else float("nan")
+
+
+def prune_behind_median(trials, min_trials, warmup_epochs):
+    """Ask running trials whose best-so-far val F1 is below the epoch median to stop."""
+    for trial in trials:
+        epoch = len(trial.history)
+        if trial.status != "running" or epoch < warmup_epochs or os.path.exists(trial.prune):
+            continue
+        peers = [t.best_at(epoch) for t in trials if len(t.history) >= epoch]
+        if len(peers) < min_trials:
+            continue
+        median = float(np.median(peers))
+        if trial.best_at(epoch) < median:
+            open(trial.prune, "w").close()
+            print(f"  t{trial.number:02d} pruned after epoch {epoch}: "
+                  f"best {trial.best_at(epoch):.4f} < median {median:.4f}", flush=True)
+
+
+def warm_token_cache(space):
+    """Tokenize every split once per max length so parallel trials only read the cache."""
+    lengths = space.get("max_length", [192])
+    if isinstance(lengths, dict):
+        return
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    texts = [t for frame in load_splits() for t in frame["complaint_text"]]
+    for max_length in sorted(set(lengths)):
+        cache = TokenCache(tokenizer, max_length)
+        cache.encode(texts)
+        print(f"  Token cache for max_length={max_length}: {cache.misses} newly tokenized, {cache.hits} cached")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a parallel, pruned hyperparameter sweep of train_deberta.py.")
+    parser.add_argument("--space", default=None, help="Search space JSON file (default: built-in SEARCH_SPACE)")
+    parser.add_argument("--trials", type=int, default=12, help="Number of sampled trials (default: 12)")
+    parser.add_argument("--workers", type=int, default=2, help="Trials run at once (default: 2)")
+    parser.add_argument("--threads-per-trial", type=int, default=None,
+                        help="Torch threads per trial (default: available cores / workers)")
+    parser.add_argument("--min-trials", type=int, default=3,
+                        help="Trials that must reach an epoch before pruning compares at it (default: 3)")
+    parser.add_argument("--warmup-epochs", type=int, default=1,
+                        help="Never prune before this many epochs (default: 1)")
+    parser.add_argument("--epochs", type=int, default=None, help="Max epochs per trial (default: train_deberta's)")
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed (default: 0)")
+    parser.add_argument("--keep-all", action="store_true", help="Keep every trial's weights, not just the best")
+    args = parser.parse_args()
+
+    space = SEARCH_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    rng       = random.Random(args.seed)
+    sweep_id  = datetime.now().strftime("%Y%m%d_%H%M%S")
+    sweep_dir = os.path.join(SWEEPS_DIR, sweep_id)
+    trials    = [Trial(sweep_id, n + 1, sample(space, rng), sweep_dir) for n in range(args.trials)]
+    threads   = args.threads_per_trial or max(1, len(os.sched_getaffinity(0)) // args.workers)
+    extra     = ["--epochs", str(args.epochs)] if args.epochs else []
+
+    print(f"Sweep {sweep_id}: {args.trials} trials, {args.workers} at a time, {threads} threads each")
+    warm_token_cache(space)
+
+    start   = time.time()
+    pending = list(trials)
+    running = []
+    while pending or running:
+        while pending and len(running) < args.workers:
+            trial = pending.pop(0)
+            trial.start(extra, threads)
+            running.append(trial)
+            print(f"  t{trial.number:02d} started: {describe(trial.params)}", flush=True)
+
+        time.sleep(POLL_SECONDS)
+        for trial in list(running):
+            if trial.poll():
+                running.remove(trial)
+                print(f"  t{trial.number:02d} {trial.status} after {len(trial.history)} epochs, "
+                      f"best val combined F1 {trial.best:.4f}", flush=True)
+        prune_behind_median(trials, args.min_trials, args.warmup_epochs)
+
+    ranked = sorted((t for t in trials if t.history), key=lambda t: -t.best)
+    print(f"\nSweep finished in {(time.time() - start) / 60:.1f} min\n")
+    print(f"{'trial':6s} {'status':7s} {'epochs':>6s} {'best val F1':>11s}  params")
+    for t in ranked + [t for t in trials if not t.history]:
+        print(f"t{t.number:02d}    {t.status:7s} {len(t.history):6d} {t.best:11.4f}  {describe(t.params)}")
+
+    if ranked and not args.keep_all:
+        for t in ranked[1:]:
+            weights = os.path.join(t.dir, "model_weights.pt")
+            if os.path.exists(weights):
+                os.remove(weights)
+
+    with open(os.path.join(sweep_dir, "sweep.json"), "w") as f:
+        json.dump({
+            "sweep_id": sweep_id,
+            "space":    space,
+            "settings": {k: v for k, v in vars(args).items() if k != "space"},
+            "best":     ranked[0].run_id if ranked else None,
+            "trials":   [{"trial": t.number, "run_id": t.run_id, "status": t.status, "params": t.params,
+                          "val_combined_f1": t.history, "best_val_combined_f1": t.best if t.history else None}
+                         for t in trials],
+        }, f, indent=2)
+    if ranked:
+        print(f"\nBest: t{ranked[0].number:02d} ({ranked[0].dir}); run logs under logs/run_sweep_{sweep_id}_*.json")
+    print(f"Sweep summary saved to '{os.path.join(sweep_dir, 'sweep.json')}'")
+
+
+if __name__ == "__main__":
+    main()
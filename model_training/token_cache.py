@@ -0,0 +1,212 @@
+"""Persistent on-disk tokenization cache shared by every DeBERTa script.
+
+Token ids are stored per (tokenizer fingerprint, max_length) in a directory
+of append-only shards. Each shard is three plain .npy files that are opened
+memory-mapped:
+
+  <shard>.ids.npy      int32, all token ids of the shard concatenated
+  <shard>.offsets.npy  int64, row i spans ids[offsets[i]:offsets[i + 1]]
+  <shard>.keys.npy     uint8 (rows, 16), blake2b digest of each text
+
+so a row's attention length is ``offsets[i + 1] - offsets[i]``. Texts
+missing from the cache are tokenized in one call and written as a new shard;
+the keys file is renamed into place last, so a shard only becomes visible
+once it is complete and concurrent writers never clobber each other.
+
+Long-running callers such as serve.py write a tiny shard for almost every
+batch. Once more than ``MAX_SMALL_SHARDS`` shards of under
+``SMALL_SHARD_ROWS`` rows exist, they are merged into one and the originals
+deleted (keys file first), so the shard count and the number of open
+memory maps stay bounded. Processes that still map a deleted shard keep
+reading it; they pick up the merged shard on their next miss.
+
+Complaints longer than ``max_length`` tokens are handled by one of three
+strategies, each cached in its own directory:
+
+  truncate   keep the first max_length tokens (default)
+  head_tail  keep the first quarter of the budget and fill the rest from
+             the end, where escalation threats tend to sit
+  sliding    keep the whole complaint (up to SLIDING_MAX_TOKENS); the
+             inference engine scores it as overlapping windows
+
+Texts that fit get identical ids under every strategy.
+
+Usage:
+    cache = TokenCache(tokenizer, max_length=192)
+    ids   = cache.encode(texts)       # list of int32 arrays, one per text
+"""
+
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+# ── Config ───────────────────────────────────────────────────────────────────
+CACHE_DIR          = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "tokens")
+STRATEGIES         = ["truncate", "head_tail", "sliding"]
+SLIDING_MAX_TOKENS = 4096   # bounds the windows scored for pathological inputs
+SMALL_SHARD_ROWS   = 4096   # shards with fewer rows are merged by compaction
+MAX_SMALL_SHARDS   = 32     # small shards tolerated before they are merged into one
+
+
+def text_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def tokenizer_fingerprint(tokenizer):
+    """Short hash identifying the tokenizer's vocabulary and normalisation rules."""
+    h = hashlib.sha1(type(tokenizer).__name__.encode())
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        # Calling the tokenizer records its last truncation/padding settings in
+        # the backend; they do not change the ids we cache, so leave them out
+        spec = json.loads(backend.to_str())
+        spec.pop("truncation", None)
+        spec.pop("padding", None)
+        h.update(json.dumps(spec, sort_keys=True).encode("utf-8"))
+    else:
+        h.update(repr(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+    h.update(repr(sorted(tokenizer.all_special_tokens)).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def tokenize(tokenizer, texts, max_length, strategy="truncate"):
+    """Unpadded token ids for ``texts`` with long ones cut down by ``strategy``.
+
+    Assumes the single-sequence template ``[CLS] tokens [SEP]`` that the
+    DeBERTa and BERT tokenizers use; both special tokens are always kept.
+    """
+    if strategy == "truncate":
+        return tokenizer(texts, max_length=max_length, truncation=True, padding=False)["input_ids"]
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown long-text strategy {strategy!r}; expected one of {STRATEGIES}")
+
+    full  = tokenizer(texts, padding=False, verbose=False)["input_ids"]
+    limit = SLIDING_MAX_TOKENS if strategy == "sliding" else max_length
+    head  = (limit - 2) // 4
+    return [
+        ids if len(ids) <= limit
+        else ids[: limit - 1] + ids[-1:] if strategy == "sliding"
+        else ids[: 1 + head] + ids[len(ids) - (limit - 1 - head):]
+        for ids in full
+    ]
+
+
+class TokenCache:
+    """Memory-mapped cache of unpadded token ids keyed by text hash."""
+
+    def __init__(self, tokenizer, max_length, cache_dir=CACHE_DIR, strategy="truncate"):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.strategy = strategy
+        # Keyed on the tokenizer's content, not its path, so the base
+        # checkpoint and the copy saved next to the fine-tuned model share rows
+        suffix   = "" if strategy == "truncate" else f"-{strategy}"
+        self.dir = os.path.join(cache_dir, f"{tokenizer_fingerprint(tokenizer)}-len{max_length}{suffix}")
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.shards = {}   # shard name -> (ids, offsets) memmaps, keys
+        self.index  = {}   # text digest -> (shard name, row)
+        self.hits   = 0
+        self.misses = 0
+        self._load_new_shards()
+
+    # ── Shards ───────────────────────────────────────────────────────────────
+    def _load_new_shards(self):
+        for keys_path in sorted(glob.glob(os.path.join(self.dir, "*.keys.npy"))):
+            shard = os.path.basename(keys_path)[: -len(".keys.npy")]
+            if shard in self.shards:
+                continue
+            base = os.path.join(self.dir, shard)
+            try:
+                keys    = np.load(keys_path)
+                ids     = np.load(f"{base}.ids.npy", mmap_mode="r")
+                offsets = np.load(f"{base}.offsets.npy", mmap_mode="r")
+            except FileNotFoundError:
+                continue   # merged away by another process's compaction since the glob
+            self.shards[shard] = (ids, offsets, keys)
+            for row, key in enumerate(keys):
+                self.index.setdefault(key.tobytes(), (shard, row))
+
+    def _save_shard(self, keys, token_ids):
+        shard   = f"{time.time_ns()}-{os.getpid()}"
+        base    = os.path.join(self.dir, shard)
+        lengths = np.array([len(ids) for ids in token_ids], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        flat    = np.concatenate([np.asarray(ids, dtype=np.int32) for ids in token_ids])
+        key_arr = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), 16)
+
+        for suffix, arr in [("ids", flat), ("offsets", offsets), ("keys", key_arr)]:
+            tmp = f"{base}.{suffix}.tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, f"{base}.{suffix}.npy")
+
+    def _write_shard(self, keys, token_ids):
+        self._save_shard(keys, token_ids)
+        self._load_new_shards()
+        self._compact()
+
+    def _compact(self):
+        """Merge the small shards into one once there are more than MAX_SMALL_SHARDS of them."""
+        small = [shard for shard, (_, _, keys) in self.shards.items() if len(keys) < SMALL_SHARD_ROWS]
+        if len(small) <= MAX_SMALL_SHARDS:
+            return
+        keys, token_ids, seen = [], [], set()
+        for shard in small:
+            ids, offsets, shard_keys = self.shards[shard]
+            for row, key in enumerate(shard_keys):
+                key = key.tobytes()
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+                    token_ids.append(ids[offsets[row]: offsets[row + 1]])
+        self._save_shard(keys, token_ids)
+
+        merged = set(small)
+        for shard in small:
+            del self.shards[shard]
+            # Keys file first, so other processes stop seeing the shard before its data goes
+            for suffix in ("keys", "ids", "offsets"):
+                try:
+                    os.remove(os.path.join(self.dir, f"{shard}.{suffix}.npy"))
+                except OSError:
+                    pass   # already merged by another process (or still mapped, on Windows)
+        self.index = {key: loc for key, loc in self.index.items() if loc[0] not in merged}
+        self._load_new_shards()
+
+    def _lookup(self, key):
+        shard, row = self.index[key]
+        ids, offsets, _ = self.shards[shard]
+        return ids[offsets[row]: offsets[row + 1]]
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    def tokenize(self, texts):
+        """Tokenize without padding, shortening long texts by the cache's strategy."""
+        return tokenize(self.tokenizer, texts, self.max_length, self.strategy)
+
+    def encode(self, texts):
+        """Return unpadded token ids (int32 arrays) for ``texts``, tokenizing only misses."""
+        texts = list(texts)
+        keys  = [text_key(t) for t in texts]
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.index and key not in missing:
+                missing[key] = text
+        if missing:
+            # Another process may have written the rows since we last looked
+            self._load_new_shards()
+            missing = {k: t for k, t in missing.items() if k not in self.index}
+        if missing:
+            self._write_shard(list(missing), self.tokenize(list(missing.values())))
+
+        self.misses += len(missing)
+        self.hits   += len(texts) - len(missing)
+        return [self._lookup(key) for key in keys]
+
+    def lengths(self, texts):
+        """Attention lengths (unpadded token counts) for ``texts``."""
+        return [len(ids) for ids in self.encode(texts)]
@@ -1,8 +1,13 @@
 import os
+import argparse
 import csv
 import json
+import math
+import random
 import subprocess
 import sys
+import time
+from contextlib import nullcontext
 from datetime import datetime
 
 def install(pkg):
@@ -17,13 +22,19 @@ for pkg in ["transformers", "torch", "pandas", "scikit-learn", "sentencepiece",
 import pandas as pd
 import numpy as np
 import torch
+import torch.distributed as dist
 import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import Dataset, DataLoader
-from transformers import AutoTokenizer, AutoModel, get_linear_schedule_with_warmup
-from sklearn.model_selection import train_test_split
+from transformers import AutoTokenizer, get_linear_schedule_with_warmup
 from sklearn.metrics import f1_score, confusion_matrix
 from tqdm import tqdm
 
+from checkpointing import load_checkpoint, rng_state, save_checkpoint, set_rng_state
+from data_utils import ComplaintDataset, LengthBucketSampler, load_splits, pad_collate
+from modeling import DeBERTaMultiHead, freeze_lower, layerwise_param_groups
+from token_cache import TokenCache
+
 # ── Config ──────────────────────────────────────────────────────────────────
 CSV_PATH      = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "telecoms_complaints.csv")
 MODEL_NAME    = "microsoft/deberta-v3-base"
@@ -33,107 +44,188 @@ BATCH_SIZE    = 16
 LR            = 2e-5
 EPOCHS        = 10
 PATIENCE      = 3
-LABEL_MAP     = {"Low": 0, "Medium": 1, "High": 2}
+SEED          = 42
+URGENCY_WEIGHTS = [1.0, 1.5, 1.2]   # Low, Medium, High — see the loss section below
 LABEL_NAMES   = ["Low", "Medium", "High"]
 DEVICE        = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-print(f"Using device: {DEVICE}")
+LOGS_DIR      = "logs"
+
+parser = argparse.ArgumentParser(description="Fine-tune DeBERTa-v3 on urgency and emotion.")
+parser.add_argument("--resume", action="store_true",
+                    help="Continue from --checkpoint instead of starting a new run")
+parser.add_argument("--checkpoint", default=None,
+                    help="Checkpoint written after every epoch (default: <output-dir>/checkpoint.pt)")
+parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                    help=f"Complaints per forward/backward pass (default: {BATCH_SIZE})")
+parser.add_argument("--grad-accum", type=int, default=1,
+                    help="Micro-batches accumulated per optimizer step (default: 1)")
+# Hyperparameter overrides (used by sweep.py; defaults are the constants above)
+parser.add_argument("--lr", type=float, default=LR, help=f"Peak learning rate (default: {LR})")
+parser.add_argument("--epochs", type=int, default=EPOCHS, help=f"Max epochs (default: {EPOCHS})")
+parser.add_argument("--patience", type=int, default=PATIENCE, help=f"Early-stopping patience (default: {PATIENCE})")
+parser.add_argument("--max-length", type=int, default=MAX_LENGTH, help=f"Max tokens (default: {MAX_LENGTH})")
+parser.add_argument("--urgency-weights", default=",".join(map(str, URGENCY_WEIGHTS)),
+                    help="Urgency class weights Low,Medium,High (default: %(default)s)")
+parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where the model is saved (default: model_output/)")
+parser.add_argument("--notes", default="", help="Free-text notes stored in the run log")
+parser.add_argument("--run-id", default=None, help="Run log id (default: start timestamp)")
+parser.add_argument("--freeze-embeddings", action="store_true", help="Do not train the embedding layer")
+parser.add_argument("--freeze-layers", type=int, default=0,
+                    help="Also freeze the first K encoder layers (implies --freeze-embeddings; default: 0)")
+parser.add_argument("--layer-decay", type=float, default=1.0,
+                    help="Layer-wise LR decay: each layer below the top trains at this factor "
+                         "of the one above (default: 1.0, off)")
+parser.add_argument("--long-text", choices=["truncate", "head_tail"], default="truncate",
+                    help="How complaints longer than MAX_LENGTH tokens are cut for training: keep the "
+                         "first tokens or the opening plus the ending (default: truncate)")
+# Sweep hooks: per-epoch val metrics are appended to --progress-file, and the
+# run stops after the current epoch once --prune-file exists
+parser.add_argument("--progress-file", default=None, help=argparse.SUPPRESS)
+parser.add_argument("--prune-file", default=None, help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+LR              = args.lr
+EPOCHS          = args.epochs
+PATIENCE        = args.patience
+MAX_LENGTH      = args.max_length
+URGENCY_WEIGHTS = [float(w) for w in args.urgency_weights.split(",")]
+OUTPUT_DIR      = args.output_dir
+CHECKPOINT      = args.checkpoint or os.path.join(OUTPUT_DIR, "checkpoint.pt")
+RUN_ID          = args.run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+
+# ── Distributed ──────────────────────────────────────────────────────────────
+# Under torchrun (WORLD_SIZE > 1) each process trains on its own shard of the
+# training batches, gradients are all-reduced (gloo on CPU), validation
+# predictions are gathered from every rank before F1 is computed, and only
+# rank 0 writes checkpoints, weights and logs.
+WORLD_SIZE  = int(os.environ.get("WORLD_SIZE", 1))
+RANK        = int(os.environ.get("RANK", 0))
+DISTRIBUTED = WORLD_SIZE > 1
+if DISTRIBUTED:
+    if DEVICE.type == "cuda":
+        DEVICE = torch.device("cuda", int(os.environ.get("LOCAL_RANK", 0)))
+        torch.cuda.set_device(DEVICE)
+    dist.init_process_group("nccl" if DEVICE.type == "cuda" else "gloo")
+    if RANK != 0:
+        sys.stdout = open(os.devnull, "w")   # keep a single copy of the progress output
+
+BATCH_SIZE           = args.batch_size
+GRAD_ACCUM           = args.grad_accum
+EFFECTIVE_BATCH_SIZE = BATCH_SIZE * GRAD_ACCUM * WORLD_SIZE
+
+print(f"Using device: {DEVICE}" + (f" ({WORLD_SIZE} processes)" if DISTRIBUTED else ""))
+
+# Seeded so head init and dropout are reproducible (and resumable run-to-run);
+# ranks get distinct dropout streams, DDP broadcasts rank 0's initial weights
+random.seed(SEED + RANK)
+np.random.seed(SEED + RANK)
+torch.manual_seed(SEED + RANK)
+
+
+def all_gather(obj):
+    """Return ``[obj from rank 0, obj from rank 1, ...]`` (just ``[obj]`` when not distributed)."""
+    if not DISTRIBUTED:
+        return [obj]
+    gathered = [None] * WORLD_SIZE
+    dist.all_gather_object(gathered, obj)
+    return gathered
 
 # ── Data ─────────────────────────────────────────────────────────────────────
-df = pd.read_csv(CSV_PATH)
-df["urgency_label"]  = df["intended_urgency"].map(LABEL_MAP)
-df["emotion_label"]  = df["intended_emotion"].map(LABEL_MAP)
-
-# Stratify on combined label key
-df["strat_key"] = df["urgency_label"].astype(str) + "_" + df["emotion_label"].astype(str)
-
-train_df, temp_df = train_test_split(df, test_size=0.30, stratify=df["strat_key"], random_state=42)
-val_df,   test_df = train_test_split(temp_df, test_size=0.50, stratify=temp_df["strat_key"], random_state=42)
+train_df, val_df, test_df = load_splits(CSV_PATH)   # 70/15/15, stratified on urgency x emotion
 
 print(f"Train: {len(train_df)} | Val: {len(val_df)} | Test: {len(test_df)}")
 
 # ── Tokeniser ────────────────────────────────────────────────────────────────
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+tokenizer   = AutoTokenizer.from_pretrained(MODEL_NAME)
+token_cache = TokenCache(tokenizer, MAX_LENGTH, strategy=args.long_text)   # ids persist on disk across runs
 
 # ── Dataset ──────────────────────────────────────────────────────────────────
 def tokenize_df(dataframe):
-    """Pre-tokenize an entire dataframe once and return a ready Dataset."""
+    """Pre-tokenize an entire dataframe once into unpadded token id arrays."""
     print(f"  Tokenizing {len(dataframe)} samples...", flush=True)
-    enc = tokenizer(
-        dataframe["complaint_text"].tolist(),
-        max_length=MAX_LENGTH,
-        padding="max_length",
-        truncation=True,
-        return_tensors="pt",
-    )
-    n = len(dataframe)
-    token_type_ids = enc.get("token_type_ids", torch.zeros(n, MAX_LENGTH, dtype=torch.long))
-    return torch.utils.data.TensorDataset(
-        enc["input_ids"],
-        enc["attention_mask"],
-        token_type_ids,
-        torch.tensor(dataframe["urgency_label"].tolist(), dtype=torch.long),
-        torch.tensor(dataframe["emotion_label"].tolist(),  dtype=torch.long),
+    return ComplaintDataset(
+        token_cache.encode(dataframe["complaint_text"].tolist()),
+        dataframe["urgency_label"].tolist(),
+        dataframe["emotion_label"].tolist(),
     )
 
+# Rank 0 fills the token cache; the other ranks wait and then read it back
+if DISTRIBUTED and RANK != 0:
+    dist.barrier()
 print("Pre-tokenizing datasets...")
 train_ds = tokenize_df(train_df)
 val_ds   = tokenize_df(val_df)
 test_ds  = tokenize_df(test_df)
-print("Tokenization complete.", flush=True)
-
-train_loader = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True,  num_workers=0)
-val_loader   = DataLoader(val_ds,   batch_size=BATCH_SIZE, shuffle=False, num_workers=0)
-test_loader  = DataLoader(test_ds,  batch_size=BATCH_SIZE, shuffle=False, num_workers=0)
+print(f"Tokenization complete ({token_cache.hits} cached, {token_cache.misses} newly tokenized).", flush=True)
+if DISTRIBUTED and RANK == 0:
+    dist.barrier()
+
+# Batches are drawn from length buckets and padded per batch, not to MAX_LENGTH
+collate       = pad_collate(tokenizer.pad_token_id)
+train_sampler = LengthBucketSampler(train_ds.lengths, BATCH_SIZE, shuffle=True, seed=SEED,
+                                    num_replicas=WORLD_SIZE, rank=RANK)
+val_sampler   = LengthBucketSampler(val_ds.lengths, BATCH_SIZE, shuffle=False, num_replicas=WORLD_SIZE, rank=RANK)
+train_loader  = DataLoader(train_ds, batch_sampler=train_sampler, collate_fn=collate, num_workers=0)
+val_loader    = DataLoader(val_ds,   batch_sampler=val_sampler, collate_fn=collate, num_workers=0)
+test_loader   = DataLoader(test_ds,  batch_sampler=LengthBucketSampler(test_ds.lengths, BATCH_SIZE, shuffle=False), collate_fn=collate, num_workers=0)
 
 # ── Model ────────────────────────────────────────────────────────────────────
-class DeBERTaMultiHead(nn.Module):
-    def __init__(self, model_name, num_classes=3):
-        super().__init__()
-        self.backbone      = AutoModel.from_pretrained(model_name)
-        hidden_size        = self.backbone.config.hidden_size
-        self.urgency_head  = nn.Linear(hidden_size, num_classes)
-        self.emotion_head  = nn.Linear(hidden_size, num_classes)
-
-    def forward(self, input_ids, attention_mask, token_type_ids=None):
-        outputs = self.backbone(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            token_type_ids=token_type_ids if token_type_ids is not None else None,
-        )
-        # [CLS] token representation
-        cls_output = outputs.last_hidden_state[:, 0, :]
-        return self.urgency_head(cls_output), self.emotion_head(cls_output)
-
-model = DeBERTaMultiHead(MODEL_NAME).to(DEVICE)
+model = DeBERTaMultiHead(MODEL_NAME, pretrained=True).to(DEVICE)
+# Frozen lower layers get no backward pass and no optimizer state; must be
+# applied before the DDP wrapper registers its gradient hooks
+trainable_params = freeze_lower(model, args.freeze_embeddings, args.freeze_layers)
+total_params     = sum(p.numel() for p in model.parameters())
+print(f"Trainable parameters: {trainable_params:,} / {total_params:,}"
+      + (f" (embeddings + {args.freeze_layers} layers frozen)" if args.freeze_layers
+         else " (embeddings frozen)" if args.freeze_embeddings else ""))
+# Training forwards go through the DDP wrapper (gradient all-reduce);
+# evaluation uses the plain module so ranks need not stay in lockstep
+train_model = DistributedDataParallel(model) if DISTRIBUTED else model
 
 # Class-weighted loss for urgency.
 # Frequency-based weights alone downweight Medium (most frequent) despite it being
 # the structurally hardest class (overlaps with both Low and High scenarios).
 # Manual weights override this: Medium is boosted above its frequency-based value.
 # Low=1.0, Medium=1.5, High=1.2  — tune Medium upward if it stays underperforming.
-urgency_weights = torch.tensor([1.0, 1.5, 1.2], dtype=torch.float).to(DEVICE)
+urgency_weights = torch.tensor(URGENCY_WEIGHTS, dtype=torch.float).to(DEVICE)
 print(f"Urgency class weights: {urgency_weights.cpu().tolist()}")
 
 urg_criterion = nn.CrossEntropyLoss(weight=urgency_weights)
 emo_criterion = nn.CrossEntropyLoss()
 
-optimizer  = torch.optim.AdamW(model.parameters(), lr=LR)
-total_steps = len(train_loader) * EPOCHS
+optimizer  = torch.optim.AdamW(layerwise_param_groups(model, LR, args.layer_decay), lr=LR)
+# Warmup and decay are counted in optimizer steps, not loader batches
+steps_per_epoch = math.ceil(len(train_loader) / GRAD_ACCUM)
+total_steps = steps_per_epoch * EPOCHS
 warmup_steps = int(0.1 * total_steps)   # 10% warmup
 scheduler  = get_linear_schedule_with_warmup(optimizer, num_warmup_steps=warmup_steps, num_training_steps=total_steps)
 scaler     = torch.amp.GradScaler("cuda", enabled=DEVICE.type == "cuda")
+print(f"Batch size {BATCH_SIZE} x {GRAD_ACCUM} accumulation steps x {WORLD_SIZE} processes = "
+      f"effective batch {EFFECTIVE_BATCH_SIZE} ({steps_per_epoch} optimizer steps/epoch)")
+
+# Settings a checkpoint can only be resumed under (they shape the batches,
+# the schedule or the optimizer's parameter groups)
+RUN_CONFIG = {
+    "batch_size": BATCH_SIZE, "grad_accum": GRAD_ACCUM, "world_size": WORLD_SIZE,
+    "freeze_embeddings": args.freeze_embeddings, "freeze_layers": args.freeze_layers,
+    "layer_decay": args.layer_decay, "long_text": args.long_text,
+}
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 def run_epoch(loader, train=True):
     model.train() if train else model.eval()
+    net = train_model if train else model
     total_loss = 0.0
     all_urg_preds, all_urg_labels = [], []
     all_emo_preds, all_emo_labels = [], []
 
+    if train:
+        optimizer.zero_grad()
+
     ctx = torch.enable_grad() if train else torch.no_grad()
     with ctx:
-        for batch in tqdm(loader, desc="train" if train else "eval ", leave=False):
+        for step, batch in enumerate(tqdm(loader, desc="train" if train else "eval ", leave=False,
+                                          disable=RANK != 0)):
             input_ids, attention_mask, token_type_ids, urg_labels, emo_labels = batch
             input_ids      = input_ids.to(DEVICE)
             attention_mask = attention_mask.to(DEVICE)
@@ -141,20 +233,31 @@ def run_epoch(loader, train=True):
             urg_labels     = urg_labels.to(DEVICE)
             emo_labels     = emo_labels.to(DEVICE)
 
-            with torch.amp.autocast("cuda", enabled=DEVICE.type == "cuda"):
-                urg_logits, emo_logits = model(input_ids, attention_mask, token_type_ids)
-                loss = urg_criterion(urg_logits, urg_labels) + emo_criterion(emo_logits, emo_labels)
+            # Gradients of GRAD_ACCUM micro-batches are averaged into one
+            # optimizer step; the epoch's last group may be shorter. DDP only
+            # all-reduces on the group's final backward pass.
+            group_start = step - step % GRAD_ACCUM
+            group_size  = min(GRAD_ACCUM, len(loader) - group_start)
+            step_now    = step + 1 == group_start + group_size
+            sync        = train_model.no_sync() if train and DISTRIBUTED and not step_now else nullcontext()
+
+            with sync:
+                with torch.amp.autocast("cuda", enabled=DEVICE.type == "cuda"):
+                    urg_logits, emo_logits = net(input_ids, attention_mask, token_type_ids)
+                    loss = urg_criterion(urg_logits, urg_labels) + emo_criterion(emo_logits, emo_labels)
+                if train:
+                    scaler.scale(loss / group_size).backward()
 
             if train:
-                optimizer.zero_grad()
-                scaler.scale(loss).backward()
-                scaler.unscale_(optimizer)
-                torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-                scale_before = scaler.get_scale()
-                scaler.step(optimizer)
-                scaler.update()
-                if scaler.get_scale() == scale_before:  # optimizer stepped (no inf/nan)
-                    scheduler.step()
+                if step_now:
+                    scaler.unscale_(optimizer)
+                    torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+                    scale_before = scaler.get_scale()
+                    scaler.step(optimizer)
+                    scaler.update()
+                    if scaler.get_scale() == scale_before:  # optimizer stepped (no inf/nan)
+                        scheduler.step()
+                    optimizer.zero_grad()
 
             total_loss += loss.item()
             all_urg_preds.extend(urg_logits.argmax(dim=-1).cpu().tolist())
@@ -162,7 +265,16 @@ def run_epoch(loader, train=True):
             all_emo_preds.extend(emo_logits.argmax(dim=-1).cpu().tolist())
             all_emo_labels.extend(emo_labels.cpu().tolist())
 
-    avg_loss  = total_loss / len(loader)
+    # Every rank saw a different shard; score the union of their predictions
+    shards = all_gather((total_loss, len(loader), all_urg_preds, all_urg_labels, all_emo_preds, all_emo_labels))
+    total_loss     = sum(shard[0] for shard in shards)
+    n_batches      = sum(shard[1] for shard in shards)
+    all_urg_preds  = [p for shard in shards for p in shard[2]]
+    all_urg_labels = [p for shard in shards for p in shard[3]]
+    all_emo_preds  = [p for shard in shards for p in shard[4]]
+    all_emo_labels = [p for shard in shards for p in shard[5]]
+
+    avg_loss  = total_loss / n_batches
     urg_f1    = f1_score(all_urg_labels, all_urg_preds, average="macro", zero_division=0)
     emo_f1    = f1_score(all_emo_labels, all_emo_preds, average="macro", zero_division=0)
     return avg_loss, urg_f1, emo_f1
@@ -176,9 +288,44 @@ best_epoch           = 1
 best_val_urg_f1      = 0.0
 best_val_emo_f1      = 0.0
 epoch_history        = []
-
-for epoch in range(1, EPOCHS + 1):
+start_epoch          = 1
+stopped_early        = False
+pruned_at_epoch      = None
+
+if args.resume:
+    # Restores every piece of state the loop below reads, plus the RNG
+    # states; the sampler reseeds from the epoch number, so the remaining
+    # epochs see exactly the batches and dropout masks of an unbroken run.
+    ckpt = load_checkpoint(CHECKPOINT)
+    if ckpt["run_config"] != RUN_CONFIG:
+        sys.exit(f"Checkpoint was written with {ckpt['run_config']}; resume with the same setup.")
+    set_rng_state(ckpt["rng"][RANK])
+    model.load_state_dict(ckpt["model"])
+    optimizer.load_state_dict(ckpt["optimizer"])
+    scheduler.load_state_dict(ckpt["scheduler"])
+    scaler.load_state_dict(ckpt["scaler"])
+    best_val_combined_f1 = ckpt["best_val_combined_f1"]
+    best_val_loss        = ckpt["best_val_loss"]
+    patience_counter     = ckpt["patience_counter"]
+    best_model_state     = ckpt["best_model_state"]
+    best_epoch           = ckpt["best_epoch"]
+    best_val_urg_f1      = ckpt["best_val_urg_f1"]
+    best_val_emo_f1      = ckpt["best_val_emo_f1"]
+    epoch_history        = ckpt["epoch_history"]
+    start_epoch          = ckpt["epoch"] + 1
+    stopped_early        = ckpt["stopped_early"]
+    pruned_at_epoch      = ckpt["pruned_at_epoch"]
+    print(f"Resumed from '{CHECKPOINT}' after epoch {ckpt['epoch']}"
+          f"{' (run had already stopped early)' if stopped_early else ''}")
+    del ckpt
+
+for epoch in range(start_epoch, EPOCHS + 1):
+    if stopped_early:
+        break
+    train_sampler.set_epoch(epoch)
+    epoch_start = time.perf_counter()
     train_loss, train_urg_f1, train_emo_f1 = run_epoch(train_loader, train=True)
+    train_seconds = time.perf_counter() - epoch_start
     val_loss,   val_urg_f1,   val_emo_f1   = run_epoch(val_loader,   train=False)
 
     val_combined_f1 = (val_urg_f1 + val_emo_f1) / 2
@@ -190,6 +337,8 @@ for epoch in range(1, EPOCHS + 1):
         "val_urgency_f1":  round(val_urg_f1,      4),
         "val_emotion_f1":  round(val_emo_f1,       4),
         "val_combined_f1": round(val_combined_f1,  4),
+        "train_seconds":   round(train_seconds, 1),
+        "step_time_ms":    round(1000 * train_seconds / len(train_loader), 1),   # per training batch
     })
 
     print(
@@ -198,7 +347,8 @@ for epoch in range(1, EPOCHS + 1):
         f"Val Loss: {val_loss:.4f} | "
         f"Val Urgency F1: {val_urg_f1:.4f} | "
         f"Val Emotion F1: {val_emo_f1:.4f} | "
-        f"Val Combined F1: {val_combined_f1:.4f}"
+        f"Val Combined F1: {val_combined_f1:.4f} | "
+        f"Step: {1000 * train_seconds / len(train_loader):.0f} ms"
     )
 
     if val_combined_f1 > best_val_combined_f1:
@@ -215,7 +365,44 @@ for epoch in range(1, EPOCHS + 1):
         print(f"  -> No improvement. Patience {patience_counter}/{PATIENCE}")
         if patience_counter >= PATIENCE:
             print("Early stopping triggered.")
-            break
+            stopped_early = True
+
+    if args.progress_file and RANK == 0:
+        with open(args.progress_file, "a") as f:
+            f.write(json.dumps(epoch_history[-1]) + "\n")
+    # Every rank must agree, so the file check is shared before acting on it
+    if args.prune_file and not stopped_early and any(all_gather(os.path.exists(args.prune_file))):
+        print("  -> Pruned by the sweep (trial is behind the median).")
+        stopped_early   = True
+        pruned_at_epoch = epoch
+
+    rng_states = all_gather(rng_state())
+    if RANK != 0:
+        continue
+    save_checkpoint(CHECKPOINT, {
+        "epoch":                epoch,
+        "run_config":           RUN_CONFIG,
+        "model":                model.state_dict(),
+        "optimizer":            optimizer.state_dict(),
+        "scheduler":            scheduler.state_dict(),
+        "scaler":               scaler.state_dict(),
+        "best_val_combined_f1": best_val_combined_f1,
+        "best_val_loss":        best_val_loss,
+        "patience_counter":     patience_counter,
+        "best_model_state":     best_model_state,
+        "best_epoch":           best_epoch,
+        "best_val_urg_f1":      best_val_urg_f1,
+        "best_val_emo_f1":      best_val_emo_f1,
+        "epoch_history":        epoch_history,
+        "stopped_early":        stopped_early,
+        "pruned_at_epoch":      pruned_at_epoch,
+    }, rng_states)
+
+# Only rank 0 evaluates on the test set and writes the model and logs
+if DISTRIBUTED:
+    dist.destroy_process_group()
+    if RANK != 0:
+        sys.exit(0)
 
 # Restore best weights
 model.load_state_dict(best_model_state)
@@ -276,8 +463,7 @@ model.backbone.config.save_pretrained(OUTPUT_DIR)
 print(f"\nModel and tokenizer saved to '{OUTPUT_DIR}/'")
 
 # ── Experiment log ────────────────────────────────────────────────────────────
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-logs_dir  = "logs"
+logs_dir = LOGS_DIR
 os.makedirs(logs_dir, exist_ok=True)
 
 urg_macro = round(float(f1_score(all_urg_labels, all_urg_preds, average="macro", zero_division=0)), 4)
@@ -285,16 +471,27 @@ emo_macro = round(float(f1_score(all_emo_labels, all_emo_preds, average="macro",
 
 log_entry = {
     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    "run_id": timestamp,
-    "notes": "",                          # fill in manually after each run
+    "run_id": RUN_ID,
+    "notes": args.notes,                  # or fill in manually after each run
     # Hyperparameters
     "model": MODEL_NAME,
     "max_length": MAX_LENGTH,
     "batch_size": BATCH_SIZE,
+    "grad_accum": GRAD_ACCUM,
+    "world_size": WORLD_SIZE,
+    "effective_batch_size": EFFECTIVE_BATCH_SIZE,
     "lr": LR,
     "best_epoch": best_epoch,
     "epochs_max": EPOCHS,
     "early_stopping_patience": PATIENCE,
+    "urgency_weights": URGENCY_WEIGHTS,
+    "freeze_embeddings": args.freeze_embeddings or args.freeze_layers > 0,
+    "freeze_layers": args.freeze_layers,
+    "layer_decay": args.layer_decay,
+    "long_text": args.long_text,
+    "trainable_params": trainable_params,
+    "mean_step_time_ms": round(float(np.mean([e["step_time_ms"] for e in epoch_history])), 1),
+    "pruned_at_epoch": pruned_at_epoch,
     "optimizer": "AdamW",
     # Validation at best epoch
     "best_val_loss":        round(best_val_loss,        4),
@@ -316,7 +513,7 @@ log_entry = {
 }
 
 # Per-run detailed JSON file
-run_log_path = os.path.join(logs_dir, f"run_{timestamp}.json")
+run_log_path = os.path.join(logs_dir, f"run_{RUN_ID}.json")
 with open(run_log_path, "w") as f:
     json.dump(log_entry, f, indent=2)
 
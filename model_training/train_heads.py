@@ -0,0 +1,278 @@
+"""Train urgency/emotion head variants on cached, frozen backbone features.
+
+The DeBERTa backbone runs once over the train/val/test split and its [CLS]
+and mean-pooled last hidden states are written to memory-mapped .npy files
+under model_training/cache/features/. Every later run with the same
+backbone, tokenizer, max length and data reuses them, so training a head
+takes seconds instead of a full fine-tune.
+
+Each combination of --pooling, --head, --lr and --urgency-weights is trained
+with early stopping on val combined F1 (same criterion as train_deberta.py)
+and scored on the test split. All variants are printed as a table and saved
+to results/heads_<timestamp>.json.
+
+Backbones:
+  --backbone pretrained  microsoft/deberta-v3-base as downloaded (linear probe)
+  --backbone finetuned   the backbone in model_output/ (retrain heads only)
+
+Usage:
+    python model_training/train_heads.py
+    python model_training/train_heads.py --pooling cls mean concat --head linear mlp \
+        --urgency-weights 1,1.5,1.2 --urgency-weights 1,2,1.2
+    python model_training/train_heads.py --backbone finetuned --save-best model_output_heads
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+import torch.nn as nn
+from sklearn.metrics import f1_score
+from transformers import AutoTokenizer
+
+from data_utils import load_splits
+from inference import InferenceEngine
+from modeling import DEVICE, LABEL_NAMES, MODEL_DIR, DeBERTaMultiHead, load_model, weights_path
+from prediction_cache import file_hash
+from token_cache import text_key, tokenizer_fingerprint
+
+# ── Config ───────────────────────────────────────────────────────────────────
+MODEL_NAME   = "microsoft/deberta-v3-base"
+FEATURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "features")
+RESULTS_DIR  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+MAX_LENGTH   = 192
+BATCH_SIZE   = 32
+SPLITS       = ["train", "val", "test"]
+POOLINGS     = ["cls", "mean"]
+
+
+# ── Feature cache ────────────────────────────────────────────────────────────
+def feature_dir(backbone_id, tokenizer, max_length, splits):
+    """Cache directory keyed by backbone, tokenizer, max length and split contents."""
+    h = hashlib.sha1(f"{backbone_id}|{tokenizer_fingerprint(tokenizer)}|{max_length}".encode())
+    for name, frame in zip(SPLITS, splits):
+        h.update(name.encode())
+        for text in frame["complaint_text"]:
+            h.update(text_key(text))
+    return os.path.join(FEATURES_DIR, h.hexdigest()[:16])
+
+
+def extract_features(backbone, tokenizer, texts, out_dir, split, batch_size):
+    """Run ``backbone`` over ``texts`` once, writing [CLS] and mean-pooled states."""
+    engine = InferenceEngine(backbone, tokenizer, device=DEVICE, max_length=MAX_LENGTH,
+                             batch_size=batch_size, cache_tokens=True)
+    hidden = backbone.config.hidden_size
+    tmp    = {p: os.path.join(out_dir, f"{split}_{p}.tmp.npy") for p in POOLINGS}
+    arrays = {p: np.lib.format.open_memmap(tmp[p], mode="w+", dtype=np.float32, shape=(len(texts), hidden))
+              for p in POOLINGS}
+
+    with torch.no_grad():
+        for idx, features in engine.batches(engine.encode(texts)):
+            tensors = {k: torch.from_numpy(v).to(DEVICE) for k, v in features.items()}
+            states  = backbone(**tensors).last_hidden_state.float()
+            mask    = tensors["attention_mask"].unsqueeze(-1).float()
+            arrays["cls"][idx]  = states[:, 0, :].cpu().numpy()
+            arrays["mean"][idx] = ((states * mask).sum(1) / mask.sum(1)).cpu().numpy()
+
+    # Renamed only once complete, so an interrupted extraction is redone
+    for p in POOLINGS:
+        arrays[p].flush()
+        del arrays[p]
+        os.replace(tmp[p], os.path.join(out_dir, f"{split}_{p}.npy"))
+
+
+def load_features(args, splits):
+    """Return ``{split: {pooling: memmap}}``, extracting the backbone features on first use."""
+    if args.backbone == "finetuned":
+        tokenizer, model = load_model(args.model_dir, DEVICE)
+        backbone_id = f"finetuned:{file_hash(weights_path(args.model_dir))}"
+    else:
+        tokenizer   = AutoTokenizer.from_pretrained(MODEL_NAME)
+        model       = None
+        backbone_id = f"pretrained:{MODEL_NAME}"
+
+    out_dir = feature_dir(backbone_id, tokenizer, MAX_LENGTH, splits)
+    os.makedirs(out_dir, exist_ok=True)
+    missing = [s for s in SPLITS if not all(os.path.exists(os.path.join(out_dir, f"{s}_{p}.npy")) for p in POOLINGS)]
+    if missing:
+        if model is None:
+            model = DeBERTaMultiHead(MODEL_NAME, pretrained=True).to(DEVICE)
+        model.eval()
+        for split, frame in zip(SPLITS, splits):
+            if split in missing:
+                print(f"  Encoding {split} ({len(frame)} complaints) ...", flush=True)
+                start = time.perf_counter()
+                extract_features(model.backbone, tokenizer, frame["complaint_text"].tolist(),
+                                 out_dir, split, args.batch_size)
+                print(f"    {time.perf_counter() - start:.1f}s", flush=True)
+    print(f"Features in '{out_dir}'" + ("" if missing else " (cached)"))
+
+    features = {s: {p: np.load(os.path.join(out_dir, f"{s}_{p}.npy"), mmap_mode="r") for p in POOLINGS}
+                for s in SPLITS}
+    return features, tokenizer, model
+
+
+def pooled(features, pooling):
+    if pooling == "concat":
+        return np.concatenate([features["cls"], features["mean"]], axis=1)
+    return np.array(features[pooling])
+
+
+# ── Heads ────────────────────────────────────────────────────────────────────
+class Heads(nn.Module):
+    """``urgency_head`` / ``emotion_head`` pair; ``linear`` matches DeBERTaMultiHead."""
+
+    def __init__(self, in_dim, kind="linear", hidden=256, dropout=0.1, num_classes=3):
+        super().__init__()
+
+        def head():
+            if kind == "linear":
+                return nn.Linear(in_dim, num_classes)
+            return nn.Sequential(nn.Dropout(dropout), nn.Linear(in_dim, hidden), nn.GELU(),
+                                 nn.Dropout(dropout), nn.Linear(hidden, num_classes))
+
+        self.urgency_head = head()
+        self.emotion_head = head()
+
+    def forward(self, x):
+        return self.urgency_head(x), self.emotion_head(x)
+
+
+def macro_f1s(heads, x, urg, emo):
+    heads.eval()
+    with torch.no_grad():
+        urg_logits, emo_logits = heads(x)
+    urg_f1 = f1_score(urg, urg_logits.argmax(-1).numpy(), average="macro", zero_division=0)
+    emo_f1 = f1_score(emo, emo_logits.argmax(-1).numpy(), average="macro", zero_division=0)
+    return float(urg_f1), float(emo_f1)
+
+
+def train_variant(data, kind, lr, urgency_weights, args):
+    """Train one head pair with early stopping on val combined F1; returns (heads, metrics)."""
+    torch.manual_seed(args.seed)
+    x_train, urg_train, emo_train = data["train"]
+    heads     = Heads(x_train.shape[1], kind, args.hidden, args.dropout)
+    optimizer = torch.optim.AdamW(heads.parameters(), lr=lr, weight_decay=args.weight_decay)
+    urg_loss  = nn.CrossEntropyLoss(weight=torch.tensor(urgency_weights, dtype=torch.float))
+    emo_loss  = nn.CrossEntropyLoss()
+
+    best, best_state, best_epoch, bad = -1.0, None, 0, 0
+    urg_t, emo_t = torch.as_tensor(urg_train), torch.as_tensor(emo_train)
+    for epoch in range(1, args.epochs + 1):
+        heads.train()
+        for batch in torch.randperm(len(x_train)).split(args.head_batch_size):
+            urg_logits, emo_logits = heads(x_train[batch])
+            loss = urg_loss(urg_logits, urg_t[batch]) + emo_loss(emo_logits, emo_t[batch])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        val_urg, val_emo = macro_f1s(heads, *data["val"])
+        if (val_urg + val_emo) / 2 > best:
+            best, best_epoch, bad = (val_urg + val_emo) / 2, epoch, 0
+            best_state = {k: v.clone() for k, v in heads.state_dict().items()}
+        else:
+            bad += 1
+            if bad >= args.patience:
+                break
+
+    heads.load_state_dict(best_state)
+    val_urg, val_emo   = macro_f1s(heads, *data["val"])
+    test_urg, test_emo = macro_f1s(heads, *data["test"])
+    return heads, {
+        "best_epoch":            best_epoch,
+        "val_combined_f1":       round(best, 4),
+        "val_urgency_f1":        round(val_urg, 4),
+        "val_emotion_f1":        round(val_emo, 4),
+        "test_urgency_macro_f1": round(test_urg, 4),
+        "test_emotion_macro_f1": round(test_emo, 4),
+        "test_combined_f1":      round((test_urg + test_emo) / 2, 4),
+    }
+
+
+def save_model(out_dir, model, heads, tokenizer):
+    """Write a model_output-style directory: the backbone plus the new linear heads."""
+    os.makedirs(out_dir, exist_ok=True)
+    state = model.state_dict()
+    state.update({k: v.to(state[k].device) for k, v in heads.state_dict().items()})
+    torch.save(state, os.path.join(out_dir, "model_weights.pt"))
+    model.backbone.config.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train head variants on cached frozen-backbone features.")
+    parser.add_argument("--backbone", choices=["pretrained", "finetuned"], default="pretrained",
+                        help="Backbone to encode with (default: pretrained)")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Fine-tuned model for --backbone finetuned")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"Complaints per backbone forward pass when encoding (default: {BATCH_SIZE})")
+    parser.add_argument("--pooling", nargs="+", choices=["cls", "mean", "concat"], default=["cls"],
+                        help="Feature(s) to train on (default: cls)")
+    parser.add_argument("--head", nargs="+", choices=["linear", "mlp"], default=["linear"],
+                        help="Head architecture(s) (default: linear)")
+    parser.add_argument("--lr", nargs="+", type=float, default=[1e-3], help="Learning rate(s) (default: 1e-3)")
+    parser.add_argument("--urgency-weights", action="append", default=None,
+                        help="Urgency class weights Low,Medium,High; repeat to compare (default: 1.0,1.5,1.2)")
+    parser.add_argument("--hidden", type=int, default=256, help="MLP hidden size (default: 256)")
+    parser.add_argument("--dropout", type=float, default=0.1, help="MLP dropout (default: 0.1)")
+    parser.add_argument("--weight-decay", type=float, default=0.01, help="AdamW weight decay (default: 0.01)")
+    parser.add_argument("--epochs", type=int, default=200, help="Max epochs per variant (default: 200)")
+    parser.add_argument("--patience", type=int, default=10, help="Early-stopping patience (default: 10)")
+    parser.add_argument("--head-batch-size", type=int, default=256, help="Feature rows per step (default: 256)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-best", default=None, metavar="DIR",
+                        help="Save the best linear/cls variant with its backbone as a loadable model directory")
+    args = parser.parse_args()
+    weight_sets = [[float(w) for w in ws.split(",")] for ws in (args.urgency_weights or ["1.0,1.5,1.2"])]
+
+    splits = load_splits()
+    print(f"Train: {len(splits[0])} | Val: {len(splits[1])} | Test: {len(splits[2])}")
+    features, tokenizer, model = load_features(args, splits)
+    labels = {s: (f["urgency_label"].to_numpy(np.int64), f["emotion_label"].to_numpy(np.int64))
+              for s, f in zip(SPLITS, splits)}
+
+    results = []
+    best    = None
+    for pooling, kind, lr, weights in itertools.product(args.pooling, args.head, args.lr, weight_sets):
+        data  = {s: (torch.from_numpy(pooled(features[s], pooling)), *labels[s]) for s in SPLITS}
+        start = time.perf_counter()
+        heads, metrics = train_variant(data, kind, lr, weights, args)
+        row = {"pooling": pooling, "head": kind, "lr": lr, "urgency_weights": weights,
+               **metrics, "seconds": round(time.perf_counter() - start, 2)}
+        results.append(row)
+        print(f"  {pooling:6s} {kind:6s} lr={lr:<8g} w={weights}  "
+              f"val {row['val_combined_f1']:.4f} | test urg {row['test_urgency_macro_f1']:.4f} "
+              f"emo {row['test_emotion_macro_f1']:.4f}  ({row['seconds']:.1f}s, epoch {row['best_epoch']})")
+        if pooling == "cls" and kind == "linear" and (best is None or row["val_combined_f1"] > best[0]["val_combined_f1"]):
+            best = (row, heads)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_path  = os.path.join(RESULTS_DIR, f"heads_{timestamp}.json")
+    with open(out_path, "w") as f:
+        json.dump({
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "backbone":  args.backbone if args.backbone == "finetuned" else MODEL_NAME,
+            "labels":    LABEL_NAMES,
+            "variants":  sorted(results, key=lambda r: -r["val_combined_f1"]),
+        }, f, indent=2)
+    print(f"\nResults saved to '{out_path}'")
+
+    if args.save_best:
+        if best is None:
+            parser.error("--save-best needs at least one cls/linear variant (the DeBERTaMultiHead head layout)")
+        if model is None:
+            model = DeBERTaMultiHead(MODEL_NAME, pretrained=True)
+        save_model(args.save_best, model, best[1], tokenizer)
+        print(f"Best cls/linear heads (val {best[0]['val_combined_f1']:.4f}) saved with backbone to '{args.save_best}'")
+
+
+if __name__ == "__main__":
+    main()
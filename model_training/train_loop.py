@@ -0,0 +1,109 @@
+"""Shared fine-tuning loop for distill.py, prune.py and early_exit.py.
+
+Each of those scripts trains a DeBERTaMultiHead-style model the same way:
+length-bucketed batches padded per batch, AdamW with a linear schedule and
+10% warmup, gradients clipped at 1.0, validation after every epoch, and the
+best epoch's weights restored at the end. ``fit`` runs that loop; a script
+supplies only what differs — how a batch's loss is computed and how an epoch
+is validated.
+
+Usage:
+    def loss_fn(model, batch, idx):
+        input_ids, attention_mask, token_type_ids, urg, emo = batch
+        urg_logits, emo_logits = model(input_ids, attention_mask, token_type_ids)
+        return urg_crit(urg_logits, urg) + emo_crit(emo_logits, emo)
+
+    def validate(epoch, train_loss):
+        score = ...   # e.g. val combined F1
+        return score, {"val_combined_f1": round(score, 4)}
+
+    history, best_epoch = fit(model, train_ds, pad_collate(tokenizer.pad_token_id),
+                              loss_fn, validate, epochs=3, batch_size=16, lr=1e-5)
+"""
+
+import time
+
+import numpy as np
+import torch
+from sklearn.metrics import f1_score
+from transformers import get_linear_schedule_with_warmup
+
+from data_utils import LengthBucketSampler
+from modeling import DEVICE
+
+# ── Config ───────────────────────────────────────────────────────────────────
+SEED          = 42
+WARMUP_RATIO  = 0.1
+MAX_GRAD_NORM = 1.0
+
+
+def macro_f1s(urg_true, emo_true, urg_logits, emo_logits):
+    """``(urgency macro F1, emotion macro F1)`` of logits against integer labels."""
+    urg_f1 = f1_score(urg_true, np.asarray(urg_logits).argmax(-1), average="macro", zero_division=0)
+    emo_f1 = f1_score(emo_true, np.asarray(emo_logits).argmax(-1), average="macro", zero_division=0)
+    return float(urg_f1), float(emo_f1)
+
+
+def fit(model, train_ds, collate, loss_fn, validate, epochs, batch_size, lr,
+        patience=None, baseline=None, seed=SEED):
+    """Train ``model`` on ``train_ds`` and restore its best epoch.
+
+    ``loss_fn(model, batch, idx)`` returns the loss of one batch; ``batch`` is
+    the collated tuple on DEVICE and ``idx`` the dataset indices in it.
+    ``validate(epoch, train_loss)`` runs with the model in eval mode and
+    returns ``(score, record)``; higher scores are better and ``record`` is
+    added to that epoch's history entry. Only parameters with
+    ``requires_grad`` are trained. Training stops after ``patience`` epochs
+    without improvement (never, if None). ``baseline`` is the score of the
+    weights before training; if given, they count as epoch 0 and are kept
+    unless an epoch beats them.
+
+    Returns ``(history, best_epoch)``.
+    """
+    torch.manual_seed(seed)
+    params    = [p for p in model.parameters() if p.requires_grad]
+    sampler   = LengthBucketSampler(train_ds.lengths, batch_size, shuffle=True, seed=seed)
+    optimizer = torch.optim.AdamW(params, lr=lr)
+    total     = len(sampler) * epochs
+    scheduler = get_linear_schedule_with_warmup(optimizer, num_warmup_steps=int(WARMUP_RATIO * total),
+                                                num_training_steps=total)
+
+    best, best_state, best_epoch, bad = -1.0, None, 1, 0
+    if baseline is not None:
+        best, best_epoch = baseline, 0
+        best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+
+    history = []
+    for epoch in range(1, epochs + 1):
+        sampler.set_epoch(epoch)
+        model.train()
+        total_loss = 0.0
+        start      = time.perf_counter()
+        for idx in sampler:
+            batch = tuple(t.to(DEVICE) for t in collate([train_ds[i] for i in idx]))
+            loss  = loss_fn(model, batch, idx)
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(params, MAX_GRAD_NORM)
+            optimizer.step()
+            scheduler.step()
+            total_loss += loss.item()
+        train_loss    = round(total_loss / len(sampler), 4)
+        train_seconds = round(time.perf_counter() - start, 1)
+
+        model.eval()
+        score, record = validate(epoch, train_loss)
+        history.append({"epoch": epoch, "train_loss": train_loss, **record, "train_seconds": train_seconds})
+
+        if score > best:
+            best, best_epoch, bad = score, epoch, 0
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+        else:
+            bad += 1
+            if patience is not None and bad >= patience:
+                print(f"Early stopping at epoch {epoch} (best epoch {best_epoch})")
+                break
+
+    model.load_state_dict(best_state)
+    model.eval()
+    return history, best_epoch